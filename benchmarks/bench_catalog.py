@@ -0,0 +1,28 @@
+"""Catalog load and search latency at several catalog sizes."""
+
+import pytest
+
+QUERIES = ["ecephys", "6001", "subject:600123", "2024-12", "ecephys 6001 2024-12-1", "no-match"]
+
+
+def bench_catalog_load(benchmark, docdb):
+    from aind_ephys_portal.catalog.catalog import Catalog
+    from aind_ephys_portal.docdb.database import get_all_ecephys_derived_columns
+
+    def load():
+        get_all_ecephys_derived_columns.clear()
+        catalog = Catalog()
+        catalog.load()
+        return catalog
+
+    catalog = benchmark.pedantic(load, rounds=3)
+    assert len(catalog.table) == len(docdb.records) // 2
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def bench_df_filtered(benchmark, s3, catalog, query):
+    from aind_ephys_portal.panel.ephys_portal import SearchOptions
+
+    search_options = SearchOptions()
+    df = benchmark(search_options.df_filtered, query)
+    assert len(df) <= len(catalog.df)
@@ -0,0 +1,50 @@
+"""Analyzer open and GUI layout construction time at several analyzer sizes."""
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def gui_view():
+    from aind_ephys_portal.panel.ephys_gui import EphysGuiView
+
+    return EphysGuiView(analyzer_path="", recording_path="")
+
+
+def bench_analyzer_open(benchmark, gui_view, analyzer_path):
+    """``si.load`` of the analyzer, bypassing the shared analyzer cache."""
+    analyzer = benchmark.pedantic(gui_view._load_analyzer, args=(analyzer_path, ""), rounds=5)
+    assert analyzer.get_num_units() > 0
+
+
+def bench_layout_build(benchmark, gui_view, analyzer_path):
+    """``run_mainwindow`` on a freshly opened analyzer, including the extensions it loads."""
+
+    def setup():
+        return (gui_view._load_analyzer(analyzer_path, ""),), {}
+
+    window = benchmark.pedantic(gui_view._create_main_window, setup=setup, rounds=3)
+    assert window.main_layout is not None
+
+
+def _open_analyzer(analyzer_path):
+    import spikeinterface as si
+
+    return (si.load(analyzer_path, load_extensions=False),), {}
+
+
+def bench_extensions_serial(benchmark, analyzer_path):
+    """Saved extensions loaded one after the other, as ``run_mainwindow`` does without prefetch."""
+
+    def load_all(analyzer):
+        for extension_name in analyzer.get_saved_extension_names():
+            analyzer.load_extension(extension_name)
+
+    benchmark.pedantic(load_all, setup=lambda: _open_analyzer(analyzer_path), rounds=3)
+
+
+def bench_extensions_prefetch(benchmark, analyzer_path):
+    """Saved extensions of the allow-list loaded concurrently by ``prefetch_extensions``."""
+    from aind_ephys_portal.analyzer.prefetch import prefetch_extensions
+
+    loaded = benchmark.pedantic(prefetch_extensions, setup=lambda: _open_analyzer(analyzer_path), rounds=3)
+    assert len(loaded) > 0
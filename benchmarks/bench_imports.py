@@ -0,0 +1,27 @@
+"""Import time of the application modules. Heavy imports in the portal are checked by ``tests/test_imports.py``."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+def _import_in_subprocess(module: str) -> dict:
+    """Import ``module`` in a fresh interpreter and report its import time and loaded modules."""
+    code = (
+        "import json, sys, time\n"
+        "t_start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - t_start, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["aind_ephys_portal.panel.ephys_portal", "aind_ephys_portal.panel.ephys_gui"])
+def bench_import(benchmark, module):
+    """Import time of the entry modules, measured in a fresh interpreter."""
+    seconds = []
+    benchmark.pedantic(lambda: seconds.append(_import_in_subprocess(module)["seconds"]), rounds=3)
+    benchmark.extra_info["import_seconds"] = min(seconds)
@@ -0,0 +1,55 @@
+"""End-to-end latency of selecting an asset in the portal."""
+
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import N_S3_ASSETS, clear_caches
+
+
+@pytest.fixture(scope="module")
+def portal(ephys_portal):
+    return ephys_portal.EphysPortal()
+
+
+def _assert_streams_listed(portal):
+    streams = portal.streams_panel.value
+    assert len(streams) == 2 and streams["Ephys GUI View"].str.contains("recording_path=s3://").all()
+
+
+def bench_update_streams_cold(benchmark, ephys_portal, portal, tmp_path):
+    """Streams discovered live: DocDB raw lookup, S3 listing and raw location probes."""
+    from aind_ephys_portal.catalog.manifest import StreamManifest
+
+    rows = itertools.cycle(range(N_S3_ASSETS))
+    n_rounds = itertools.count()
+
+    def setup():
+        clear_caches()
+        ephys_portal.stream_manifest = StreamManifest(str(tmp_path / f"manifest_{next(n_rounds)}.sqlite"))
+        return (SimpleNamespace(row=next(rows)),), {}
+
+    benchmark.pedantic(portal.update_streams, setup=setup, rounds=N_S3_ASSETS)
+    _assert_streams_listed(portal)
+
+
+def bench_prefetch_raw_asset_locations_cold(benchmark, ephys_portal, portal):
+    """Raw recording locations of a results page: one batched DocDB query and concurrent S3 probes."""
+    records = [portal.search_options.get_record(asset_id) for asset_id in portal.results_panel.value.index[:N_S3_ASSETS]]
+
+    benchmark.pedantic(ephys_portal.prefetch_raw_asset_locations, args=(records,), setup=clear_caches, rounds=5)
+    locations = [ephys_portal.resolve_asset_streams(record)[1] for record in records]
+    assert all(location is not None for location in locations)
+
+
+def bench_update_streams_manifest(benchmark, portal):
+    """Streams answered from the stream manifest."""
+    for row in range(N_S3_ASSETS):
+        portal.update_streams(SimpleNamespace(row=row))
+    rows = itertools.cycle(range(N_S3_ASSETS))
+
+    benchmark.pedantic(
+        portal.update_streams, setup=lambda: ((SimpleNamespace(row=next(rows)),), {}), rounds=5 * N_S3_ASSETS
+    )
+    _assert_streams_listed(portal)
@@ -0,0 +1,113 @@
+"""Fixtures of the offline benchmark suite.
+
+No network access is needed: DocDB is replaced by ``FakeMetadataDbClient`` filled with synthetic
+ecephys records, S3 by moto, and analyzers are generated locally with spikeinterface.
+
+Environment variables:
+
+- ``BENCHMARK_CATALOG_SIZES``: comma-separated catalog sizes, by default ``1000,10000,100000``
+- ``BENCHMARK_DOCDB_LATENCY``: seconds added to every DocDB request, by default 0
+- ``BENCHMARK_DATA_DIR``: folder where generated analyzers are kept between runs
+"""
+
+import os
+import shutil
+import tempfile
+
+# Configure the portal before it is imported
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ.setdefault(
+    "STREAM_MANIFEST_PATH", os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "stream_manifest.sqlite")
+)
+
+import pytest
+from moto import mock_aws
+
+from synthetic import FakeMetadataDbClient, make_analyzer, make_records, populate_s3
+
+CATALOG_SIZES = [int(n) for n in os.environ.get("BENCHMARK_CATALOG_SIZES", "1000,10000,100000").split(",")]
+DOCDB_LATENCY = float(os.environ.get("BENCHMARK_DOCDB_LATENCY", 0))
+# (number of units, number of channels, duration in seconds)
+ANALYZER_SIZES = [(20, 32, 60.0), (100, 64, 120.0)]
+# Number of most recent assets with postprocessed streams on S3
+N_S3_ASSETS = 20
+
+
+def clear_caches():
+    """Drop all cached DocDB and S3 results."""
+    from aind_ephys_portal.cache.backends import get_backend
+
+    get_backend().clear()
+
+
+@pytest.fixture(scope="session")
+def s3():
+    """moto S3 with the streams of the N_S3_ASSETS most recent assets."""
+    import boto3
+
+    with mock_aws():
+        client = boto3.client("s3")
+        derived_records = [record for record in make_records(N_S3_ASSETS) if record["_id"].startswith("derived")]
+        populate_s3(client, derived_records)
+        yield client
+
+
+@pytest.fixture(scope="module", params=CATALOG_SIZES, ids=lambda n: f"{n}records")
+def docdb(request):
+    """Fake DocDB client holding a catalog of the parametrized size."""
+    from aind_ephys_portal.docdb import database
+
+    client = FakeMetadataDbClient(make_records(request.param), latency=DOCDB_LATENCY)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "_client", client)
+        clear_caches()
+        yield client
+    clear_caches()
+
+
+@pytest.fixture(scope="module")
+def catalog(docdb):
+    """Loaded catalog installed as the process-wide catalog, without background refresh."""
+    from aind_ephys_portal.catalog import catalog as catalog_module
+
+    catalog = catalog_module.Catalog()
+    catalog.load()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(catalog_module, "_catalog", catalog)
+        yield catalog
+
+
+@pytest.fixture(scope="module")
+def ephys_portal(s3, catalog, tmp_path_factory):
+    """The portal module wired to moto and a fresh stream manifest, with background work disabled."""
+    from aind_ephys_portal.catalog.manifest import StreamManifest
+    from aind_ephys_portal.panel import ephys_portal
+    from aind_ephys_portal.s3 import client as s3_client
+
+    manifest_path = tmp_path_factory.mktemp("manifest") / "stream_manifest.sqlite"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(s3_client, "_client", s3)
+        mp.setattr(ephys_portal, "stream_manifest", StreamManifest(str(manifest_path)))
+        mp.setattr(ephys_portal.manifest_indexer, "start", lambda: None)
+        # page prefetch would warm the caches measured by the cold benchmarks
+        mp.setattr(ephys_portal.EphysPortal, "prefetch_page", lambda self, event=None: None)
+        yield ephys_portal
+
+
+@pytest.fixture(scope="session", params=ANALYZER_SIZES, ids=lambda size: f"{size[0]}units-{size[1]}ch-{int(size[2])}s")
+def analyzer_path(request, tmp_path_factory):
+    """Path of a synthetic zarr analyzer, generated once."""
+    num_units, num_channels, duration = request.param
+    data_dir = os.environ.get("BENCHMARK_DATA_DIR") or str(tmp_path_factory.mktemp("analyzers"))
+    name = f"analyzer_{num_units}units_{num_channels}ch_{int(duration)}s"
+    folder = os.path.join(data_dir, f"{name}.zarr")
+    if not os.path.exists(folder):
+        # generate under another name, so an interrupted run is not mistaken for a complete analyzer
+        partial_folder = os.path.join(data_dir, f"{name}_partial.zarr")
+        shutil.rmtree(partial_folder, ignore_errors=True)
+        make_analyzer(partial_folder, num_units, num_channels, duration)
+        os.rename(partial_folder, folder)
+    return folder
@@ -0,0 +1,245 @@
+"""Synthetic data and local stand-ins for DocDB and S3 used by the benchmarks."""
+
+import bisect
+import datetime
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+DERIVED_BUCKET = "bench-derived"
+RAW_BUCKET = "bench-raw"
+PROBES = ["ProbeA", "ProbeB"]
+
+_ABSENT = object()
+
+
+def raw_asset_name(i: int) -> str:
+    """Name of the i-th synthetic raw asset. Lower indices are more recent."""
+    acquired = datetime.datetime(2025, 1, 1, 12, 0, 0) - datetime.timedelta(hours=6 * i)
+    return f"ecephys_{600000 + i % 5000}_{acquired:%Y-%m-%d_%H-%M-%S}"
+
+
+def make_records(n_records: int) -> List[Dict[str, Any]]:
+    """Build ``n_records`` ecephys derived records and their raw records, shaped like DocDB documents."""
+    records = []
+    for i in range(n_records):
+        raw_name = raw_asset_name(i)
+        acquired = datetime.datetime.strptime(raw_name[-19:], "%Y-%m-%d_%H-%M-%S")
+        processed = acquired + datetime.timedelta(days=2)
+        name = f"{raw_name}_sorted_{processed:%Y-%m-%d_%H-%M-%S}"
+        subject_id = raw_name.split("_")[1]
+        records.append(
+            {
+                "_id": f"derived-{i:08d}",
+                "name": name,
+                "created": processed.isoformat(),
+                "last_modified": processed.isoformat(),
+                "location": f"s3://{DERIVED_BUCKET}/{name}",
+                "subject": {"subject_id": subject_id},
+                "data_description": {"modality": [{"abbreviation": "ecephys"}], "data_level": "derived"},
+            }
+        )
+        records.append(
+            {
+                "_id": f"raw-{i:08d}",
+                "name": raw_name,
+                "created": acquired.isoformat(),
+                "last_modified": acquired.isoformat(),
+                "location": f"s3://{RAW_BUCKET}/{raw_name}",
+                "subject": {"subject_id": subject_id},
+                "data_description": {"modality": [{"abbreviation": "ecephys"}], "data_level": "raw"},
+            }
+        )
+    return records
+
+
+def _values(document: Any, path: List[str]) -> List[Any]:
+    """Values at a dotted path, traversing arrays like MongoDB does."""
+    if len(path) == 0:
+        return [document]
+    if isinstance(document, list):
+        return [value for item in document for value in _values(item, path)]
+    if not isinstance(document, dict) or path[0] not in document:
+        return []
+    return _values(document[path[0]], path[1:])
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for field, condition in query.items():
+        values = _values(document, field.split("."))
+        if isinstance(condition, dict):
+            for operator, argument in condition.items():
+                if operator == "$in":
+                    ok = any(value in argument for value in values)
+                elif operator == "$gt":
+                    ok = any(value > argument for value in values)
+                elif operator == "$regex":
+                    ok = any(isinstance(value, str) and re.search(argument, value) for value in values)
+                else:
+                    raise NotImplementedError(f"Unsupported operator {operator}")
+                if not ok:
+                    return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def _project(document: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    if not projection:
+        return dict(document)
+    projected = {}
+    if projection.get("_id", 1):
+        projected["_id"] = document["_id"]
+    for field, include in projection.items():
+        if field == "_id" or not include:
+            continue
+        path = field.split(".")
+        source, target = document, projected
+        for part in path[:-1]:
+            if not isinstance(source, dict) or part not in source:
+                source = _ABSENT
+                break
+            source = source[part]
+            target = target.setdefault(part, {})
+        if isinstance(source, dict) and path[-1] in source:
+            target[path[-1]] = source[path[-1]]
+    return projected
+
+
+class FakeMetadataDbClient:
+    """In-memory stand-in for ``MetadataDbClient`` supporting the queries made by the portal.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        The documents of the collection.
+    latency : float, optional
+        Seconds added to every request to emulate the round trip to the API gateway, by default 0
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]], latency: float = 0.0):
+        self.records = list(records)
+        self.latency = latency
+        self.n_requests = 0
+        self._prefix_cache = None
+        self._by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.records:
+            self._by_name.setdefault(record["name"], []).append(record)
+
+    def _candidates(self, query: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        # use the name index for exact and $in matches, as DocDB does
+        name = query.get("name")
+        if isinstance(name, str):
+            return self._by_name.get(name, [])
+        if isinstance(name, dict) and "$in" in name:
+            return [record for value in name["$in"] for record in self._by_name.get(value, [])]
+        return self.records
+
+    def _request(self):
+        self.n_requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _find(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query = query or {}
+        return [record for record in self._candidates(query) if _matches(record, query)]
+
+    def retrieve_docdb_records(
+        self,
+        filter_query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        sort: Optional[Dict[str, int]] = None,
+        limit: int = 0,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        self._request()
+        records = self._find(filter_query)
+        if limit:
+            records = records[:limit]
+        return [_project(record, projection) for record in records]
+
+    def aggregate_docdb_records(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self._request()
+        # paged pipelines repeat the same $match/$sort prefix, which DocDB answers from its indexes,
+        # and keyset pages add an ``_id`` bound, which is a seek in the ``_id`` index
+        pipeline = list(pipeline)
+        after = None
+        if len(pipeline) > 1 and pipeline[1] == {"$sort": {"_id": 1}} and "_id" in pipeline[0].get("$match", {}):
+            match = dict(pipeline[0]["$match"])
+            after = match.pop("_id")["$gt"]
+            pipeline[0] = {"$match": match}
+        n_prefix = 0
+        while n_prefix < len(pipeline) and next(iter(pipeline[n_prefix])) in ("$match", "$sort"):
+            n_prefix += 1
+        prefix_key = repr(pipeline[:n_prefix])
+        if self._prefix_cache is None or self._prefix_cache[0] != prefix_key:
+            records = self._run_stages(self.records, pipeline[:n_prefix])
+            self._prefix_cache = (prefix_key, records, [record["_id"] for record in records])
+        records = self._prefix_cache[1]
+        if after is not None:
+            records = records[bisect.bisect_right(self._prefix_cache[2], after) :]
+        return self._run_stages(records, pipeline[n_prefix:])
+
+    def _run_stages(self, records, stages):
+        for stage in stages:
+            ((operator, argument),) = stage.items()
+            if operator == "$match":
+                candidates = self._candidates(argument) if records is self.records else records
+                records = [record for record in candidates if _matches(record, argument)]
+            elif operator == "$sort":
+                for field, direction in reversed(list(argument.items())):
+                    records = sorted(records, key=lambda record: record.get(field, ""), reverse=direction < 0)
+            elif operator == "$skip":
+                records = records[argument:]
+            elif operator == "$limit":
+                records = records[:argument]
+            elif operator == "$project":
+                records = [_project(record, argument) for record in records]
+            else:
+                raise NotImplementedError(f"Unsupported stage {operator}")
+        return list(records)
+
+
+def populate_s3(s3_client, records: List[Dict[str, Any]], n_chunks: int = 50):
+    """Create the buckets and the postprocessed / raw zarr layout of some derived records.
+
+    Each stream gets ``n_chunks`` chunk objects, which a listing that does not use delimiters
+    would have to page through.
+    """
+    for bucket in (DERIVED_BUCKET, RAW_BUCKET):
+        s3_client.create_bucket(Bucket=bucket)
+    for record in records:
+        name = record["name"]
+        raw_name = name.split("_sorted_")[0]
+        for probe in PROBES:
+            stream = f"experiment1_Record Node 101#Neuropix-PXI-100.{probe}"
+            analyzer_prefix = f"{name}/postprocessed/{stream}_recording1.zarr"
+            s3_client.put_object(Bucket=DERIVED_BUCKET, Key=f"{analyzer_prefix}/.zgroup", Body=b"{}")
+            for chunk in range(n_chunks):
+                s3_client.put_object(Bucket=DERIVED_BUCKET, Key=f"{analyzer_prefix}/templates/average/{chunk}.0", Body=b"0")
+            raw_prefix = f"{raw_name}/ecephys/ecephys_compressed/{stream}.zarr"
+            s3_client.put_object(Bucket=RAW_BUCKET, Key=f"{raw_prefix}/.zgroup", Body=b"{}")
+
+
+def make_analyzer(folder: str, num_units: int, num_channels: int, duration: float):
+    """Create a synthetic zarr SortingAnalyzer with the extensions displayed by the GUI."""
+    import spikeinterface as si
+
+    recording, sorting = si.generate_ground_truth_recording(
+        durations=[duration], num_channels=num_channels, num_units=num_units, seed=0
+    )
+    analyzer = si.create_sorting_analyzer(sorting, recording, format="zarr", folder=folder)
+    analyzer.compute(
+        [
+            "random_spikes",
+            "noise_levels",
+            "templates",
+            "unit_locations",
+            "spike_amplitudes",
+            "correlograms",
+            "template_similarity",
+            "quality_metrics",
+            "template_metrics",
+        ]
+    )
+    return analyzer
@@ -1,3 +1,15 @@
 """AIND SIGUI Portal package."""
 
 __version__ = "0.1.0"
+
+import logging
+import os
+import sys
+
+# Console output for the package logger; per-session handlers are attached on top of it
+_logger = logging.getLogger(__name__)
+_logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+if not _logger.handlers:
+    _console_handler = logging.StreamHandler(sys.stderr)
+    _console_handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+    _logger.addHandler(_console_handler)
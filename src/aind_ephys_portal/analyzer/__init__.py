@@ -0,0 +1 @@
+"""Analyzer loading and caching for the AIND SIGUI Portal."""
@@ -0,0 +1,261 @@
+"""Process-wide cache of loaded SortingAnalyzer objects.
+
+The cache is shared by all Panel sessions served by the same process. Entries are keyed by
+``(analyzer_path, recording_path)`` and evicted in least-recently-used order when either the
+entry count or the estimated memory footprint exceeds its budget. Concurrent requests for the
+same key wait on a single in-flight load instead of starting duplicate loads.
+
+Cached analyzers are shared between sessions and must be treated as read-only: per-session
+state (e.g. the curation dictionary) has to be built as a private copy by the caller.
+
+Sessions pin the analyzers they display (``get_or_load(..., pin=True)``) and ``release`` them
+when they close. Pinned entries are never evicted, since dropping them would not free memory.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cache budgets
+ANALYZER_CACHE_MAX_BYTES = int(os.environ.get("ANALYZER_CACHE_MAX_BYTES", 8 * 1024**3))
+ANALYZER_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYZER_CACHE_MAX_ENTRIES", 8))
+
+
+def _nbytes(obj: Any) -> int:
+    """Recursively sum the size of numpy arrays contained in dicts, lists and tuples."""
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(v) for v in obj)
+    # pandas objects expose memory_usage
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        except Exception:
+            return 0
+    return 0
+
+
+def estimate_extension_nbytes(extension) -> int:
+    """Estimate the in-memory size of the data of an analyzer extension."""
+    return _nbytes(getattr(extension, "data", None))
+
+
+def estimate_analyzer_nbytes(analyzer) -> int:
+    """Estimate the resident memory of a SortingAnalyzer.
+
+    Extensions are loaded lazily by the GUI, so the estimate grows over the lifetime of
+    the analyzer and is re-evaluated by the cache on every eviction pass.
+
+    Parameters
+    ----------
+    analyzer : SortingAnalyzer
+        The analyzer to measure.
+
+    Returns
+    -------
+    int
+        Estimated size in bytes of the in-memory extension data and cached spike vectors.
+    """
+    nbytes = 0
+    for extension in getattr(analyzer, "extensions", {}).values():
+        nbytes += estimate_extension_nbytes(extension)
+    sorting = getattr(analyzer, "sorting", None)
+    if sorting is not None:
+        nbytes += _nbytes(getattr(sorting, "_cached_spike_vector", None))
+    return nbytes
+
+
+class AnalyzerCache:
+    """Thread-safe LRU cache of loaded analyzers with single-flight loading.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget for all cached analyzers, as estimated by ``sizeof``.
+    max_entries : int
+        Maximum number of cached analyzers.
+    sizeof : callable, optional
+        Function returning the estimated size in bytes of a cached value,
+        by default ``estimate_analyzer_nbytes``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = ANALYZER_CACHE_MAX_BYTES,
+        max_entries: int = ANALYZER_CACHE_MAX_ENTRIES,
+        sizeof: Callable[[Any], int] = estimate_analyzer_nbytes,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._pins: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(analyzer_path: str, recording_path: str = "") -> Tuple[str, str]:
+        """Build the cache key for an analyzer and its (optional) processed recording."""
+        return (analyzer_path.rstrip("/"), recording_path.rstrip("/"))
+
+    def get_or_load(self, analyzer_path: str, recording_path: str, loader: Callable[[], Any], pin: bool = False):
+        """Return the cached analyzer for the given paths, loading it if needed.
+
+        If another thread is already loading the same key, this call blocks until that
+        load finishes and returns its result (or re-raises its exception).
+
+        Parameters
+        ----------
+        analyzer_path : str
+            Path to the analyzer zarr folder.
+        recording_path : str
+            Path to the processed recording, or "" if none is attached.
+        loader : callable
+            Zero-argument function that loads and returns the analyzer.
+        pin : bool, optional
+            Keep the entry in the cache until ``release`` is called, by default False
+
+        Returns
+        -------
+        SortingAnalyzer
+            The shared, read-only analyzer.
+        """
+        key = self.make_key(analyzer_path, recording_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if pin:
+                    self._pin(key)
+                return self._entries[key]
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_owner:
+            logger.info(f"Waiting for in-flight load of {analyzer_path}")
+            value = future.result()
+            if pin:
+                with self._lock:
+                    # the entry may have been dropped in between, it is reinserted for the pin
+                    self._entries.setdefault(key, value)
+                    self._pin(key)
+            return value
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if pin:
+                self._pin(key)
+            self._evict(keep=key)
+        future.set_result(value)
+        return value
+
+    def _evict(self, keep: Optional[Hashable] = None):
+        """Drop least-recently-used entries until both budgets are met.
+
+        The most recently inserted entry (``keep``) and pinned entries are never evicted, even
+        if they alone exceed the budgets.
+        """
+        evictable = [key for key in self._entries if key != keep and key not in self._pins]
+        n_excess = max(len(self._entries) - self.max_entries, 0)
+        for key in evictable[:n_excess]:
+            self._drop(key)
+        evictable = evictable[n_excess:]
+
+        sizes = {key: self.sizeof(value) for key, value in self._entries.items()}
+        total = sum(sizes.values())
+        for key in evictable:
+            if total <= self.max_bytes:
+                break
+            total -= sizes[key]
+            self._drop(key)
+
+    def evict(self):
+        """Run an eviction pass, e.g. after cached analyzers grew with newly loaded extensions."""
+        with self._lock:
+            self._evict()
+
+    def _pin(self, key: Hashable):
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def _drop(self, key: Hashable):
+        self._entries.pop(key, None)
+        logger.info(f"Evicted analyzer {key[0]} from shared cache")
+
+    def release(self, analyzer_path: str, recording_path: str = ""):
+        """Release a pin taken by ``get_or_load``, making the entry evictable again once unused."""
+        key = self.make_key(analyzer_path, recording_path)
+        with self._lock:
+            n_pins = self._pins.get(key, 0) - 1
+            if n_pins > 0:
+                self._pins[key] = n_pins
+                return
+            self._pins.pop(key, None)
+            self._evict()
+
+    def invalidate(self, analyzer_path: str, recording_path: str = ""):
+        """Remove an entry from the cache, if present."""
+        with self._lock:
+            self._entries.pop(self.make_key(analyzer_path, recording_path), None)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def nbytes(self) -> int:
+        """Current estimated size of all cached analyzers in bytes."""
+        with self._lock:
+            return sum(self.sizeof(value) for value in self._entries.values())
+
+    @property
+    def pinned(self) -> int:
+        """Number of entries pinned by open sessions."""
+        with self._lock:
+            return len(self._pins)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of analyzers being loaded."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+# Shared instance used by all sessions in this process
+analyzer_cache = AnalyzerCache()
@@ -0,0 +1,250 @@
+"""Persistent on-disk read-through cache for S3-backed zarr stores.
+
+When enabled, whole-object reads issued by zarr through fsspec's ``s3`` protocol (analyzer
+groups, extension arrays and ``ecephys_compressed`` recording chunks) are served from a local
+directory and only fetched from S3 on a miss. The cache is bounded by size and evicts in
+least-recently-used order, using file modification times as the recency clock.
+
+Several Panel worker processes can share the same directory: entries are written to a
+temporary file and atomically renamed into place, readers tolerate entries disappearing,
+and eviction is serialized with an advisory file lock.
+
+Cached objects are assumed immutable, which holds for the chunks of derived assets since every
+pipeline run writes to a new asset location. Zarr metadata objects (``.zmetadata``, ``.zgroup``,
+``.zarray``, ``.zattrs``) are not: they are rewritten in place, e.g. by ``consolidate_analyzer``,
+so they are always read from S3. The only metadata served from the cache is the one stored on
+purpose under an ``override_key``, e.g. consolidated metadata of buckets the portal cannot
+write to. Use ``DiskChunkCache.clear`` to drop stale entries.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import fsspec
+from s3fs import S3FileSystem
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (disabled unless a directory is given)
+CHUNK_CACHE_DIR = os.environ.get("CHUNK_CACHE_DIR", "")
+CHUNK_CACHE_MAX_BYTES = int(os.environ.get("CHUNK_CACHE_MAX_BYTES", 50 * 1024**3))
+
+# Objects rewritten in place, which are not cached on read
+METADATA_SUFFIXES = (".zmetadata", ".zgroup", ".zarray", ".zattrs")
+
+
+def override_key(key: str) -> str:
+    """Key of an object stored in the cache to be served instead of the S3 object ``key``."""
+    return f"{key}#override"
+
+
+class DiskChunkCache:
+    """Size-bounded LRU cache of immutable objects stored as files in a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory, created if needed. May be shared by several processes.
+    max_bytes : int
+        Size limit of the cache directory in bytes.
+    evict_to : float, optional
+        Fraction of ``max_bytes`` to shrink to when the limit is exceeded, by default 0.9
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CHUNK_CACHE_MAX_BYTES, evict_to: float = 0.9):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.evict_to = evict_to
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_path = os.path.join(self.directory, ".lock")
+        self._stats_lock = threading.Lock()
+        # bytes written since the last size check, triggers eviction passes
+        self._pending_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hit = 0
+        self.bytes_missed = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for ``key``, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # refresh recency for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+        with self._stats_lock:
+            self.hits += 1
+            self.bytes_hit += len(data)
+        return data
+
+    def contains(self, key: str) -> bool:
+        """Whether ``key`` is cached, without counting a hit or refreshing its recency."""
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes):
+        """Store ``data`` for ``key``, evicting old entries if the size limit is exceeded."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write chunk cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._stats_lock:
+            self.bytes_missed += len(data)
+            self._pending_bytes += len(data)
+            check_size = self._pending_bytes > (1 - self.evict_to) * self.max_bytes
+            if check_size:
+                self._pending_bytes = 0
+        if check_size:
+            self.evict()
+
+    @contextmanager
+    def _exclusive(self, blocking: bool = True):
+        """Hold the advisory lock of the directory. Yields False if not blocking and the lock is taken."""
+        with open(self._lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in its budget.
+
+        Only one process evicts at a time; others skip the pass while the lock is held.
+        """
+        with self._exclusive(blocking=False) as locked:
+            if not locked:
+                return
+            entries = []
+            total = 0
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            target = self.evict_to * self.max_bytes
+            entries.sort()
+            n_removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                n_removed += 1
+            logger.info(f"Chunk cache evicted {n_removed} entries from {self.directory}")
+
+    def clear(self):
+        """Delete all cached entries, waiting for a running eviction pass to finish."""
+        with self._exclusive():
+            for shard in os.scandir(self.directory):
+                if shard.is_dir():
+                    for entry in os.scandir(shard.path):
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+
+    def stats(self) -> dict:
+        """Hit and miss counters of this process."""
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_hit": self.bytes_hit,
+                "bytes_missed": self.bytes_missed,
+            }
+
+
+class CachedS3FileSystem(S3FileSystem):
+    """S3 filesystem serving whole-object reads through ``chunk_cache``.
+
+    Disk I/O runs in the default executor of the event loop, so it does not block the other
+    requests in flight on the fsspec loop.
+    """
+
+    chunk_cache: Optional[DiskChunkCache] = None
+
+    async def _cat_file(self, path, version_id=None, start=None, end=None, **kwargs):
+        cache = self.chunk_cache
+        # ranged reads are not cached
+        if cache is None or start is not None or end is not None:
+            return await super()._cat_file(path, version_id=version_id, start=start, end=end, **kwargs)
+        loop = asyncio.get_running_loop()
+        key = self._strip_protocol(path) + (f"?versionId={version_id}" if version_id else "")
+        if key.endswith(METADATA_SUFFIXES):
+            data = None
+            if await loop.run_in_executor(None, cache.contains, override_key(key)):
+                data = await loop.run_in_executor(None, cache.get, override_key(key))
+            if data is None:
+                data = await super()._cat_file(path, version_id=version_id, **kwargs)
+            return data
+        data = await loop.run_in_executor(None, cache.get, key)
+        if data is None:
+            data = await super()._cat_file(path, version_id=version_id, **kwargs)
+            await loop.run_in_executor(None, cache.put, key, data)
+        return data
+
+
+def enable_chunk_cache(directory: str = CHUNK_CACHE_DIR, max_bytes: int = CHUNK_CACHE_MAX_BYTES):
+    """Route all ``s3://`` zarr reads of this process through an on-disk chunk cache.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory. If empty, the cache stays disabled.
+    max_bytes : int
+        Size limit of the cache directory in bytes.
+
+    Returns
+    -------
+    DiskChunkCache or None
+        The active cache, or None if disabled.
+    """
+    if not directory:
+        return None
+    CachedS3FileSystem.chunk_cache = DiskChunkCache(directory, max_bytes=max_bytes)
+    fsspec.register_implementation("s3", CachedS3FileSystem, clobber=True)
+    logger.info(f"Chunk cache enabled at {directory} ({max_bytes / 1024**3:.1f} GB)")
+    return CachedS3FileSystem.chunk_cache
+
+
+def get_chunk_cache() -> Optional[DiskChunkCache]:
+    """Return the active chunk cache, or None if it is disabled."""
+    return CachedS3FileSystem.chunk_cache
@@ -0,0 +1,193 @@
+"""Consolidated zarr metadata for SortingAnalyzer stores.
+
+zarr keeps the metadata of every group and array in its own small ``.zgroup``/``.zarray``/``.zattrs``
+object, so opening an analyzer over S3 without consolidated metadata costs one round trip per
+group and array. Consolidated metadata gathers all of them in a single ``.zmetadata`` object,
+which spikeinterface reads first when it is present.
+
+Analyzers written by older pipeline versions have no, or incomplete, consolidated metadata. This
+module writes it either in place or, for buckets the portal cannot write to, into the on-disk
+chunk cache (see ``aind_ephys_portal.analyzer.chunk_cache``), from where it is served like any
+other cached object. As a batch job::
+
+    python -m aind_ephys_portal.analyzer.consolidate s3://bucket/asset/postprocessed/stream.zarr ...
+    python -m aind_ephys_portal.analyzer.consolidate --cache-dir /cache s3://bucket/asset
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from s3fs import S3FileSystem
+
+from aind_ephys_portal.analyzer.chunk_cache import CHUNK_CACHE_DIR, DiskChunkCache, get_chunk_cache, override_key
+from aind_ephys_portal.analyzer.trace_pyramid import SIDECAR_SUFFIX
+from aind_ephys_portal.s3.client import prefix_exists, split_s3_url
+
+METADATA_KEY = ".zmetadata"
+METADATA_SUFFIXES = (".zgroup", ".zarray", ".zattrs")
+
+
+def _get_mapper(analyzer_path: str, storage_options: Optional[dict] = None):
+    # S3 is read directly: the chunk cache would answer with the metadata being checked
+    if analyzer_path.startswith("s3://"):
+        return S3FileSystem(**(storage_options or {})).get_mapper(analyzer_path)
+    import fsspec
+
+    return fsspec.get_mapper(analyzer_path, **(storage_options or {}))
+
+
+def _cache_key(mapper) -> str:
+    # served by CachedS3FileSystem instead of the .zmetadata object
+    return override_key(f"{mapper.root}/{METADATA_KEY}")
+
+
+def has_consolidated_metadata(analyzer_path: str, chunk_cache: Optional[DiskChunkCache] = None) -> bool:
+    """Whether an analyzer can be opened through consolidated metadata, in place or from the chunk cache.
+
+    Parameters
+    ----------
+    analyzer_path : str
+        Local or ``s3://`` path of the analyzer zarr folder.
+    chunk_cache : DiskChunkCache, optional
+        Chunk cache to look into, by default the active one.
+    """
+    analyzer_path = str(analyzer_path).rstrip("/")
+    chunk_cache = chunk_cache if chunk_cache is not None else get_chunk_cache()
+    if analyzer_path.startswith("s3://"):
+        if chunk_cache is not None and chunk_cache.contains(override_key(f"{analyzer_path[5:]}/{METADATA_KEY}")):
+            return True
+        bucket, prefix = split_s3_url(analyzer_path)
+        return prefix_exists(bucket, f"{prefix}/{METADATA_KEY}")
+    return os.path.exists(os.path.join(analyzer_path, METADATA_KEY))
+
+
+def build_consolidated_metadata(mapper) -> bytes:
+    """Gather the metadata objects of a zarr store into a ``.zmetadata`` document.
+
+    The store is listed once and the metadata objects are fetched concurrently. The document has
+    the layout and encoding written by ``zarr.consolidate_metadata``.
+    """
+    keys = sorted(key for key in mapper if key.endswith(METADATA_SUFFIXES))
+    values = mapper.getitems(keys, on_error="omit")
+    consolidated = {
+        "zarr_consolidated_format": 1,
+        "metadata": {key: json.loads(values[key]) for key in keys if key in values},
+    }
+    return json.dumps(consolidated, indent=4, sort_keys=True, ensure_ascii=True, separators=(",", ": ")).encode()
+
+
+def consolidate_analyzer(
+    analyzer_path: str,
+    storage_options: Optional[dict] = None,
+    chunk_cache: Optional[DiskChunkCache] = None,
+    dry_run: bool = False,
+) -> str:
+    """Write up-to-date consolidated metadata for an analyzer.
+
+    Existing consolidated metadata is rewritten only if it misses groups or arrays, or is stale.
+
+    Parameters
+    ----------
+    analyzer_path : str
+        Local or ``s3://`` path of the analyzer zarr folder.
+    storage_options : dict, optional
+        fsspec storage options, e.g. ``{"anon": True}``.
+    chunk_cache : DiskChunkCache, optional
+        If given, the metadata is stored in this chunk cache instead of in place.
+    dry_run : bool, optional
+        Only report what would be done, by default False
+
+    Returns
+    -------
+    str
+        One of "up-to-date", "written", "cached" and "outdated" (dry run).
+    """
+    mapper = _get_mapper(str(analyzer_path).rstrip("/"), storage_options)
+    consolidated = build_consolidated_metadata(mapper)
+    if chunk_cache is not None:
+        current = chunk_cache.get(_cache_key(mapper))
+    else:
+        current = mapper.get(METADATA_KEY)
+    if current is not None and json.loads(current) == json.loads(consolidated):
+        return "up-to-date"
+    if dry_run:
+        return "outdated"
+    if chunk_cache is not None:
+        chunk_cache.put(_cache_key(mapper), consolidated)
+        return "cached"
+    mapper[METADATA_KEY] = consolidated
+    return "written"
+
+
+def find_analyzers(path: str, storage_options: Optional[dict] = None) -> List[str]:
+    """Expand a path to analyzer zarr folders.
+
+    Paths ending with ``.zarr`` are returned as is; asset folders are expanded to the streams
+    found in their ``postprocessed`` folder.
+    """
+    import fsspec
+
+    path = str(path).rstrip("/")
+    if path.endswith(".zarr"):
+        return [path]
+    fs, root = fsspec.core.url_to_fs(path, **(storage_options or {}))
+    streams = fs.ls(f"{root}/postprocessed", detail=False)
+    return sorted(
+        fs.unstrip_protocol(stream)
+        for stream in streams
+        if stream.rstrip("/").endswith(".zarr") and not stream.rstrip("/").endswith(SIDECAR_SUFFIX)
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m aind_ephys_portal.analyzer.consolidate",
+        description="Write consolidated zarr metadata for SortingAnalyzer folders.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Analyzer zarr folders, or asset folders whose postprocessed streams are consolidated"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const=CHUNK_CACHE_DIR,
+        default=None,
+        help="Store the metadata in this chunk cache directory instead of in place (default: CHUNK_CACHE_DIR)",
+    )
+    parser.add_argument("--anon", action="store_true", help="Access S3 anonymously")
+    parser.add_argument("--dry-run", action="store_true", help="Only report analyzers with outdated metadata")
+    parser.add_argument("--workers", type=int, default=8, help="Number of analyzers processed concurrently")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir == "":
+        parser.error("--cache-dir needs a directory when CHUNK_CACHE_DIR is not set")
+    storage_options = {"anon": True} if args.anon else None
+    chunk_cache = DiskChunkCache(args.cache_dir) if args.cache_dir else None
+
+    def run(analyzer_path):
+        try:
+            return analyzer_path, consolidate_analyzer(analyzer_path, storage_options, chunk_cache, args.dry_run)
+        except Exception as e:
+            return analyzer_path, f"error: {e}"
+
+    analyzer_paths = []
+    n_errors = 0
+    for path in args.paths:
+        try:
+            analyzer_paths.extend(find_analyzers(path, storage_options))
+        except Exception as e:
+            print(f"{path}: error: {e}", file=sys.stderr)
+            n_errors += 1
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for analyzer_path, status in executor.map(run, analyzer_paths):
+            print(f"{analyzer_path}: {status}")
+            n_errors += status.startswith("error")
+    return 1 if n_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Processed recording attached to an analyzer without opening it.
+
+Opening the processed recording (a compressed zarr on S3) is only needed by the trace views,
+but it used to delay every GUI launch. ``LazyRecording`` is built from the recording
+attributes stored in the analyzer, so it can be attached with ``set_temporary_recording``
+right away. The extractor is opened in a background thread on the first request for raw
+traces; while it is opening, blank traces are returned. If it cannot be opened, requests for
+raw traces raise the error until ``retry_open`` succeeds.
+
+The proxy stays attached to the analyzer once the extractor is open: it forwards the
+requests for raw traces to the extractor. With a trace pyramid (see
+``aind_ephys_portal.analyzer.trace_pyramid``), wide windows are served from its coarsest
+adequate level and only fine zoom reads raw samples.
+
+Callbacks added to ``opened`` run once the current open attempt ends, e.g. to redraw the
+trace views or to report the error.
+"""
+
+import inspect
+import logging
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+from spikeinterface.core import BaseRecording, BaseRecordingSegment
+
+from aind_ephys_portal.metrics.registry import timed
+
+logger = logging.getLogger(__name__)
+
+# spikeinterface < 0.103 names the scaling argument of get_traces ``return_scaled``
+if "return_in_uV" in inspect.signature(BaseRecording.get_traces).parameters:
+    UNSCALED_TRACES_KWARGS = {"return_in_uV": False}
+else:
+    UNSCALED_TRACES_KWARGS = {"return_scaled": False}
+
+
+def remap_recording_dict(analyzer, recording_path: str) -> dict:
+    """Extractor dictionary of the analyzer's recording, with its folder path set to ``recording_path``."""
+    from spikeinterface.core.core_tools import extractor_dict_iterator, set_value_in_extractor_dict
+
+    analyzer_root = analyzer._get_zarr_root(mode="r")
+    recording_root = analyzer_root["recording"]
+    recording_dict = recording_root[0]
+    # Remap path and set relative to to false
+    recording_dict["relative_paths"] = False
+    # update_key(recording_dict, "relative_paths", False)
+    path_list_iter = extractor_dict_iterator(recording_dict)
+    for path_iter in path_list_iter:
+        if "folder_path" in path_iter.name:
+            access_path = path_iter.access_path
+            break
+    set_value_in_extractor_dict(recording_dict, access_path, recording_path)
+    return recording_dict
+
+
+class LazyRecording(BaseRecording):
+    """Recording with the channels and durations of an analyzer, opened on first use of its traces.
+
+    Parameters
+    ----------
+    recording_dict : dict
+        Extractor dictionary of the recording, with its paths already remapped.
+    rec_attributes : dict
+        Recording attributes of the analyzer (``SortingAnalyzer.rec_attributes``).
+    trace_pyramid : TracePyramid, optional
+        Min/max pyramid of the recording, serving wide windows.
+    """
+
+    def __init__(self, recording_dict: dict, rec_attributes: dict, trace_pyramid=None):
+        BaseRecording.__init__(
+            self,
+            sampling_frequency=rec_attributes["sampling_frequency"],
+            channel_ids=rec_attributes["channel_ids"],
+            dtype=rec_attributes["dtype"],
+        )
+        if rec_attributes.get("probegroup") is not None:
+            self.set_probegroup(rec_attributes["probegroup"], in_place=True)
+        for key, values in rec_attributes.get("properties", {}).items():
+            self.set_property(key, values)
+        self.annotate(is_filtered=rec_attributes["is_filtered"])
+        for segment_index, num_samples in enumerate(rec_attributes["num_samples"]):
+            self.add_recording_segment(LazyRecordingSegment(self, segment_index, num_samples))
+
+        self.recording_dict = recording_dict
+        self.trace_pyramid = trace_pyramid
+        self.opened: Future = Future()
+        self._open_lock = threading.Lock()
+        self._open_started = False
+        # the extractor dict of the proxy is not meant to be saved or sent to other processes
+        self._serializability = {"memory": True, "json": False, "pickle": False}
+
+    def open_async(self) -> Future:
+        """Start opening the recording in a background thread, if not started yet.
+
+        A failed attempt is not restarted, see ``retry_open``.
+        """
+        with self._open_lock:
+            if not self._open_started:
+                self._open_started = True
+                threading.Thread(target=self._open, args=(self.opened,), name="recording-open", daemon=True).start()
+            return self.opened
+
+    def retry_open(self) -> Future:
+        """Open the recording again if the last attempt failed, and return the future of the current attempt."""
+        with self._open_lock:
+            if self.opened.done() and self.opened.exception() is not None:
+                self.opened = Future()
+                self._open_started = False
+        return self.open_async()
+
+    def _open(self, opened: Future):
+        import spikeinterface as si
+
+        logger.info("Opening processed recording in the background")
+        try:
+            with timed("analyzer.open_recording"):
+                recording = si.load(self.recording_dict)
+        except Exception as e:
+            logger.exception(f"Error opening processed recording: {e}")
+            opened.set_exception(e)
+            return
+        logger.info(f"Processed recording loaded: {recording}")
+        opened.set_result(recording)
+
+
+class LazyRecordingSegment(BaseRecordingSegment):
+    def __init__(self, parent: LazyRecording, segment_index: int, num_samples: int):
+        BaseRecordingSegment.__init__(self, sampling_frequency=parent.sampling_frequency)
+        self._lazy_parent = parent
+        self._segment_index = segment_index
+        self._num_samples = num_samples
+
+    def get_num_samples(self) -> int:
+        return self._num_samples
+
+    def get_traces(self, start_frame=None, end_frame=None, channel_indices=None) -> np.ndarray:
+        start_frame = 0 if start_frame is None else start_frame
+        end_frame = self._num_samples if end_frame is None else end_frame
+        trace_pyramid = self._lazy_parent.trace_pyramid
+        if trace_pyramid is not None:
+            factor = trace_pyramid.level_for(end_frame - start_frame)
+            if factor is not None:
+                return trace_pyramid.get_traces(self._segment_index, start_frame, end_frame, factor, channel_indices)
+        opened = self._lazy_parent.open_async()
+        channel_ids = self._lazy_parent.channel_ids
+        if channel_indices is not None:
+            channel_ids = channel_ids[channel_indices]
+        if not opened.done():
+            return np.zeros((end_frame - start_frame, len(channel_ids)), dtype=self._lazy_parent.get_dtype())
+        # raises the error of a failed open
+        return opened.result().get_traces(
+            segment_index=self._segment_index,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            channel_ids=channel_ids,
+            **UNSCALED_TRACES_KWARGS,
+        )
@@ -0,0 +1,203 @@
+"""Server-wide admission control for analyzer loads.
+
+Loads are queued in FIFO order and run on a thread pool, at most ``max_concurrent`` at a time.
+Loads that bring a new analyzer into memory are additionally held back while the analyzers
+resident in the process exceed ``max_bytes``, until sessions close and release theirs. Before
+holding a load back, the queue asks the analyzer cache to evict the unused analyzers over its
+budget, which may have grown with their extensions since they were inserted. Loads of analyzers
+that are already resident only wait for a free slot.
+
+Waiting loads are told their position in the queue through a callback, so sessions can show
+where they stand during a burst of requests.
+
+``load_queue`` is the queue of the GUI sessions of the process. Background work that should not
+delay them, like the portal warm-up, checks that no load is waiting before starting.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from aind_ephys_portal.analyzer.cache import ANALYZER_CACHE_MAX_BYTES, analyzer_cache
+from aind_ephys_portal.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Memory of resident analyzers above which new analyzers are not loaded
+ANALYZER_MEMORY_BUDGET = int(os.environ.get("ANALYZER_MEMORY_BUDGET", 2 * ANALYZER_CACHE_MAX_BYTES))
+# Number of analyzers loaded concurrently by the GUI sessions of the process
+ANALYZER_LOAD_WORKERS = int(os.environ.get("ANALYZER_LOAD_WORKERS", 4))
+
+LOADS_QUEUED = registry.gauge("aind_ephys_portal_gui_loads_queued", "Number of analyzer loads waiting in the queue")
+
+
+class _Ticket:
+    def __init__(self, func: Callable[[], Any], needs_memory: bool, on_position: Optional[Callable[[int], None]]):
+        self.func = func
+        self.needs_memory = needs_memory
+        self.on_position = on_position
+        self.future: Future = Future()
+        self.position = None
+
+
+class LoadQueue:
+    """FIFO queue of loads bounded in concurrency and memory.
+
+    Parameters
+    ----------
+    executor : Executor
+        Pool running the admitted loads. It should have at least ``max_concurrent`` workers.
+    max_concurrent : int
+        Maximum number of loads running at the same time.
+    max_bytes : int
+        Memory budget checked before starting loads that need memory.
+    memory_in_use : callable
+        Zero-argument function returning the memory currently used by resident analyzers.
+    reclaim : callable, optional
+        Zero-argument function freeing unused memory, called before holding back a load.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        max_concurrent: int,
+        max_bytes: int = ANALYZER_MEMORY_BUDGET,
+        memory_in_use: Callable[[], int] = lambda: 0,
+        reclaim: Callable[[], None] = lambda: None,
+    ):
+        self.executor = executor
+        self.max_concurrent = max_concurrent
+        self.max_bytes = max_bytes
+        self.memory_in_use = memory_in_use
+        self.reclaim = reclaim
+        self._waiting: Deque[_Ticket] = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        func: Callable[[], Any],
+        needs_memory: bool = True,
+        on_position: Optional[Callable[[int], None]] = None,
+    ) -> Future:
+        """Queue a load.
+
+        Parameters
+        ----------
+        func : callable
+            Zero-argument function running the load.
+        needs_memory : bool, optional
+            Whether the load brings a new analyzer into memory, by default True
+        on_position : callable, optional
+            Called with the 1-based position in the queue whenever it changes, and with 0 when
+            the load starts. May be called from any thread.
+
+        Returns
+        -------
+        Future
+            Result of ``func``. Cancelling it with ``cancel`` removes a waiting load from the queue.
+        """
+        ticket = _Ticket(func, needs_memory, on_position)
+        with self._lock:
+            self._waiting.append(ticket)
+        self.dispatch()
+        return ticket.future
+
+    def cancel(self, future: Future) -> bool:
+        """Remove a waiting load from the queue. Returns False if it already started."""
+        with self._lock:
+            for ticket in self._waiting:
+                if ticket.future is future:
+                    self._waiting.remove(ticket)
+                    break
+            else:
+                return False
+        future.cancel()
+        self.dispatch()
+        return True
+
+    def dispatch(self):
+        """Start the loads that fit in the budgets and update the positions of the others.
+
+        Called on every change of the queue; call it as well when memory is released.
+        """
+        started: List[_Ticket] = []
+        moved: List[Tuple[_Ticket, int]] = []
+        with self._lock:
+            over_budget = None
+            for ticket in list(self._waiting):
+                if self._running >= self.max_concurrent:
+                    break
+                if ticket.needs_memory:
+                    if over_budget is None:
+                        over_budget = self._over_budget()
+                    if over_budget:
+                        continue
+                self._waiting.remove(ticket)
+                self._running += 1
+                started.append(ticket)
+            for position, ticket in enumerate(self._waiting, start=1):
+                if ticket.position != position:
+                    ticket.position = position
+                    moved.append((ticket, position))
+            LOADS_QUEUED.set(len(self._waiting))
+
+        for ticket in started:
+            ticket.position = 0
+            moved.append((ticket, 0))
+        for ticket, position in moved:
+            if ticket.on_position is not None:
+                try:
+                    ticket.on_position(position)
+                except Exception as e:
+                    logger.warning(f"Error reporting queue position: {e}")
+        for ticket in started:
+            self.executor.submit(self._run, ticket)
+
+    def _over_budget(self) -> bool:
+        if self.memory_in_use() < self.max_bytes:
+            return False
+        try:
+            self.reclaim()
+        except Exception as e:
+            logger.warning(f"Error reclaiming memory: {e}")
+        return self.memory_in_use() >= self.max_bytes
+
+    def _run(self, ticket: _Ticket):
+        try:
+            if ticket.future.set_running_or_notify_cancel():
+                try:
+                    ticket.future.set_result(ticket.func())
+                except BaseException as e:
+                    ticket.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self.dispatch()
+
+    @property
+    def waiting(self) -> int:
+        """Number of loads waiting in the queue."""
+        with self._lock:
+            return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        """Number of loads running."""
+        with self._lock:
+            return self._running
+
+
+# Analyzers are loaded in threads (not processes) so the loaded object can be shared
+# with the session and the process-wide analyzer cache
+_load_executor = ThreadPoolExecutor(max_workers=ANALYZER_LOAD_WORKERS, thread_name_prefix="analyzer-load")
+# Loads of all sessions wait here for a worker and, for analyzers not in memory yet, for the memory budget
+load_queue = LoadQueue(
+    _load_executor,
+    max_concurrent=ANALYZER_LOAD_WORKERS,
+    memory_in_use=lambda: analyzer_cache.nbytes,
+    reclaim=analyzer_cache.evict,
+)
@@ -0,0 +1,63 @@
+"""Opening of analyzers for the GUI and the portal warm-up.
+
+``load_analyzer`` opens an analyzer without its extensions and attaches the processed
+recording lazily. It is the loader of the shared analyzer cache, used both by GUI sessions
+and by the speculative warm-up of the portal (see ``aind_ephys_portal.analyzer.warmup``), so
+both produce the same cache entries.
+"""
+
+import logging
+
+from aind_ephys_portal.analyzer.chunk_cache import enable_chunk_cache, get_chunk_cache
+from aind_ephys_portal.analyzer.consolidate import has_consolidated_metadata
+from aind_ephys_portal.analyzer.trace_pyramid import find_trace_pyramid
+from aind_ephys_portal.metrics.registry import timed
+
+logger = logging.getLogger(__name__)
+
+# Opt-in on-disk cache for S3 zarr reads, configured with CHUNK_CACHE_DIR / CHUNK_CACHE_MAX_BYTES
+if get_chunk_cache() is None:
+    enable_chunk_cache()
+
+
+def load_analyzer(analyzer_path: str, recording_path: str = ""):
+    """Open an analyzer without loading its extensions and attach the processed recording, if any."""
+    import spikeinterface as si
+
+    logger.info(f"Loading analyzer from {analyzer_path}...")
+    # spikeinterface opens through consolidated metadata when present; without it every group
+    # and array costs a round trip
+    with timed("analyzer.check_consolidated"):
+        try:
+            consolidated = has_consolidated_metadata(analyzer_path)
+        except Exception as e:
+            logger.warning(f"Could not check the consolidated metadata of {analyzer_path}: {e}")
+            consolidated = None
+    if consolidated is False:
+        logger.warning(
+            f"{analyzer_path} has no consolidated metadata, opening it will be slow. "
+            "Run `python -m aind_ephys_portal.analyzer.consolidate` on it."
+        )
+    with timed("analyzer.zarr_open"):
+        analyzer = si.load(analyzer_path, load_extensions=False)
+    logger.info(f"Analyzer loaded: {analyzer}")
+    if recording_path != "":
+        with timed("analyzer.find_trace_pyramid"):
+            trace_pyramid = find_trace_pyramid(analyzer_path, recording_path, analyzer.rec_attributes)
+        set_processed_recording(analyzer, recording_path, trace_pyramid=trace_pyramid)
+    chunk_cache = get_chunk_cache()
+    if chunk_cache is not None:
+        stats = chunk_cache.stats()
+        logger.info(f"Chunk cache: {stats['hits']} hits, {stats['misses']} misses")
+    return analyzer
+
+
+@timed("analyzer.set_processed_recording")
+def set_processed_recording(analyzer, recording_path: str, trace_pyramid=None):
+    """Attach the processed recording lazily: it is opened when raw traces are first requested."""
+    from aind_ephys_portal.analyzer.lazy_recording import LazyRecording, remap_recording_dict
+
+    logger.info(f"Attaching processed recording from {recording_path}")
+    recording_dict = remap_recording_dict(analyzer, recording_path)
+    recording_processed = LazyRecording(recording_dict, analyzer.rec_attributes, trace_pyramid=trace_pyramid)
+    analyzer.set_temporary_recording(recording_processed)
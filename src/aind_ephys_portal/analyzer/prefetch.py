@@ -0,0 +1,143 @@
+"""Concurrent loading of analyzer extensions before the GUI is built.
+
+Analyzers are opened with ``load_extensions=False`` and ``run_mainwindow`` then loads the
+extensions it needs one after the other, each one paying the S3 latency of its groups and
+arrays. ``prefetch_extensions`` loads the saved extensions of an allow-list concurrently on a
+process-wide, bounded thread pool, so the GUI finds them in ``analyzer.extensions``.
+
+The load time and in-memory size of each extension are logged and recorded in metrics.
+
+``load_extension`` is also used by the portal warm-up on the same cached analyzers: an
+extension is loaded by one thread at a time, the others find it loaded.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+
+from aind_ephys_portal.analyzer.cache import estimate_extension_nbytes
+from aind_ephys_portal.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Extensions used by the GUI views; waveforms are skipped by the GUI
+DEFAULT_PREFETCH_EXTENSIONS = [
+    "random_spikes",
+    "templates",
+    "noise_levels",
+    "unit_locations",
+    "quality_metrics",
+    "template_metrics",
+    "spike_amplitudes",
+    "amplitude_scalings",
+    "spike_locations",
+    "correlograms",
+    "isi_histograms",
+    "template_similarity",
+    "principal_components",
+]
+# Extensions loaded concurrently when an analyzer is opened; empty to disable the prefetch
+PREFETCH_EXTENSIONS = [
+    name.strip()
+    for name in os.environ.get("PREFETCH_EXTENSIONS", ",".join(DEFAULT_PREFETCH_EXTENSIONS)).split(",")
+    if name.strip()
+]
+# Number of extensions loaded concurrently, shared by all analyzer loads of the process
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", 8))
+
+EXTENSION_LOAD_SECONDS = registry.histogram(
+    "aind_ephys_portal_extension_load_seconds", "Duration of analyzer extension loads in seconds", ["extension"]
+)
+EXTENSION_LOADED_BYTES = registry.counter(
+    "aind_ephys_portal_extension_loaded_bytes_total", "In-memory size of the loaded analyzer extensions", ["extension"]
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Locks of the extensions of each analyzer, by extension name
+_extension_locks = weakref.WeakKeyDictionary()
+_extension_locks_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="extension-prefetch")
+    return _executor
+
+
+def _extension_lock(analyzer, extension_name: str) -> threading.Lock:
+    with _extension_locks_lock:
+        locks = _extension_locks.setdefault(analyzer, {})
+        return locks.setdefault(extension_name, threading.Lock())
+
+
+def load_extension(analyzer, extension_name: str) -> Optional[Dict[str, float]]:
+    """Load a saved extension unless it is loaded, waiting for another thread loading it.
+
+    Returns
+    -------
+    dict or None
+        ``{"seconds": ..., "bytes": ...}`` of the loaded extension, None if it was already loaded
+        or is not computed completely.
+    """
+    with _extension_lock(analyzer, extension_name):
+        if extension_name in analyzer.extensions:
+            return None
+        t_start = time.perf_counter()
+        extension = analyzer.load_extension(extension_name)
+        elapsed = time.perf_counter() - t_start
+    if extension is None:
+        # not computed completely, the GUI decides what to do with it
+        return None
+    nbytes = estimate_extension_nbytes(extension)
+    EXTENSION_LOAD_SECONDS.observe(elapsed, extension=extension_name)
+    EXTENSION_LOADED_BYTES.inc(nbytes, extension=extension_name)
+    return {"seconds": elapsed, "bytes": nbytes}
+
+
+def prefetch_extensions(analyzer, extension_names: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Load the saved extensions of an allow-list concurrently.
+
+    Extensions that are not saved in the analyzer, or already loaded, are skipped. Errors are
+    logged and leave the extension unloaded.
+
+    Parameters
+    ----------
+    analyzer : SortingAnalyzer
+        Analyzer opened with ``load_extensions=False``.
+    extension_names : sequence of str, optional
+        Extensions to load, by default PREFETCH_EXTENSIONS.
+
+    Returns
+    -------
+    dict
+        ``{"seconds": ..., "bytes": ...}`` of each loaded extension, by extension name.
+    """
+    extension_names = PREFETCH_EXTENSIONS if extension_names is None else extension_names
+    if analyzer.format == "memory":
+        return {}
+    saved = set(analyzer.get_saved_extension_names())
+    to_load = [name for name in extension_names if name in saved and name not in analyzer.extensions]
+    if len(to_load) == 0:
+        return {}
+
+    executor = _get_executor()
+    futures = {name: executor.submit(load_extension, analyzer, name) for name in to_load}
+    loaded = {}
+    for name, future in futures.items():
+        try:
+            stats = future.result()
+        except Exception as e:
+            logger.warning(f"Could not prefetch extension {name}: {e}")
+            continue
+        if stats is not None:
+            loaded[name] = stats
+            logger.info(f"Loaded {name} in {stats['seconds']:.2f} s ({stats['bytes'] / 1024**2:.1f} MB)")
+    return loaded
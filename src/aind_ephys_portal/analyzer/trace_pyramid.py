@@ -0,0 +1,324 @@
+"""Multi-resolution min/max pyramids of recording traces.
+
+Showing a wide time window in the trace views used to decompress every wavpack chunk of the
+window over S3. A trace pyramid stores, for every channel, the minimum and maximum of the
+traces over bins of increasing size (e.g. 64, 512, 4096 and 32768 samples), so a wide window is
+drawn from a few thousand bins instead of millions of samples. Raw samples are only read at
+fine zoom, when even the finest level would give too few bins.
+
+Pyramids are zarr groups stored either next to the analyzer (``<stream>_trace_pyramid.zarr``
+in the ``postprocessed`` folder) or in a local cache directory (``TRACE_PYRAMID_DIR``). They are
+built by a batch job::
+
+    python -m aind_ephys_portal.analyzer.trace_pyramid s3://bucket/asset/postprocessed/stream.zarr \\
+        --recording-path s3://bucket/raw_asset/ecephys/ecephys_compressed/stream.zarr
+
+Levels are computed chunk by chunk on a thread pool: the finest level from the recording and
+each coarser level from the previous one. Values are raw (unscaled) samples in the dtype of the
+recording.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from aind_ephys_portal.cache.cached import cached
+from aind_ephys_portal.metrics.registry import timed
+from aind_ephys_portal.s3.client import prefix_exists, split_s3_url
+
+logger = logging.getLogger(__name__)
+
+# Local directory of pyramids built with --cache-dir, looked up before the sidecars
+TRACE_PYRAMID_DIR = os.environ.get("TRACE_PYRAMID_DIR", "")
+# Bin sizes of the levels, in samples; each one a multiple of the previous one
+TRACE_PYRAMID_FACTORS = [int(f) for f in os.environ.get("TRACE_PYRAMID_FACTORS", "64,512,4096,32768").split(",")]
+# Minimum number of bins a level must give for a window to be served from it
+TRACE_PYRAMID_MIN_BINS = int(os.environ.get("TRACE_PYRAMID_MIN_BINS", 2000))
+# Seconds the location of a pyramid is cached, and the absence of one
+TRACE_PYRAMID_LOOKUP_TTL = float(os.environ.get("TRACE_PYRAMID_LOOKUP_TTL", 60 * 60))
+TRACE_PYRAMID_LOOKUP_NEGATIVE_TTL = float(os.environ.get("TRACE_PYRAMID_LOOKUP_NEGATIVE_TTL", 10 * 60))
+
+SIDECAR_SUFFIX = "_trace_pyramid.zarr"
+FORMAT_VERSION = 1
+# Number of bins computed per task, and zarr chunk length of the level arrays
+BINS_PER_CHUNK = 4096
+
+
+def sidecar_path(analyzer_path: str) -> str:
+    """Path of the pyramid stored next to an analyzer."""
+    analyzer_path = str(analyzer_path).rstrip("/")
+    if analyzer_path.endswith(".zarr"):
+        analyzer_path = analyzer_path[: -len(".zarr")]
+    return analyzer_path + SIDECAR_SUFFIX
+
+
+def cache_path(analyzer_path: str, recording_path: str = "", directory: Optional[str] = None) -> str:
+    """Path of the pyramid of an analyzer and recording in a local cache directory (default: TRACE_PYRAMID_DIR)."""
+    directory = TRACE_PYRAMID_DIR if directory is None else directory
+    key = f"{str(analyzer_path).rstrip('/')}|{str(recording_path).rstrip('/')}"
+    return os.path.join(directory, hashlib.sha256(key.encode()).hexdigest()[:32] + ".zarr")
+
+
+def _reduce_bins(data: np.ndarray, ratio: int, reduce) -> np.ndarray:
+    # the last bin may be partial
+    return reduce.reduceat(data, np.arange(0, data.shape[0], ratio), axis=0)
+
+
+def build_trace_pyramid(
+    recording,
+    output_path: str,
+    factors: Sequence[int] = TRACE_PYRAMID_FACTORS,
+    n_jobs: int = 8,
+    storage_options: Optional[dict] = None,
+    source: str = "",
+):
+    """Compute the min/max pyramid of a recording and write it to a zarr group.
+
+    Parameters
+    ----------
+    recording : BaseRecording
+        Recording whose traces are summarized, as shown by the trace views.
+    output_path : str
+        Local or ``s3://`` path of the zarr group, overwritten if it exists.
+    factors : sequence of int, optional
+        Bin sizes of the levels in samples, increasing, each a multiple of the previous one.
+    n_jobs : int, optional
+        Number of chunks processed concurrently, by default 8
+    storage_options : dict, optional
+        fsspec storage options of ``output_path``.
+    source : str, optional
+        Description of the recording stored in the attributes, e.g. its path.
+    """
+    import zarr
+
+    from aind_ephys_portal.analyzer.lazy_recording import UNSCALED_TRACES_KWARGS
+
+    factors = sorted(int(f) for f in factors)
+    if any(coarse % fine for fine, coarse in zip(factors, factors[1:])):
+        raise ValueError(f"Each pyramid factor must be a multiple of the previous one: {factors}")
+
+    kwargs = {"storage_options": storage_options} if storage_options else {}
+    root = zarr.open_group(str(output_path), mode="w", **kwargs)
+    num_channels = recording.get_num_channels()
+    dtype = recording.get_dtype()
+    num_samples = [recording.get_num_samples(segment_index) for segment_index in range(recording.get_num_segments())]
+
+    def compute_base(segment_index, level, b0, b1):
+        factor = factors[0]
+        traces = recording.get_traces(
+            segment_index=segment_index,
+            start_frame=b0 * factor,
+            end_frame=min(b1 * factor, num_samples[segment_index]),
+            **UNSCALED_TRACES_KWARGS,
+        )
+        level["min"][b0:b1] = _reduce_bins(traces, factor, np.minimum)
+        level["max"][b0:b1] = _reduce_bins(traces, factor, np.maximum)
+
+    def compute_coarser(previous, ratio, level, b0, b1):
+        level["min"][b0:b1] = _reduce_bins(previous["min"][b0 * ratio : b1 * ratio], ratio, np.minimum)
+        level["max"][b0:b1] = _reduce_bins(previous["max"][b0 * ratio : b1 * ratio], ratio, np.maximum)
+
+    with timed("pyramid.build"), ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for segment_index, segment_samples in enumerate(num_samples):
+            previous = None
+            for level_index, factor in enumerate(factors):
+                num_bins = -(-segment_samples // factor)
+                level = root.create_group(f"segment_{segment_index}/{factor}")
+                for name in ("min", "max"):
+                    level.create_dataset(
+                        name, shape=(num_bins, num_channels), chunks=(BINS_PER_CHUNK, num_channels), dtype=dtype
+                    )
+                if previous is None:
+                    task = lambda b0, b1: compute_base(segment_index, level, b0, b1)
+                else:
+                    ratio = factor // factors[level_index - 1]
+                    task = lambda b0, b1: compute_coarser(previous, ratio, level, b0, b1)
+                starts = range(0, num_bins, BINS_PER_CHUNK)
+                # list() re-raises the first error of the tasks
+                list(executor.map(lambda b0: task(b0, min(b0 + BINS_PER_CHUNK, num_bins)), starts))
+                logger.info(f"Segment {segment_index}: level {factor} done ({num_bins} bins)")
+                previous = level
+
+    root.attrs.update(
+        {
+            "format_version": FORMAT_VERSION,
+            "factors": factors,
+            "num_samples": num_samples,
+            "num_channels": num_channels,
+            "sampling_frequency": recording.get_sampling_frequency(),
+            "dtype": np.dtype(dtype).str,
+            "source": source,
+        }
+    )
+    zarr.consolidate_metadata(root.store)
+
+
+class TracePyramid:
+    """Read access to a trace pyramid.
+
+    Parameters
+    ----------
+    root : zarr.Group
+        Root group of the pyramid.
+    min_bins : int, optional
+        Minimum number of bins a level must give for a window to be served from it.
+    """
+
+    def __init__(self, root, min_bins: int = TRACE_PYRAMID_MIN_BINS):
+        self.root = root
+        self.min_bins = min_bins
+        self.factors: List[int] = list(root.attrs["factors"])
+        self.num_samples: List[int] = list(root.attrs["num_samples"])
+        self.num_channels: int = root.attrs["num_channels"]
+        self.dtype = np.dtype(root.attrs["dtype"])
+
+    @classmethod
+    def open(cls, path: str, storage_options: Optional[dict] = None, **kwargs) -> "TracePyramid":
+        import zarr
+
+        open_kwargs = {"storage_options": storage_options} if storage_options else {}
+        return cls(zarr.open_consolidated(str(path), mode="r", **open_kwargs), **kwargs)
+
+    def level_for(self, num_samples: int) -> Optional[int]:
+        """Bin size of the coarsest level adequate for a window, or None if raw samples are needed."""
+        for factor in reversed(self.factors):
+            if num_samples // factor >= self.min_bins:
+                return factor
+        return None
+
+    def get_traces(self, segment_index: int, start_frame: int, end_frame: int, factor: int, channel_indices=None):
+        """Traces of a window drawn from one level, with one value per sample.
+
+        Each bin is expanded to its size, the first half at the minimum and the second half at
+        the maximum, so the traces keep the sample layout of the recording.
+        """
+        level = self.root[f"segment_{segment_index}/{factor}"]
+        b0 = start_frame // factor
+        b1 = -(-end_frame // factor)
+        mins = level["min"][b0:b1]
+        maxs = level["max"][b0:b1]
+        if channel_indices is not None:
+            mins = mins[:, channel_indices]
+            maxs = maxs[:, channel_indices]
+        traces = np.empty((b1 - b0, factor, mins.shape[1]), dtype=mins.dtype)
+        traces[:, : factor // 2] = mins[:, None, :]
+        traces[:, factor // 2 :] = maxs[:, None, :]
+        offset = start_frame - b0 * factor
+        return traces.reshape(-1, mins.shape[1])[offset : offset + end_frame - start_frame]
+
+
+def _exists(path: str) -> bool:
+    if path.startswith("s3://"):
+        bucket, prefix = split_s3_url(path)
+        return prefix_exists(bucket, prefix.rstrip("/") + "/.zmetadata")
+    return os.path.exists(os.path.join(path, ".zmetadata"))
+
+
+@cached(ttl=TRACE_PYRAMID_LOOKUP_TTL, negative_ttl=TRACE_PYRAMID_LOOKUP_NEGATIVE_TTL)
+def locate_trace_pyramids(analyzer_path: str, recording_path: str) -> Optional[List[str]]:
+    """Paths of the existing pyramids of an analyzer's recording, local cache first, or None if there are none.
+
+    Results are cached, so opening an analyzer does not check S3 every time. Raises if no pyramid
+    was found but a path could not be checked, so that errors are not cached as absences.
+    """
+    candidates = [sidecar_path(analyzer_path)]
+    if TRACE_PYRAMID_DIR:
+        candidates.insert(0, cache_path(analyzer_path, recording_path))
+    paths, error = [], None
+    for path in candidates:
+        try:
+            if _exists(path):
+                paths.append(path)
+        except Exception as e:
+            logger.warning(f"Could not look for trace pyramid {path}: {e}")
+            error = e
+    if len(paths) == 0 and error is not None:
+        raise error
+    return paths or None
+
+
+def find_trace_pyramid(analyzer_path: str, recording_path: str, rec_attributes: dict) -> Optional[TracePyramid]:
+    """Open the pyramid of an analyzer's recording from the local cache or its sidecar, if any.
+
+    Pyramids that do not match the recording attributes of the analyzer are ignored.
+    """
+    try:
+        paths = locate_trace_pyramids(analyzer_path, recording_path)
+    except Exception:
+        return None
+    for path in paths or []:
+        try:
+            pyramid = TracePyramid.open(path)
+        except Exception as e:
+            logger.warning(f"Could not open trace pyramid {path}: {e}")
+            continue
+        if (
+            pyramid.num_samples != list(rec_attributes["num_samples"])
+            or pyramid.num_channels != rec_attributes["num_channels"]
+            or pyramid.dtype != np.dtype(rec_attributes["dtype"])
+        ):
+            logger.warning(f"Trace pyramid {path} does not match the recording, ignored")
+            continue
+        logger.info(f"Using trace pyramid {path} (levels {pyramid.factors})")
+        return pyramid
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m aind_ephys_portal.analyzer.trace_pyramid",
+        description="Build the min/max trace pyramid of the recording of a SortingAnalyzer.",
+    )
+    parser.add_argument("analyzer_path", help="Analyzer zarr folder")
+    parser.add_argument(
+        "--recording-path", default="", help="Processed recording folder, as passed to the GUI (default: the analyzer's)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const=TRACE_PYRAMID_DIR,
+        default=None,
+        help="Write to this local cache directory instead of next to the analyzer (default: TRACE_PYRAMID_DIR)",
+    )
+    parser.add_argument("--factors", default=",".join(map(str, TRACE_PYRAMID_FACTORS)), help="Bin sizes of the levels")
+    parser.add_argument("--n-jobs", type=int, default=8, help="Number of chunks processed concurrently")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir == "":
+        parser.error("--cache-dir needs a directory when TRACE_PYRAMID_DIR is not set")
+
+    import spikeinterface as si
+
+    from aind_ephys_portal.analyzer.lazy_recording import remap_recording_dict
+
+    analyzer = si.load(args.analyzer_path, load_extensions=False)
+    if args.recording_path:
+        recording = si.load(remap_recording_dict(analyzer, args.recording_path))
+    elif analyzer.has_recording():
+        recording = analyzer.recording
+    else:
+        parser.error("The analyzer has no recording, pass --recording-path")
+
+    if args.cache_dir:
+        output_path = cache_path(args.analyzer_path, args.recording_path, directory=args.cache_dir)
+    else:
+        output_path = sidecar_path(args.analyzer_path)
+    print(f"Building trace pyramid of {args.recording_path or args.analyzer_path} in {output_path}")
+    build_trace_pyramid(
+        recording,
+        output_path,
+        factors=[int(f) for f in args.factors.split(",")],
+        n_jobs=args.n_jobs,
+        source=args.recording_path or args.analyzer_path,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Compact per-analyzer summary of the units, shown while the GUI is built.
+
+The unit table of the GUI aggregates sorting properties and the quality metrics, template
+metrics and unit locations extensions, so nothing can be shown before they are loaded. The
+summary holds the unit ids and the displayed unit properties (including the decoder labels
+that set the initial curation state) in a single small JSON object, read in one request.
+
+Summaries are looked up in a local cache directory, written there when an analyzer is first
+opened, then next to the analyzer (``<stream_name>_unit_summary.json``), written by a batch
+job::
+
+    python -m aind_ephys_portal.analyzer.unit_summary s3://bucket/asset_name
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+from aind_ephys_portal.s3.client import get_object, put_object, split_s3_url
+
+logger = logging.getLogger(__name__)
+
+# Local directory of the summaries written when analyzers are opened; empty to disable
+UNIT_SUMMARY_DIR = os.environ.get(
+    "UNIT_SUMMARY_DIR", os.path.join(tempfile.gettempdir(), "aind_ephys_portal", "unit_summaries")
+)
+
+# Unit properties shown in the unit table of the GUI, in order
+DISPLAYED_UNIT_PROPERTIES = ["decoder_label", "firing_rate", "y", "snr", "amplitude_median", "isi_violation_ratio"]
+
+SIDECAR_SUFFIX = "_unit_summary.json"
+FORMAT_VERSION = 1
+
+
+def sidecar_path(analyzer_path: str) -> str:
+    """Path of the summary stored next to an analyzer."""
+    analyzer_path = str(analyzer_path).rstrip("/")
+    if analyzer_path.endswith(".zarr"):
+        analyzer_path = analyzer_path[: -len(".zarr")]
+    return analyzer_path + SIDECAR_SUFFIX
+
+
+def cache_path(analyzer_path: str, directory: Optional[str] = None) -> str:
+    """Path of the summary of an analyzer in a local cache directory (default: UNIT_SUMMARY_DIR)."""
+    directory = UNIT_SUMMARY_DIR if directory is None else directory
+    key = str(analyzer_path).rstrip("/")
+    return os.path.join(directory, hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+
+
+def build_unit_summary(analyzer, properties: Sequence[str] = DISPLAYED_UNIT_PROPERTIES) -> pd.DataFrame:
+    """Table of the displayed unit properties of an analyzer, indexed by unit id.
+
+    Columns are computed as in the GUI unit table; properties the analyzer does not have are left out.
+    """
+    from spikeinterface.widgets.utils import make_units_table_from_analyzer
+
+    units_table = make_units_table_from_analyzer(analyzer)
+    summary = units_table.loc[:, [name for name in properties if name in units_table.columns]]
+    summary.index.name = "unit_id"
+    return summary
+
+
+def write_unit_summary(summary: pd.DataFrame, path: str, source: str = ""):
+    """Write a summary to a local or ``s3://`` path."""
+    content = {
+        "format_version": FORMAT_VERSION,
+        "source": source,
+        "table": json.loads(summary.to_json(orient="split")),
+    }
+    data = json.dumps(content).encode()
+    if path.startswith("s3://"):
+        put_object(*split_s3_url(path), data)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def read_unit_summary(path: str) -> Optional[pd.DataFrame]:
+    """Read a summary from a local or ``s3://`` path. Returns None if it is missing or unreadable."""
+    if path.startswith("s3://"):
+        data = get_object(*split_s3_url(path))
+        if data is None:
+            return None
+    else:
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+    try:
+        content = json.loads(data)
+        if content.get("format_version") != FORMAT_VERSION:
+            logger.warning(f"Unit summary {path} has an unsupported format, ignored")
+            return None
+        table = content["table"]
+        summary = pd.DataFrame(table["data"], index=table["index"], columns=table["columns"])
+    except Exception as e:
+        logger.warning(f"Could not read unit summary {path}: {e}")
+        return None
+    summary.index.name = "unit_id"
+    return summary
+
+
+def find_unit_summary(analyzer_path: str) -> Optional[pd.DataFrame]:
+    """Read the summary of an analyzer from the local cache or its sidecar, if any."""
+    candidates = [sidecar_path(analyzer_path)]
+    if UNIT_SUMMARY_DIR:
+        candidates.insert(0, cache_path(analyzer_path))
+    for path in candidates:
+        summary = read_unit_summary(path)
+        if summary is not None:
+            return summary
+    return None
+
+
+def update_cached_unit_summary(analyzer_path: str, analyzer):
+    """Write the summary of an opened analyzer to the local cache, unless it is there and up to date."""
+    if not UNIT_SUMMARY_DIR:
+        return
+    path = cache_path(analyzer_path)
+    summary = read_unit_summary(path)
+    if summary is not None and list(summary.index) == list(analyzer.unit_ids):
+        return
+    write_unit_summary(build_unit_summary(analyzer), path, source=analyzer_path)
+    logger.info(f"Unit summary written to {path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from aind_ephys_portal.analyzer.consolidate import find_analyzers
+
+    parser = argparse.ArgumentParser(
+        prog="python -m aind_ephys_portal.analyzer.unit_summary",
+        description="Write the unit summary of SortingAnalyzer folders, shown by the GUI while it loads.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Analyzer zarr folders, or asset folders whose postprocessed streams are summarized"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const=UNIT_SUMMARY_DIR,
+        default=None,
+        help="Write to this local cache directory instead of next to the analyzers (default: UNIT_SUMMARY_DIR)",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Number of analyzers processed concurrently")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir == "":
+        parser.error("--cache-dir needs a directory when UNIT_SUMMARY_DIR is not set")
+
+    def run(analyzer_path):
+        import spikeinterface as si
+
+        try:
+            analyzer = si.load(analyzer_path, load_extensions=False)
+            if args.cache_dir:
+                output_path = cache_path(analyzer_path, directory=args.cache_dir)
+            else:
+                output_path = sidecar_path(analyzer_path)
+            write_unit_summary(build_unit_summary(analyzer), output_path, source=analyzer_path)
+            return analyzer_path, f"written to {output_path}"
+        except Exception as e:
+            return analyzer_path, f"error: {e}"
+
+    analyzer_paths = []
+    n_errors = 0
+    for path in args.paths:
+        try:
+            analyzer_paths.extend(find_analyzers(path))
+        except Exception as e:
+            print(f"{path}: error: {e}", file=sys.stderr)
+            n_errors += 1
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for analyzer_path, status in executor.map(run, analyzer_paths):
+            print(f"{analyzer_path}: {status}")
+            n_errors += status.startswith("error")
+    return 1 if n_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Speculative warm-up of the analyzers listed by the portal.
+
+Between the portal listing the streams of an asset and the user opening one of them in the
+GUI, the analyzers of the listed streams are opened in the background, with their small
+extensions, into the process-wide analyzer cache (and the on-disk chunk cache, when enabled).
+The GUI session then finds them there instead of starting cold.
+
+The warm-up has a low priority and a bounded budget: it runs on a single thread, warms up at
+most ``ANALYZER_WARMUP_MAX_STREAMS`` streams per selection, only opens analyzers while the
+analyzer cache has room for them, and gives way to GUI loads waiting in the load queue. Each
+portal session only warms up its current selection: selecting another asset cancels the
+warm-ups that have not finished, at their next extension.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from aind_ephys_portal.analyzer.cache import analyzer_cache
+from aind_ephys_portal.analyzer.load_queue import load_queue
+from aind_ephys_portal.metrics.registry import registry, timed
+
+logger = logging.getLogger(__name__)
+
+# Number of streams warmed up per selected asset; 0 disables the warm-up
+ANALYZER_WARMUP_MAX_STREAMS = int(os.environ.get("ANALYZER_WARMUP_MAX_STREAMS", 0))
+# Small extensions loaded by the warm-up, the GUI loads the others
+DEFAULT_WARMUP_EXTENSIONS = [
+    "random_spikes",
+    "templates",
+    "noise_levels",
+    "unit_locations",
+    "quality_metrics",
+    "template_metrics",
+    "template_similarity",
+    "correlograms",
+]
+ANALYZER_WARMUP_EXTENSIONS = [
+    name.strip()
+    for name in os.environ.get("ANALYZER_WARMUP_EXTENSIONS", ",".join(DEFAULT_WARMUP_EXTENSIONS)).split(",")
+    if name.strip()
+]
+
+WARMUPS = registry.counter("aind_ephys_portal_analyzer_warmups_total", "Analyzer warm-ups by outcome", ["outcome"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analyzer-warmup")
+    return _executor
+
+
+class AnalyzerWarmup:
+    """Warm-ups of the streams selected in one portal session.
+
+    Parameters
+    ----------
+    max_streams : int, optional
+        Number of streams warmed up per selection, by default ANALYZER_WARMUP_MAX_STREAMS.
+        The warm-up is disabled when 0.
+    extension_names : sequence of str, optional
+        Extensions loaded with the analyzers, by default ANALYZER_WARMUP_EXTENSIONS.
+    """
+
+    def __init__(self, max_streams: int = ANALYZER_WARMUP_MAX_STREAMS, extension_names: Optional[Sequence[str]] = None):
+        self.max_streams = max_streams
+        self.extension_names = ANALYZER_WARMUP_EXTENSIONS if extension_names is None else list(extension_names)
+        self._generation = 0
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_streams > 0
+
+    def warm(self, targets: Sequence[Tuple[str, str]]):
+        """Cancel the warm-ups of the previous selection and start the ones of ``(analyzer_path, recording_path)`` targets."""
+        self.cancel()
+        if not self.enabled:
+            return
+        executor = _get_executor()
+        with self._lock:
+            generation = self._generation
+            self._futures = [
+                executor.submit(self._warm, generation, analyzer_path, recording_path)
+                for analyzer_path, recording_path in list(targets)[: self.max_streams]
+            ]
+
+    def cancel(self):
+        """Cancel the warm-ups of the current selection. A running warm-up stops at its next extension."""
+        with self._lock:
+            self._generation += 1
+            futures, self._futures = self._futures, []
+        for future in futures:
+            if future.cancel():
+                WARMUPS.inc(outcome="cancelled")
+
+    def _cancelled(self, generation: int) -> bool:
+        return generation != self._generation
+
+    def _warm(self, generation: int, analyzer_path: str, recording_path: str):
+        t_start = time.perf_counter()
+        try:
+            outcome = self._run(generation, analyzer_path, recording_path)
+        except Exception as e:
+            logger.warning(f"Warm-up of {analyzer_path} failed: {e}")
+            outcome = "error"
+        WARMUPS.inc(outcome=outcome)
+        if outcome == "done":
+            logger.info(f"Warmed up {analyzer_path} in {time.perf_counter() - t_start:.2f} s")
+
+    def _run(self, generation: int, analyzer_path: str, recording_path: str) -> str:
+        if self._cancelled(generation):
+            return "cancelled"
+        if not analyzer_path.endswith((".zarr", ".zarr/")):
+            return "skipped"
+        if analyzer_cache.make_key(analyzer_path, recording_path) not in analyzer_cache:
+            # speculative analyzers must neither delay GUI loads nor evict analyzers in use
+            if (
+                load_queue.waiting > 0
+                or analyzer_cache.nbytes >= analyzer_cache.max_bytes
+                or len(analyzer_cache) >= analyzer_cache.max_entries
+            ):
+                return "skipped"
+
+        from aind_ephys_portal.analyzer.loader import load_analyzer
+        from aind_ephys_portal.analyzer.prefetch import load_extension
+        from aind_ephys_portal.analyzer.unit_summary import update_cached_unit_summary
+
+        with timed("warmup.open"):
+            analyzer = analyzer_cache.get_or_load(
+                analyzer_path, recording_path, loader=lambda: load_analyzer(analyzer_path, recording_path)
+            )
+        saved = set(analyzer.get_saved_extension_names())
+        for extension_name in self.extension_names:
+            if self._cancelled(generation):
+                return "cancelled"
+            if load_queue.waiting > 0:
+                return "skipped"
+            if extension_name in saved and extension_name not in analyzer.extensions:
+                # a GUI session may be prefetching the same analyzer
+                with timed("warmup.load_extension"):
+                    load_extension(analyzer, extension_name)
+        update_cached_unit_summary(analyzer_path, analyzer)
+        return "done"
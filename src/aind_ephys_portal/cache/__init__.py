@@ -0,0 +1 @@
+"""Function result caching shared between sessions and worker processes for the AIND SIGUI Portal."""
@@ -0,0 +1,303 @@
+"""Storage backends of the function result cache.
+
+Three backends are available, selected with the ``CACHE_BACKEND`` environment variable:
+
+- ``memory`` (default): a dictionary private to the process, equivalent to ``pn.cache``.
+- ``sqlite``: a SQLite file at ``CACHE_PATH``, shared by all worker processes of a host and
+  surviving restarts.
+- ``redis``: any server speaking the Redis protocol at ``CACHE_REDIS_URL`` (Redis, Valkey, or a
+  local stand-in), shared by all hosts. Requires the ``redis`` package.
+
+Persistent backends store pickled values. Besides get/set, backends provide short-lived
+leases, used to let a single process compute a missing value while the others wait for it.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Backend configuration
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(tempfile.gettempdir(), "aind_ephys_portal", "cache.sqlite"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+
+_MISSING = (False, None)
+
+
+class CacheBackend:
+    """Interface of the cache backends.
+
+    Keys are strings, ``ttl`` is in seconds and None means no expiration.
+    """
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(found, value)``, so that None can be cached."""
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the values of the keys that are cached."""
+        values = {}
+        for key in keys:
+            found, value = self.get(key)
+            if found:
+                values[key] = value
+        return values
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self, prefix: str = ""):
+        """Delete all entries whose key starts with ``prefix``."""
+        raise NotImplementedError
+
+    def acquire(self, key: str, timeout: float) -> bool:
+        """Try to take the lease of a key for ``timeout`` seconds. Returns whether it was taken."""
+        return True
+
+    def release(self, key: str):
+        """Release a lease taken with ``acquire``."""
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend. Values are stored as is, without copy.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Number of entries above which expired, then oldest entries are dropped,
+        by default CACHE_MAX_ENTRIES
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return _MISSING
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            if len(self._entries) > self.max_entries:
+                self._prune()
+
+    def _prune(self):
+        now = time.time()
+        for key in [k for k, (expires, _) in self._entries.items() if expires is not None and expires < now]:
+            del self._entries[key]
+        # dictionaries keep insertion order, so the first keys are the oldest
+        for key in list(self._entries)[: max(0, len(self._entries) - self.max_entries)]:
+            del self._entries[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+class SQLiteBackend(CacheBackend):
+    """Backend storing pickled values in a SQLite file shared by the processes of a host.
+
+    As for the stream manifest, a new connection is opened for every operation and WAL
+    journaling lets several worker processes read while one writes.
+
+    Every ``max_entries // 100`` writes of a process, expired entries and leases are deleted and,
+    above ``max_entries``, the oldest entries (by time of writing) are dropped.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the SQLite file, created if needed, by default CACHE_PATH
+    max_entries : int, optional
+        Number of entries above which the oldest entries are dropped, by default CACHE_MAX_ENTRIES
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._prune_every = max(1, max_entries // 100)
+        self._sets = 0
+        self._sets_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires REAL)")
+        self._prune()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires >= ?)", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return _MISSING
+        return True, pickle.loads(row[0])
+
+    def get_many(self, keys):
+        keys = list(keys)
+        values = {}
+        now = time.time()
+        with self._connect() as conn:
+            # stay below the default limit of 999 parameters per statement
+            for start in range(0, len(keys), 900):
+                batch = keys[start : start + 900]
+                rows = conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(batch))}) "
+                    "AND (expires IS NULL OR expires >= ?)",
+                    (*batch, now),
+                ).fetchall()
+                values.update((key, pickle.loads(value)) for key, value in rows)
+        return values
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            # a replaced row gets a new rowid, so rowids order the entries by time of writing
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, data, expires))
+        with self._sets_lock:
+            self._sets += 1
+            prune = self._sets % self._prune_every == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,))
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self, prefix=""):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def acquire(self, key, timeout):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?)", (key, now + timeout))
+            return cursor.rowcount == 1
+
+    def release(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ?", (key,))
+
+
+class RedisBackend(CacheBackend):
+    """Backend storing pickled values in a Redis-protocol server shared by all hosts.
+
+    Parameters
+    ----------
+    url : str, optional
+        Server URL, by default CACHE_REDIS_URL
+    namespace : str, optional
+        Prefix of all keys, by default "aind_ephys_portal:"
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL, namespace: str = "aind_ephys_portal:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The redis cache backend requires the redis package: pip install redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        data = self.client.get(self.namespace + key)
+        if data is None:
+            return _MISSING
+        return True, pickle.loads(data)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if len(keys) == 0:
+            return {}
+        values = self.client.mget([self.namespace + key for key in keys])
+        return {key: pickle.loads(data) for key, data in zip(keys, values) if data is not None}
+
+    def set(self, key, value, ttl=None):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.client.set(self.namespace + key, data, ex=None if ttl is None else max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.namespace + key)
+
+    def clear(self, prefix=""):
+        for key in self.client.scan_iter(match=f"{self.namespace}{prefix}*"):
+            self.client.delete(key)
+
+    def acquire(self, key, timeout):
+        return bool(self.client.set(f"{self.namespace}lease:{key}", 1, nx=True, ex=max(1, int(timeout))))
+
+    def release(self, key):
+        self.client.delete(f"{self.namespace}lease:{key}")
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> CacheBackend:
+    """Return the process-wide backend selected by CACHE_BACKEND, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if CACHE_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, choose from {list(BACKENDS)}")
+            _backend = BACKENDS[CACHE_BACKEND]()
+            logger.info(f"Using {CACHE_BACKEND} cache backend")
+    return _backend
+
+
+def set_backend(backend: CacheBackend):
+    """Replace the process-wide backend, e.g. to share a backend configured in code."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,236 @@
+"""Decorator caching function results in the configured backend.
+
+``cached`` replaces ``pn.cache`` for the slow DocDB queries and S3 listings: results are stored
+in the backend selected by ``CACHE_BACKEND`` (see ``aind_ephys_portal.cache.backends``), so with
+a persistent backend they are shared by all worker processes and survive restarts.
+
+Concurrent calls with the same arguments are coalesced: within a process they wait for a single
+in-flight call, and across processes the caller holding the backend lease computes the value
+while the others poll the backend for it. Hits, misses and latencies are counted per function.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from aind_ephys_portal.cache.backends import CacheBackend, get_backend
+
+logger = logging.getLogger(__name__)
+
+# Seconds a process may spend computing a value before others stop waiting for it
+CACHE_LEASE_TIMEOUT = float(os.environ.get("CACHE_LEASE_TIMEOUT", 60))
+CACHE_LEASE_POLL_INTERVAL = 0.1
+
+# All cached functions, by name
+_registry: Dict[str, "CachedFunction"] = {}
+
+
+class CacheStats:
+    """Counters of a cached function."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.loads = 0
+        self.lookup_seconds = 0.0
+        self.load_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class CachedFunction:
+    """Function wrapper storing results in a cache backend.
+
+    Parameters
+    ----------
+    func : callable
+        The function to cache. Its arguments must have a stable ``repr``.
+    ttl : float, optional
+        Seconds before results expire, by default None (never)
+    negative_ttl : float, optional
+        Seconds before None results ("not found") expire, by default ``ttl``
+    name : str, optional
+        Name used in keys and stats, by default the qualified name of ``func``
+    backend : CacheBackend, optional
+        Backend to use, by default the process-wide backend returned by ``get_backend``
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        name: Optional[str] = None,
+        backend: Optional[CacheBackend] = None,
+    ):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.name = name or f"{func.__module__}.{func.__qualname__}"
+        self._backend = backend
+        self.stats = CacheStats()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        _registry[self.name] = self
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend if self._backend is not None else get_backend()
+
+    def key(self, *args, **kwargs) -> str:
+        """Return the backend key of a call."""
+        arguments = repr((args, sorted(kwargs.items())))
+        return f"{self.name}:{hashlib.sha256(arguments.encode()).hexdigest()}"
+
+    def __call__(self, *args, **kwargs):
+        key = self.key(*args, **kwargs)
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.stats.coalesced += 1
+        if not is_leader:
+            return future.result()
+
+        try:
+            value = self._load(key, args, kwargs)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _lookup(self, key: str):
+        t_start = time.perf_counter()
+        try:
+            found, value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Error reading {self.name} from the cache: {e}")
+            found, value = False, None
+        with self._lock:
+            self.stats.lookup_seconds += time.perf_counter() - t_start
+            if found:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+        return found, value
+
+    def _load(self, key: str, args, kwargs):
+        backend = self.backend
+        try:
+            has_lease = backend.acquire(key, CACHE_LEASE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error acquiring cache lease for {self.name}: {e}")
+            has_lease = None
+        if has_lease is False:
+            # another process is computing the value
+            found, value = self._wait_for(key)
+            if found:
+                return value
+
+        try:
+            t_start = time.perf_counter()
+            try:
+                value = self.func(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.stats.errors += 1
+                raise
+            with self._lock:
+                self.stats.loads += 1
+                self.stats.load_seconds += time.perf_counter() - t_start
+            self.put(key, value)
+            return value
+        finally:
+            if has_lease:
+                backend.release(key)
+
+    def _wait_for(self, key: str):
+        deadline = time.monotonic() + CACHE_LEASE_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_LEASE_POLL_INTERVAL)
+            try:
+                found, value = self.backend.get(key)
+            except Exception:
+                break
+            if found:
+                with self._lock:
+                    self.stats.coalesced += 1
+                return True, value
+        logger.warning(f"Timed out waiting for another process to compute {self.name}")
+        return False, None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached values of several keys (see ``key``) with a single backend lookup."""
+        keys = list(keys)
+        t_start = time.perf_counter()
+        try:
+            values = self.backend.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Error reading {self.name} from the cache: {e}")
+            values = {}
+        with self._lock:
+            self.stats.lookup_seconds += time.perf_counter() - t_start
+            self.stats.hits += len(values)
+            self.stats.misses += len(keys) - len(values)
+        return values
+
+    def put(self, key: str, value: Any):
+        """Store a value computed outside of the wrapper, e.g. by a batched query."""
+        try:
+            self.backend.set(key, value, self.negative_ttl if value is None else self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not cache result of {self.name}: {e}")
+
+    def invalidate(self, *args, **kwargs):
+        """Drop the cached result of a call."""
+        self.backend.delete(self.key(*args, **kwargs))
+
+    def clear(self):
+        """Drop all cached results of the function."""
+        self.backend.clear(f"{self.name}:")
+
+
+def cached(
+    ttl: Optional[float] = None, negative_ttl: Optional[float] = None, name: Optional[str] = None
+) -> Callable[[Callable], CachedFunction]:
+    """Decorate a function to cache its results in the configured backend.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Seconds before results expire, by default None (never)
+    negative_ttl : float, optional
+        Seconds before None results ("not found") expire, by default ``ttl``
+    name : str, optional
+        Name used in keys and stats, by default the qualified name of the function
+    """
+
+    def decorator(func):
+        return CachedFunction(func, ttl=ttl, negative_ttl=negative_ttl, name=name)
+
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the counters of all cached functions, by name."""
+    return {name: function.stats.as_dict() for name, function in _registry.items()}
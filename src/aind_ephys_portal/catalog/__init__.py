@@ -0,0 +1 @@
+"""Catalog of ecephys derived assets for the AIND SIGUI Portal."""
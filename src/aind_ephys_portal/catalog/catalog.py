@@ -0,0 +1,348 @@
+"""Process-wide catalog of ecephys derived assets shared by all portal sessions.
+
+The catalog is loaded once per process and refreshed in the background by polling DocDB for
+records created or modified since the last sync. Records deleted from DocDB are removed by a
+less frequent reconciliation against the ids of all records. Sessions subscribe to be notified
+when the catalog changes.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from aind_ephys_portal.catalog.search_index import SearchIndex
+from aind_ephys_portal.metrics.registry import timed
+from aind_ephys_portal.docdb.database import (
+    CATALOG_FIELDS,
+    get_all_ecephys_derived_columns,
+    get_ecephys_derived_columns_modified_since,
+    normalize_timestamp,
+    get_ecephys_derived_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental refreshes
+CATALOG_REFRESH_INTERVAL = int(os.environ.get("CATALOG_REFRESH_INTERVAL", 10 * 60))
+# Seconds between reconciliations removing the records deleted from the database
+CATALOG_RECONCILE_INTERVAL = int(os.environ.get("CATALOG_RECONCILE_INTERVAL", 6 * 60 * 60))
+# Number of index matches below which names containing the query are searched as well; 0 disables it
+CATALOG_SUBSTRING_FALLBACK = int(os.environ.get("CATALOG_SUBSTRING_FALLBACK", 20))
+
+CATALOG_COLUMNS = ["name", "subject_id", "date", "id"]
+
+
+def columns_to_table(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Build the catalog table from the columnar arrays returned by the database."""
+    table = pd.DataFrame(columns, columns=CATALOG_FIELDS)
+    return table.rename(columns={"_id": "id", "created": "date"})
+
+
+def _indexed_by_id(df: pd.DataFrame) -> pd.DataFrame:
+    """Use the asset id as (unnamed) index, so rows keep their identity when sorted or paged."""
+    df = df.copy()
+    df.index = pd.Index(df["id"].to_numpy(), dtype=object)
+    return df
+
+
+def _date_keys(values) -> np.ndarray:
+    """Sort keys of dates: the date itself, or "" (oldest) when missing."""
+    return np.array([value if isinstance(value, str) else "" for value in values], dtype=object)
+
+
+class Catalog:
+    """Shared, incrementally refreshed catalog of ecephys derived assets.
+
+    ``table`` holds the projected fields of every record, newest first; ``df`` is the view
+    displayed by the portal, indexed by asset id. Both are replaced atomically on every change,
+    so sessions can keep using the frames they hold while a refresh is merged.
+
+    Parameters
+    ----------
+    fetch_all : callable, optional
+        Zero-argument function returning the columnar fields of all records,
+        by default ``get_all_ecephys_derived_columns``.
+    fetch_modified_since : callable, optional
+        Function returning the columnar fields of the records modified after a
+        ``last_modified`` timestamp, by default ``get_ecephys_derived_columns_modified_since``.
+    fetch_ids : callable, optional
+        Zero-argument function returning the ids of all records, by default ``get_ecephys_derived_ids``.
+    refresh_interval : int, optional
+        Seconds between background refreshes, by default CATALOG_REFRESH_INTERVAL
+    reconcile_interval : int, optional
+        Seconds between reconciliations with ``fetch_ids``, done by ``refresh``,
+        by default CATALOG_RECONCILE_INTERVAL
+    """
+
+    def __init__(
+        self,
+        fetch_all: Callable[[], Dict[str, np.ndarray]] = get_all_ecephys_derived_columns,
+        fetch_modified_since: Callable[[str], Dict[str, np.ndarray]] = get_ecephys_derived_columns_modified_since,
+        fetch_ids: Callable[[], List[str]] = get_ecephys_derived_ids,
+        refresh_interval: int = CATALOG_REFRESH_INTERVAL,
+        reconcile_interval: int = CATALOG_RECONCILE_INTERVAL,
+    ):
+        self.fetch_all = fetch_all
+        self.fetch_modified_since = fetch_modified_since
+        self.fetch_ids = fetch_ids
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+        self.table = columns_to_table({})
+        self.df = _indexed_by_id(self.table[CATALOG_COLUMNS])
+        self.search_index = SearchIndex()
+        # columns of table, the sort key of each row, and the id of each name
+        self._columns: Dict[str, np.ndarray] = {column: self.table[column].to_numpy() for column in self.table.columns}
+        self._date_keys = _date_keys([])
+        self._ids_by_name: Dict[str, str] = {}
+        self._reconciled_at = time.monotonic()
+        self.last_modified: Optional[str] = None
+        self._lock = threading.RLock()
+        self._subscribers: List[weakref.ref] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def all_records(self) -> List[Dict[str, Any]]:
+        """All catalog entries as minimal records with the DocDB field names."""
+        table = self.table
+        return [
+            {"_id": i, "name": n, "created": c, "location": loc, "subject_id": subject_id}
+            for i, n, c, loc, subject_id in zip(
+                table["id"], table["name"], table["date"], table["location"], table["subject_id"]
+            )
+        ]
+
+    def get_record(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """Return the minimal record of an asset by id in constant time, or None if unknown."""
+        with self._lock:
+            index = self.df.index
+            columns = self._columns
+        try:
+            position = index.get_loc(asset_id)
+        except KeyError:
+            return None
+        return {
+            "_id": asset_id,
+            "name": columns["name"][position],
+            "created": columns["date"][position],
+            "location": columns["location"][position],
+            "subject_id": columns["subject_id"][position],
+        }
+
+    def get_record_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the minimal record of an asset by name in constant time, or None if unknown."""
+        asset_id = self._ids_by_name.get(name)
+        return None if asset_id is None else self.get_record(asset_id)
+
+    @timed("catalog.load")
+    def load(self):
+        """Load all records from the database.
+
+        If ``fetch_all`` is a ``cached`` function, its cached result is dropped first, so a reload
+        never installs a stale (or empty) result cached by an earlier load.
+        """
+        try:
+            invalidate = getattr(self.fetch_all, "invalidate", None)
+            if invalidate is not None:
+                invalidate()
+            table = columns_to_table(self.fetch_all())
+        except Exception as e:
+            logger.warning(f"Error loading initial data: {e}.")
+            table = columns_to_table({})
+        logger.info(f"Loaded {len(table)} records.")
+        with self._lock:
+            self._install({column: table[column].to_numpy()[:0] for column in table.columns}, _date_keys([]))
+            self._ids_by_name = {}
+            self.search_index = SearchIndex()
+            self.last_modified = None
+            self._reconciled_at = time.monotonic()
+            self._merge(table)
+        self._notify()
+
+    @timed("catalog.refresh")
+    def refresh(self) -> int:
+        """Fetch and merge the records created or modified since the last sync.
+
+        Every ``reconcile_interval`` seconds, the records deleted from the database are removed as well.
+
+        Returns
+        -------
+        int
+            Number of merged records.
+        """
+        if self.last_modified is None:
+            self.load()
+            return len(self.table)
+        delta = columns_to_table(self.fetch_modified_since(self.last_modified))
+        if len(delta) > 0:
+            logger.info(f"Merging {len(delta)} new or modified records into the catalog")
+            with self._lock:
+                self._merge(delta)
+            self._notify()
+        if time.monotonic() - self._reconciled_at >= self.reconcile_interval:
+            self.reconcile()
+        return len(delta)
+
+    @timed("catalog.reconcile")
+    def reconcile(self) -> int:
+        """Remove the records that were deleted from the database.
+
+        Returns
+        -------
+        int
+            Number of removed records.
+        """
+        ids = set(self.fetch_ids())
+        self._reconciled_at = time.monotonic()
+        with self._lock:
+            if len(ids) == 0 and len(self.table) > 0:
+                # an empty collection is more likely a failed query than deleted assets
+                logger.warning("No record ids returned by the database, catalog not reconciled")
+                return 0
+            deleted = [record_id for record_id in self._columns["id"] if record_id not in ids]
+            if len(deleted) == 0:
+                return 0
+            logger.info(f"Removing {len(deleted)} deleted records from the catalog")
+            columns, date_keys = self._without(self.df.index.get_indexer(deleted))
+            for record_id in deleted:
+                self.search_index.remove(record_id)
+            self._install(columns, date_keys)
+        self._notify()
+        return len(deleted)
+
+    def _without(self, positions: np.ndarray):
+        """Columns and sort keys without the rows at ``positions``, forgetting the names of these rows."""
+        positions = positions[positions >= 0]
+        names, ids = self._columns["name"], self._columns["id"]
+        for position in positions:
+            if self._ids_by_name.get(names[position]) == ids[position]:
+                del self._ids_by_name[names[position]]
+        keep = np.ones(len(self._date_keys), dtype=bool)
+        keep[positions] = False
+        return {column: values[keep] for column, values in self._columns.items()}, self._date_keys[keep]
+
+    def _merge(self, delta: pd.DataFrame):
+        """Merge new or modified records, keeping the table sorted by date, newest first.
+
+        The previous rows of modified records are dropped and the delta is inserted at its sorted
+        position with one vectorized insert per column, so a refresh costs a copy of the columns
+        rather than a sort of the whole table. Must be called with the lock held; the caller
+        notifies the subscribers once the lock is released.
+        """
+        last_modified = [value for value in delta["last_modified"] if isinstance(value, str) and value != ""]
+        if len(last_modified) > 0:
+            newest = max(last_modified, key=normalize_timestamp)
+            if self.last_modified is None or normalize_timestamp(newest) > normalize_timestamp(self.last_modified):
+                self.last_modified = newest
+
+        delta = delta.drop_duplicates(subset="id", keep="last")
+        delta_keys = _date_keys(delta["date"])
+        order = np.argsort(delta_keys, kind="stable")[::-1]
+        delta, delta_keys = delta.iloc[order], delta_keys[order]
+
+        columns, date_keys = self._without(self.df.index.get_indexer(delta["id"]))
+        # date_keys is in descending order: search its reversed, ascending view
+        positions = len(date_keys) - np.searchsorted(date_keys[::-1], delta_keys, side="left")
+        columns = {
+            column: np.insert(values, positions, delta[column].to_numpy(dtype=object))
+            for column, values in columns.items()
+        }
+        self.search_index.update(delta[CATALOG_COLUMNS].to_dict("records"))
+        self._ids_by_name.update(zip(delta["name"], delta["id"]))
+        self._install(columns, np.insert(date_keys, positions, delta_keys))
+
+    def _install(self, columns: Dict[str, np.ndarray], date_keys: np.ndarray):
+        table = pd.DataFrame(columns, columns=list(columns))
+        self.table = table
+        self.df = _indexed_by_id(table[CATALOG_COLUMNS])
+        self._columns = columns
+        self._date_keys = date_keys
+
+    def search(self, query: str) -> pd.DataFrame:
+        """Return the rows of ``df`` matching a search query, in catalog order.
+
+        See ``aind_ephys_portal.catalog.search_index`` for the query syntax. Index terms only match
+        the start of name tokens, so when the index finds fewer than CATALOG_SUBSTRING_FALLBACK
+        records, the names containing the query (case-insensitive) are added, e.g. ``3655`` or
+        ``655_2024`` for ``ecephys_713655_2024-05-01_...``. Queries with field prefixes are not extended.
+        """
+        with self._lock:
+            ids = self.search_index.search(query)
+            df = self.df
+        if ids is None or len(ids) == len(df):
+            return df
+        rows = df.index.get_indexer(list(ids))
+        rows = rows[rows >= 0]
+        if len(rows) < CATALOG_SUBSTRING_FALLBACK and all(field is None for field, _ in SearchIndex.parse_query(query)):
+            contains = df["name"].str.contains(query.strip(), case=False, regex=False, na=False).to_numpy()
+            rows = np.union1d(rows, np.flatnonzero(contains))
+        return df.iloc[np.sort(rows)]
+
+    def subscribe(self, callback: Callable[[], None]):
+        """Call ``callback`` after every catalog change.
+
+        Only a weak reference is kept, so subscribing sessions can be garbage-collected
+        without unsubscribing.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else weakref.ref(callback)
+        with self._lock:
+            self._subscribers.append(ref)
+
+    def unsubscribe(self, callback: Callable[[], None]):
+        """Stop notifying ``callback``."""
+        with self._lock:
+            self._subscribers = [ref for ref in self._subscribers if ref() not in (None, callback)]
+
+    def _notify(self):
+        """Call the subscribers. Must be called without holding the lock, as callbacks may use the catalog."""
+        with self._lock:
+            self._subscribers = [ref for ref in self._subscribers if ref() is not None]
+            callbacks = [ref() for ref in self._subscribers]
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error notifying catalog subscriber: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Error refreshing catalog: {e}")
+
+    def start(self):
+        """Start refreshing in a daemon thread. Calling it again is a no-op."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh."""
+        self._stop.set()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Return the process-wide catalog, loading it and starting its refresh on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            catalog = Catalog()
+            catalog.load()
+            catalog.start()
+            _catalog = catalog
+    return _catalog
@@ -0,0 +1,258 @@
+"""Persistent manifest of postprocessed streams and raw recording locations per asset.
+
+The manifest is a local SQLite file filled by a background ``ManifestIndexer``. The portal
+answers row clicks from it and only falls back to live S3/DocDB discovery on a miss.
+
+Entries without a raw recording expire after ``MANIFEST_NEGATIVE_TTL`` seconds, so assets
+whose raw data is uploaded or registered later get their link on the next indexing pass.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Manifest configuration
+STREAM_MANIFEST_PATH = os.environ.get(
+    "STREAM_MANIFEST_PATH", os.path.join(tempfile.gettempdir(), "aind_ephys_portal", "stream_manifest.sqlite")
+)
+MANIFEST_INDEXER_WORKERS = int(os.environ.get("MANIFEST_INDEXER_WORKERS", 8))
+MANIFEST_INDEXER_INTERVAL = int(os.environ.get("MANIFEST_INDEXER_INTERVAL", 30 * 60))
+# Number of records prefetched together before they are resolved
+MANIFEST_INDEXER_BATCH_SIZE = int(os.environ.get("MANIFEST_INDEXER_BATCH_SIZE", 500))
+# Seconds before an entry without raw recording location is resolved again
+MANIFEST_NEGATIVE_TTL = int(os.environ.get("MANIFEST_NEGATIVE_TTL", 10 * 60))
+
+
+class StreamManifest:
+    """SQLite-backed mapping from asset id to its postprocessed streams and raw location.
+
+    A new connection is opened for every operation, so the manifest can be used from any
+    thread, and WAL journaling lets several worker processes share the same file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite file, created if needed.
+    negative_ttl : float, optional
+        Seconds before entries without raw recording location expire, by default MANIFEST_NEGATIVE_TTL
+    """
+
+    # Entries returned by lookups: with a raw location, or without one and not expired
+    _FRESH = "(raw_asset_location IS NOT NULL OR indexed_at >= ?)"
+
+    def __init__(self, path: str = STREAM_MANIFEST_PATH, negative_ttl: float = MANIFEST_NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS streams (
+                    asset_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    location TEXT,
+                    stream_names TEXT,
+                    raw_asset_location TEXT,
+                    indexed_at REAL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _negative_cutoff(self) -> float:
+        return time.time() - self.negative_ttl
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """Return the manifest entry of an asset, or None if it was not indexed yet or has expired.
+
+        Parameters
+        ----------
+        asset_id : str
+            DocDB ``_id`` of the derived asset.
+
+        Returns
+        -------
+        dict or None
+            Entry with ``stream_names`` (list[str]) and ``raw_asset_location`` (str or None).
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT name, location, stream_names, raw_asset_location FROM streams "
+                f"WHERE asset_id = ? AND {self._FRESH}",
+                (asset_id, self._negative_cutoff()),
+            ).fetchone()
+        if row is None:
+            return None
+        name, location, stream_names, raw_asset_location = row
+        return {
+            "name": name,
+            "location": location,
+            "stream_names": json.loads(stream_names),
+            "raw_asset_location": raw_asset_location,
+        }
+
+    def put(
+        self,
+        asset_id: str,
+        name: str,
+        location: str,
+        stream_names: List[str],
+        raw_asset_location: Optional[str],
+    ):
+        """Insert or replace the manifest entry of an asset."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?, ?, ?)",
+                (asset_id, name, location, json.dumps(stream_names), raw_asset_location, time.time()),
+            )
+
+    def contains(self, asset_id: str) -> bool:
+        """Whether an asset was indexed and its entry has not expired."""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT 1 FROM streams WHERE asset_id = ? AND {self._FRESH}", (asset_id, self._negative_cutoff())
+            ).fetchone()
+        return row is not None
+
+    def indexed_ids(self) -> set:
+        """Return the ids of all indexed assets whose entry has not expired."""
+        with self._connect() as conn:
+            return {
+                row[0]
+                for row in conn.execute(f"SELECT asset_id FROM streams WHERE {self._FRESH}", (self._negative_cutoff(),))
+            }
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM streams").fetchone()[0]
+
+
+class ManifestIndexer:
+    """Background service indexing the streams of all ecephys derived assets.
+
+    Each pass only resolves records that are not in the manifest yet, or whose entry without
+    raw recording has expired, so after the first full walk it costs as much as the number of
+    new assets and of assets still missing their raw recording.
+
+    Parameters
+    ----------
+    manifest : StreamManifest
+        Manifest to fill.
+    get_records : callable
+        Zero-argument function returning the DocDB records to index.
+    resolve : callable
+        Function taking a record and returning ``(stream_names, raw_asset_location)``.
+    max_workers : int, optional
+        Number of assets resolved concurrently, by default MANIFEST_INDEXER_WORKERS
+    interval : int, optional
+        Seconds between passes, by default MANIFEST_INDEXER_INTERVAL
+    prefetch : callable, optional
+        Function taking a batch of records and caching what ``resolve`` needs for all of them
+        at once, e.g. their raw assets, called before the batch is resolved. Errors are ignored.
+    batch_size : int, optional
+        Number of records per ``prefetch`` call, by default MANIFEST_INDEXER_BATCH_SIZE
+    """
+
+    def __init__(
+        self,
+        manifest: StreamManifest,
+        get_records: Callable[[], Iterable[Dict[str, Any]]],
+        resolve: Callable[[Dict[str, Any]], Tuple[List[str], Optional[str]]],
+        max_workers: int = MANIFEST_INDEXER_WORKERS,
+        interval: int = MANIFEST_INDEXER_INTERVAL,
+        prefetch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        batch_size: int = MANIFEST_INDEXER_BATCH_SIZE,
+    ):
+        self.manifest = manifest
+        self.get_records = get_records
+        self.resolve = resolve
+        self.max_workers = max_workers
+        self.interval = interval
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _index_record(self, record):
+        stream_names, raw_asset_location = self.resolve(record)
+        self.manifest.put(
+            record["_id"], record.get("name", ""), record.get("location", ""), stream_names, raw_asset_location
+        )
+
+    def run_once(self) -> int:
+        """Index all records missing from the manifest or whose entry has expired.
+
+        Returns
+        -------
+        int
+            Number of newly indexed assets.
+        """
+        indexed_ids = self.manifest.indexed_ids()
+        new_records = [r for r in self.get_records() if r.get("_id") and r["_id"] not in indexed_ids]
+        if len(new_records) == 0:
+            return 0
+        logger.info(f"Indexing streams of {len(new_records)} new or expired assets")
+        n_indexed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="manifest-indexer") as executor:
+            for start in range(0, len(new_records), self.batch_size):
+                if self._stop.is_set():
+                    break
+                batch = new_records[start : start + self.batch_size]
+                if self.prefetch is not None:
+                    try:
+                        self.prefetch(batch)
+                    except Exception as e:
+                        logger.warning(f"Error prefetching {len(batch)} records, resolving them one by one: {e}")
+                futures = {executor.submit(self._index_record, record): record for record in batch}
+                for future in as_completed(futures):
+                    if self._stop.is_set():
+                        # only the records already being resolved are waited for
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    try:
+                        future.result()
+                        n_indexed += 1
+                    except Exception as e:
+                        # not stored, so the asset is retried on the next pass
+                        logger.warning(f"Error indexing {futures[future].get('name')}: {e}")
+        logger.info(f"Indexed {n_indexed} assets, manifest size: {len(self.manifest)}")
+        return n_indexed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"Error updating stream manifest: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start indexing in a daemon thread. Calling it again is a no-op."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="manifest-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after the current asset finishes."""
+        self._stop.set()
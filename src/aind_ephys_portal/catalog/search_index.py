@@ -0,0 +1,155 @@
+"""Inverted token index for searching the asset catalog.
+
+Each indexed field is split into tokens, and every token maps to the set of documents
+containing it. A query is a whitespace-separated list of terms that must all match (AND).
+A term matches a document if each of its tokens is a prefix of a token of the document.
+Terms can be restricted to one field with a prefix, e.g. ``subject:123456`` or
+``date:2024-05``; unprefixed terms match any field.
+"""
+
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Indexed fields and the query prefixes selecting them
+SEARCH_FIELDS = ["name", "subject_id", "date", "id"]
+FIELD_ALIASES = {"name": "name", "subject": "subject_id", "subject_id": "subject_id", "date": "date", "id": "id"}
+
+_NAME_SEPARATORS = re.compile(r"[\s_]+")
+
+
+def tokenize(field: str, value: str) -> List[str]:
+    """Split a (lowercase) field value into index tokens.
+
+    Names are split on underscores and whitespace (``ecephys_713655_2024-05-01_...``), dates
+    are indexed by day, and subject ids and asset ids are indexed as a whole.
+    """
+    if not isinstance(value, str):
+        value = "" if value is None else str(value)
+    value = value.lower().strip()
+    if value == "":
+        return []
+    if field == "name":
+        return [token for token in _NAME_SEPARATORS.split(value) if token]
+    if field == "date":
+        return [value[:10]]
+    return [value]
+
+
+class SearchIndex:
+    """Incrementally updatable inverted index over the catalog fields.
+
+    Documents are identified by their catalog id.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, Set[str]]] = {field: {} for field in SEARCH_FIELDS}
+        # sorted vocabulary of each field, for prefix lookups
+        self._vocabulary: Dict[str, List[str]] = {field: [] for field in SEARCH_FIELDS}
+        self._doc_tokens: Dict[str, List[Tuple[str, str]]] = {}
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def update(self, documents: Iterable[Dict[str, str]]):
+        """Add or replace documents.
+
+        Parameters
+        ----------
+        documents : iterable of dict
+            Documents with an ``id`` and the fields in SEARCH_FIELDS.
+        """
+        new_tokens = {field: set() for field in SEARCH_FIELDS}
+        for document in documents:
+            doc_id = document["id"]
+            self.remove(doc_id)
+            doc_tokens = []
+            for field in SEARCH_FIELDS:
+                postings = self._postings[field]
+                for token in set(tokenize(field, document.get(field, ""))):
+                    if token not in postings:
+                        postings[token] = set()
+                        new_tokens[field].add(token)
+                    postings[token].add(doc_id)
+                    doc_tokens.append((field, token))
+            self._doc_tokens[doc_id] = doc_tokens
+
+        for field, tokens in new_tokens.items():
+            vocabulary = self._vocabulary[field]
+            if len(tokens) > len(vocabulary) // 10:
+                self._vocabulary[field] = sorted(self._postings[field])
+            else:
+                for token in tokens:
+                    insort(vocabulary, token)
+
+    def remove(self, doc_id: str):
+        """Remove a document from the index, if present."""
+        for field, token in self._doc_tokens.pop(doc_id, []):
+            postings = self._postings[field].get(token)
+            if postings is not None:
+                postings.discard(doc_id)
+                # empty postings are kept, the vocabulary is only rebuilt on large updates
+
+    def _match_prefix(self, field: str, prefix: str) -> Set[str]:
+        """Documents with a token of ``field`` starting with ``prefix``.
+
+        The returned set may be a posting set of the index and must not be modified.
+        """
+        postings = self._postings[field]
+        vocabulary = self._vocabulary[field]
+        i = bisect_left(vocabulary, prefix)
+        matches = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            if postings[vocabulary[i]]:
+                matches.append(postings[vocabulary[i]])
+            i += 1
+        if len(matches) == 1:
+            return matches[0]
+        return set().union(*matches)
+
+    def _match_term(self, field: str, value: str) -> Set[str]:
+        tokens = tokenize(field, value)
+        if len(tokens) == 0:
+            return set()
+        result = None
+        for token in sorted(tokens, key=len, reverse=True):
+            matches = self._match_prefix(field, token)
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[Optional[str], str]]:
+        """Split a query into ``(field, value)`` terms. ``field`` is None for unprefixed terms."""
+        terms = []
+        for term in query.split():
+            field = None
+            if ":" in term:
+                prefix, value = term.split(":", 1)
+                if prefix.lower() in FIELD_ALIASES:
+                    field, term = FIELD_ALIASES[prefix.lower()], value
+            if term:
+                terms.append((field, term))
+        return terms
+
+    def search(self, query: str) -> Optional[Set[str]]:
+        """Return the ids of the documents matching all terms of ``query``.
+
+        Returns
+        -------
+        set[str] or None
+            Matching ids, or None if the query has no terms (i.e. everything matches).
+        """
+        terms = self.parse_query(query)
+        if len(terms) == 0:
+            return None
+        result = None
+        for field, value in terms:
+            fields = SEARCH_FIELDS if field is None else [field]
+            field_matches = [matches for matches in (self._match_term(f, value) for f in fields) if matches]
+            matches = field_matches[0] if len(field_matches) == 1 else set().union(*field_matches)
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
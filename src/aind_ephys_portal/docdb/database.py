@@ -1,10 +1,16 @@
 """Database access functions for the AIND SIGUI Portal."""
 
 import os
-from typing import List, Dict, Any
+import re
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional
 
-import panel as pn
-from aind_data_access_api.document_db import MetadataDbClient
+import numpy as np
+
+from aind_ephys_portal.cache.cached import cached
+from aind_ephys_portal.metrics.registry import timed
 
 # Constants for database connection
 API_GATEWAY_HOST = os.environ.get("API_GATEWAY_HOST", "api.allenneuraldynamics-test.org")
@@ -13,18 +19,64 @@ COLLECTION = os.environ.get("COLLECTION", "data_assets")
 
 # Timeouts
 TIMEOUT_1M = 60
+TIMEOUT_10M = 60 * 10
 TIMEOUT_1H = 60 * 60
 TIMEOUT_24H = 60 * 60 * 24
 
-# Initialize the client
-client = MetadataDbClient(
-    host=API_GATEWAY_HOST,
-    database=DATABASE,
-    collection=COLLECTION,
+# Query matching all ecephys derived assets
+ECEPHYS_DERIVED_FILTER = {"data_description.modality.abbreviation": "ecephys", "data_description.data_level": "derived"}
+
+# Fields of the derived records used by the portal
+CATALOG_FIELDS = ["_id", "name", "created", "last_modified", "location", "subject_id"]
+CATALOG_PROJECTION = {
+    "_id": 1,
+    "name": 1,
+    "created": 1,
+    "last_modified": 1,
+    "location": 1,
+    "subject_id": 1,
+    "subject.subject_id": 1,
+}
+DOCDB_PAGE_SIZE = int(os.environ.get("DOCDB_PAGE_SIZE", 1000))
+
+# Fields of the raw records used to resolve raw recordings
+RAW_ASSET_PROJECTION = {"_id": 1, "name": 1, "location": 1}
+RAW_ASSET_BATCH_SIZE = 200
+
+# ISO timestamps, with optional fractions of seconds and zone
+_TIMESTAMP_PATTERN = re.compile(
+    r"(?P<date>\d{4}-\d{2}-\d{2})[T ](?P<time>\d{2}:\d{2}:\d{2})(?:\.\d+)?(?P<zone>Z|[+-]\d{2}:?\d{2})?$"
 )
 
+# The client is created on first use, so importing this module stays cheap
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide DocDB client, creating it on first use.
+
+    Returns
+    -------
+    MetadataDbClient
+        Client of the DATABASE / COLLECTION on API_GATEWAY_HOST.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from aind_data_access_api.document_db import MetadataDbClient
+
+                _client = MetadataDbClient(
+                    host=API_GATEWAY_HOST,
+                    database=DATABASE,
+                    collection=COLLECTION,
+                )
+    return _client
+
 
-@pn.cache()
+@cached()
+@timed("docdb.get_name_from_id")
 def get_name_from_id(id: str):
     """Get the name field from a record with the given ID.
 
@@ -38,11 +90,13 @@ def get_name_from_id(id: str):
     str
         The name field from the record.
     """
-    response = client.aggregate_docdb_records(pipeline=[{"$match": {"_id": id}}, {"$project": {"name": 1, "_id": 0}}])
+    response = get_client().aggregate_docdb_records(
+        pipeline=[{"$match": {"_id": id}}, {"$project": {"name": 1, "_id": 0}}]
+    )
     return response[0]["name"]
 
 
-@pn.cache()
+@lru_cache(maxsize=None)
 def _raw_name_from_derived(s):
     """Returns just the raw asset name from an asset that is derived, i.e. has >= 4 underscores
 
@@ -62,27 +116,35 @@ def _raw_name_from_derived(s):
     return s
 
 
-@pn.cache(ttl=TIMEOUT_1H)
+@cached(ttl=TIMEOUT_1H)
+@timed("docdb.get_asset_by_name")
 def get_asset_by_name(asset_name: str):
-    """Get all assets that match a given asset name pattern.
+    """Get all assets whose name starts with a given asset name.
+
+    The pattern is anchored at the start of the name, so the query can use the name index.
 
     Parameters
     ----------
     asset_name : str
-        The asset name to search for (will be converted to raw name if derived).
+        The asset name prefix to search for.
 
     Returns
     -------
     list[dict]
         List of matching asset records.
     """
-    response = client.retrieve_docdb_records(filter_query={"name": {"$regex": asset_name, "$options": "i"}}, limit=0)
+    response = get_client().retrieve_docdb_records(
+        filter_query={"name": {"$regex": f"^{re.escape(asset_name)}"}}, limit=0
+    )
     return response
 
 
-@pn.cache(ttl=TIMEOUT_1H)
+@cached(ttl=TIMEOUT_1H)
+@timed("docdb.get_raw_asset_by_name")
 def get_raw_asset_by_name(asset_name: str):
-    """Get all assets that match a given asset name pattern.
+    """Get the raw asset(s) of a raw or derived asset name.
+
+    The raw name is matched exactly first, then as an anchored prefix if there is no exact match.
 
     Parameters
     ----------
@@ -95,23 +157,214 @@ def get_raw_asset_by_name(asset_name: str):
         List of matching asset records.
     """
     raw_name = _raw_name_from_derived(asset_name)
-    response = client.retrieve_docdb_records(
-        filter_query={"name": {"$regex": raw_name, "$options": "i"}, "data_description.data_level": "raw"}, limit=0
+    response = get_client().retrieve_docdb_records(
+        filter_query={"name": raw_name, "data_description.data_level": "raw"}, limit=0
     )
+    if len(response) == 0:
+        response = get_client().retrieve_docdb_records(
+            filter_query={"name": {"$regex": f"^{re.escape(raw_name)}"}, "data_description.data_level": "raw"},
+            limit=0,
+        )
     return response
 
 
-@pn.cache(ttl=TIMEOUT_1H)
-def get_all_ecephys_derived() -> List[Dict[str, Any]]:
-    """Get a limited set of all records from the database.
+def _raw_prefix_filter(raw_names: List[str]) -> dict:
+    """Query matching the raw assets whose name starts with any of the given raw names."""
+    return {
+        "$or": [{"name": {"$regex": f"^{re.escape(raw_name)}"}} for raw_name in raw_names],
+        "data_description.data_level": "raw",
+    }
+
+
+def _match_raw_assets(raw_names: List[str], records: List[dict], prefix: bool = False) -> Dict[str, dict]:
+    """First record matching each raw name, exactly or as a name prefix."""
+    matches = {}
+    for record in records:
+        name = record.get("name") or ""
+        for raw_name in raw_names:
+            if raw_name not in matches and (name.startswith(raw_name) if prefix else name == raw_name):
+                matches[raw_name] = record
+    return matches
+
+
+# Raw assets can be registered after their derived assets, so misses are only cached briefly
+@cached(ttl=TIMEOUT_1H, negative_ttl=TIMEOUT_10M)
+@timed("docdb.get_raw_asset")
+def _get_raw_asset(raw_name: str) -> Optional[Dict[str, Any]]:
+    """Get the projected raw asset record of a raw name, or None if there is none.
+
+    The name is matched exactly first, then as an anchored prefix, as in ``get_raw_asset_by_name``.
+    """
+    for filter_query in ({"name": raw_name, "data_description.data_level": "raw"}, _raw_prefix_filter([raw_name])):
+        response = get_client().retrieve_docdb_records(
+            filter_query=filter_query, projection=RAW_ASSET_PROJECTION, limit=1
+        )
+        if len(response) > 0:
+            return response[0]
+    return None
+
+
+def get_raw_assets_by_names(asset_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Resolve the raw assets of many raw or derived asset names at once.
+
+    Cached raw assets are read with a single cache lookup. The others are matched exactly with
+    one ``$in`` query per RAW_ASSET_BATCH_SIZE names, then the names without exact match are
+    matched as anchored prefixes with one more query, as in ``get_raw_asset_by_name``. Only the
+    fields in RAW_ASSET_PROJECTION are returned. Raw assets are cached for an hour and misses
+    for ten minutes.
+
+    Parameters
+    ----------
+    asset_names : list[str]
+        Raw or derived asset names.
 
     Returns
     -------
+    dict[str, dict or None]
+        The projected raw asset record of each name, or None if there is none.
+    """
+    raw_names = {name: _raw_name_from_derived(name) for name in asset_names}
+    keys = {raw_name: _get_raw_asset.key(raw_name) for raw_name in set(raw_names.values())}
+    cached_records = _get_raw_asset.get_many(keys.values())
+    records = {raw_name: cached_records[key] for raw_name, key in keys.items() if key in cached_records}
+    missing = sorted(set(keys) - set(records))
+    for start in range(0, len(missing), RAW_ASSET_BATCH_SIZE):
+        batch = missing[start : start + RAW_ASSET_BATCH_SIZE]
+        with timed("docdb.get_raw_assets_batch"):
+            response = get_client().retrieve_docdb_records(
+                filter_query={"name": {"$in": batch}, "data_description.data_level": "raw"},
+                projection=RAW_ASSET_PROJECTION,
+                limit=0,
+            )
+        found = _match_raw_assets(batch, response)
+        unmatched = [raw_name for raw_name in batch if raw_name not in found]
+        if len(unmatched) > 0:
+            with timed("docdb.get_raw_assets_prefix_batch"):
+                response = get_client().retrieve_docdb_records(
+                    filter_query=_raw_prefix_filter(unmatched), projection=RAW_ASSET_PROJECTION, limit=0
+                )
+            response = sorted(response, key=lambda record: record.get("name") or "")
+            found.update(_match_raw_assets(unmatched, response, prefix=True))
+        for raw_name in batch:
+            records[raw_name] = found.get(raw_name)
+            _get_raw_asset.put(keys[raw_name], records[raw_name])
+    return {name: records[raw_name] for name, raw_name in raw_names.items()}
+
+
+def iter_projected_pages(
+    filter_query: dict, projection: dict, page_size: int = DOCDB_PAGE_SIZE
+) -> Iterator[List[dict]]:
+    """Iterate over the records matching a query, one page of projected records at a time.
+
+    Parameters
+    ----------
+    filter_query : dict
+        The query to match.
+    projection : dict
+        The fields to return.
+    page_size : int, optional
+        Number of records per request, by default DOCDB_PAGE_SIZE
+
+    Yields
+    ------
     list[dict]
-        List of records, limited to 50 entries.
+        A page of projected records, sorted by ``_id``.
+
+    Notes
+    -----
+    Pages are delimited by the last ``_id`` of the previous page rather than a ``$skip``: each
+    request seeks in the ``_id`` index instead of scanning the skipped records, and records
+    inserted or deleted during the iteration do not shift the following pages.
     """
-    filter_query = {"data_description.modality.abbreviation": "ecephys", "data_description.data_level": "derived"}
-    response = client.retrieve_docdb_records(
-        filter_query=filter_query,
-    )
-    return response
+    last_id = None
+    while True:
+        match = filter_query if last_id is None else dict(filter_query, _id={"$gt": last_id})
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"_id": 1}},
+            {"$limit": page_size},
+            {"$project": dict(projection, _id=1)},
+        ]
+        with timed("docdb.aggregate_page"):
+            page = get_client().aggregate_docdb_records(pipeline=pipeline)
+        if len(page) == 0:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["_id"]
+
+
+def _pages_to_columns(pages: Iterator[List[dict]]) -> Dict[str, np.ndarray]:
+    """Stream pages of projected records into one array per field of CATALOG_FIELDS."""
+    columns = {field: [] for field in CATALOG_FIELDS}
+    for page in pages:
+        for record in page:
+            for field in CATALOG_FIELDS:
+                if field != "subject_id":
+                    columns[field].append(record.get(field, ""))
+            subject = record.get("subject", {})
+            if subject:
+                columns["subject_id"].append(subject.get("subject_id", ""))
+            else:
+                columns["subject_id"].append(record.get("subject_id", ""))
+    return {field: np.array(values, dtype=object) for field, values in columns.items()}
+
+
+@cached(ttl=TIMEOUT_1H)
+@timed("docdb.get_all_ecephys_derived_columns")
+def get_all_ecephys_derived_columns() -> Dict[str, np.ndarray]:
+    """Get the fields used by the portal for all ecephys derived records.
+
+    Only the fields in CATALOG_FIELDS are transferred, page by page.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        One array per field of CATALOG_FIELDS, aligned by record.
+    """
+    return _pages_to_columns(iter_projected_pages(ECEPHYS_DERIVED_FILTER, CATALOG_PROJECTION))
+
+
+def get_ecephys_derived_ids() -> List[str]:
+    """Get the ids of all ecephys derived records, e.g. to find the records deleted since the catalog was loaded."""
+    return [record["_id"] for page in iter_projected_pages(ECEPHYS_DERIVED_FILTER, {"_id": 1}) for record in page]
+
+
+def normalize_timestamp(value: str) -> str:
+    """UTC ``YYYY-MM-DDTHH:MM:SS`` form of an ISO timestamp, returned unchanged if it cannot be parsed.
+
+    ``last_modified`` is stored as a string and compared as one, so ``2025-01-01T12:00:00Z``,
+    ``2025-01-01T12:00:00+00:00`` or ``2025-01-01T14:00:00.5+02:00`` must be brought to the same
+    form first. Fractions of seconds and the zone suffix are left out: stored timestamps of the
+    same second compare greater than the normalized value.
+    """
+    match = _TIMESTAMP_PATTERN.match(value.strip())
+    if match is None:
+        return value
+    timestamp = datetime.strptime(f"{match['date']}T{match['time']}", "%Y-%m-%dT%H:%M:%S")
+    zone = match["zone"]
+    if zone and zone != "Z":
+        sign = 1 if zone[0] == "+" else -1
+        hours, minutes = int(zone[1:3]), int(zone[-2:])
+        timestamp -= sign * timedelta(hours=hours, minutes=minutes)
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def get_ecephys_derived_columns_modified_since(last_modified: str) -> Dict[str, np.ndarray]:
+    """Get the fields used by the portal for the ecephys derived records modified after a given time.
+
+    Records modified during the second of ``last_modified`` are returned again, see ``normalize_timestamp``.
+
+    Parameters
+    ----------
+    last_modified : str
+        ISO timestamp, in any time zone.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        One array per field of CATALOG_FIELDS, aligned by record.
+    """
+    filter_query = dict(ECEPHYS_DERIVED_FILTER, last_modified={"$gt": normalize_timestamp(last_modified)})
+    return _pages_to_columns(iter_projected_pages(filter_query, CATALOG_PROJECTION))
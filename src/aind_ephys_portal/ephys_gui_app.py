@@ -9,6 +9,8 @@ import panel as pn
 
 pn.extension("tabulator", "gridstack")
 
+# spikeinterface-gui is otherwise imported lazily when an analyzer is opened, but its
+# custom Panel components must be defined before the page is first rendered
 from spikeinterface_gui.utils_panel import KeyboardShortcuts
 
 
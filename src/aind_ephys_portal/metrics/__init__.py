@@ -0,0 +1 @@
+"""Latency instrumentation and metrics export for the AIND SIGUI Portal."""
@@ -0,0 +1,93 @@
+"""Panel server plugin serving the process metrics at ``/metrics``.
+
+Enable it with::
+
+    panel serve ... --plugins aind_ephys_portal.metrics.server
+
+Metrics are kept per process: with ``--num-procs N`` every worker answers with its own values.
+Besides the stage latencies recorded with ``timed``, the endpoint reports the state of the
+function result cache, the shared analyzer cache and the on-disk chunk cache.
+"""
+
+import sys
+
+import tornado.web
+
+from aind_ephys_portal.analyzer.cache import analyzer_cache
+from aind_ephys_portal.cache.cached import cache_stats
+from aind_ephys_portal.metrics.registry import registry
+
+CACHE_REQUESTS = registry.counter(
+    "aind_ephys_portal_cache_requests_total", "Calls of cached functions by result", ["function", "result"]
+)
+CACHE_LOADS = registry.counter(
+    "aind_ephys_portal_cache_loads_total", "Calls of cached functions that computed the value", ["function"]
+)
+CACHE_LOAD_SECONDS = registry.counter(
+    "aind_ephys_portal_cache_load_seconds_total", "Time spent computing values of cached functions", ["function"]
+)
+CACHE_LOOKUP_SECONDS = registry.counter(
+    "aind_ephys_portal_cache_lookup_seconds_total", "Time spent reading the cache backend", ["function"]
+)
+ANALYZER_CACHE_ENTRIES = registry.gauge("aind_ephys_portal_analyzer_cache_entries", "Number of cached analyzers")
+ANALYZER_CACHE_BYTES = registry.gauge(
+    "aind_ephys_portal_analyzer_cache_bytes", "Estimated memory of the cached analyzers"
+)
+ANALYZER_CACHE_PINNED = registry.gauge(
+    "aind_ephys_portal_analyzer_cache_pinned", "Number of cached analyzers in use by open sessions"
+)
+ANALYZER_LOADS_IN_FLIGHT = registry.gauge(
+    "aind_ephys_portal_analyzer_loads_in_flight", "Number of analyzers being loaded into the shared cache"
+)
+ANALYZER_CACHE_REQUESTS = registry.counter(
+    "aind_ephys_portal_analyzer_cache_requests_total", "Analyzer cache lookups by result", ["result"]
+)
+CHUNK_CACHE_REQUESTS = registry.counter(
+    "aind_ephys_portal_chunk_cache_requests_total", "Chunk cache lookups by result", ["result"]
+)
+CHUNK_CACHE_BYTES = registry.counter(
+    "aind_ephys_portal_chunk_cache_bytes_total", "Bytes read through the chunk cache by result", ["result"]
+)
+
+
+def collect_cache_metrics():
+    """Copy the counters of the caches into the registry."""
+    for function, stats in cache_stats().items():
+        CACHE_REQUESTS.set_total(stats["hits"], function=function, result="hit")
+        CACHE_REQUESTS.set_total(stats["misses"], function=function, result="miss")
+        CACHE_REQUESTS.set_total(stats["coalesced"], function=function, result="coalesced")
+        CACHE_REQUESTS.set_total(stats["errors"], function=function, result="error")
+        CACHE_LOADS.set_total(stats["loads"], function=function)
+        CACHE_LOAD_SECONDS.set_total(stats["load_seconds"], function=function)
+        CACHE_LOOKUP_SECONDS.set_total(stats["lookup_seconds"], function=function)
+
+    ANALYZER_CACHE_ENTRIES.set(len(analyzer_cache))
+    ANALYZER_CACHE_BYTES.set(analyzer_cache.nbytes)
+    ANALYZER_CACHE_PINNED.set(analyzer_cache.pinned)
+    ANALYZER_LOADS_IN_FLIGHT.set(analyzer_cache.in_flight)
+    ANALYZER_CACHE_REQUESTS.set_total(analyzer_cache.hits, result="hit")
+    ANALYZER_CACHE_REQUESTS.set_total(analyzer_cache.misses, result="miss")
+
+    # the chunk cache module (and s3fs) is only loaded by the GUI, don't import it from here
+    chunk_cache_module = sys.modules.get("aind_ephys_portal.analyzer.chunk_cache")
+    chunk_cache = chunk_cache_module.get_chunk_cache() if chunk_cache_module is not None else None
+    if chunk_cache is not None:
+        stats = chunk_cache.stats()
+        CHUNK_CACHE_REQUESTS.set_total(stats["hits"], result="hit")
+        CHUNK_CACHE_REQUESTS.set_total(stats["misses"], result="miss")
+        CHUNK_CACHE_BYTES.set_total(stats["bytes_hit"], result="hit")
+        CHUNK_CACHE_BYTES.set_total(stats["bytes_missed"], result="miss")
+
+
+registry.add_collector(collect_cache_metrics)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Serve the registry in the Prometheus text format."""
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(registry.render())
+
+
+ROUTES = [("/metrics", MetricsHandler, {})]
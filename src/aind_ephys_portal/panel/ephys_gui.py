@@ -1,23 +1,35 @@
-import sys
+import gc
+import logging
 import param
-import boto3
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 
 import panel as pn
+from panel.io.state import set_curdoc
 
 pn.extension("tabulator", "gridstack")
 
-from aind_ephys_portal.docdb.database import get_name_from_id, get_asset_by_name, get_raw_asset_by_name
+from aind_ephys_portal.analyzer.cache import analyzer_cache
+from aind_ephys_portal.analyzer.load_queue import load_queue
+from aind_ephys_portal.analyzer.loader import load_analyzer
+from aind_ephys_portal.analyzer.prefetch import prefetch_extensions
+from aind_ephys_portal.analyzer.unit_summary import (
+    DISPLAYED_UNIT_PROPERTIES,
+    find_unit_summary,
+    update_cached_unit_summary,
+)
+from aind_ephys_portal.metrics.registry import registry, timed, STAGE_SECONDS
+from aind_ephys_portal.s3.client import prefix_exists, split_s3_url
 
-from spikeinterface_gui import run_mainwindow
-import spikeinterface as si
-from spikeinterface.core.core_tools import extractor_dict_iterator, set_value_in_extractor_dict
+from .utils import SessionLogHandler, track_session
 
-from .utils import Tee
+logger = logging.getLogger(__name__)
 
 
-displayed_unit_properties = ["decoder_label", "firing_rate", "y", "snr", "amplitude_median", "isi_violation_ratio"]
+displayed_unit_properties = DISPLAYED_UNIT_PROPERTIES
 default_curation_dict = {
     "label_definitions": {
         "quality":{
@@ -30,6 +42,57 @@ default_curation_dict = {
     "removed_units": [],
 }
 
+# Rows per page of the unit summary shown while the GUI loads; pages are sent to the browser on demand
+UNIT_SUMMARY_PAGE_SIZE = 20
+
+# Unit summaries are read outside of the load queue, so they show while loads wait their turn
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="unit-summary")
+# Cached analyzers whose extensions were prefetched by a GUI session
+_prefetched_analyzers = weakref.WeakSet()
+GUI_LOADS_IN_FLIGHT = registry.gauge(
+    "aind_ephys_portal_gui_loads_in_flight", "Number of GUI sessions loading an analyzer and building their layout"
+)
+
+
+class LoadCancelled(Exception):
+    """Raised inside a background load that was superseded by a newer request."""
+
+
+class _RawTracesCache(dict):
+    """Traces cache of the GUI controller that keeps raw windows only.
+
+    The controller also answers narrower windows from cached ones, which must not be served
+    from the coarse levels of a trace pyramid. It replaces the private ``_traces_cached`` dict of
+    the controller, keyed by ``(segment_index, start_frame, end_frame)``, so ``install`` checks
+    that the installed spikeinterface-gui has one; keys of another shape are not cached.
+    """
+
+    @classmethod
+    def install(cls, controller, trace_pyramid) -> bool:
+        """Replace the traces cache of a controller, if it has the expected one. Returns whether it did."""
+        traces_cached = getattr(controller, "_traces_cached", None)
+        if type(traces_cached) is not dict or not callable(getattr(controller, "get_traces", None)):
+            logger.warning(
+                "Unexpected traces cache in the GUI controller, zoomed in trace windows may be drawn from coarse "
+                "trace pyramid levels"
+            )
+            return False
+        controller._traces_cached = cls(trace_pyramid)
+        return True
+
+    def __init__(self, trace_pyramid):
+        super().__init__()
+        self.trace_pyramid = trace_pyramid
+
+    def __setitem__(self, key, traces):
+        if not (isinstance(key, tuple) and len(key) == 3):
+            return
+        _, start_frame, end_frame = key
+        if start_frame is not None and end_frame is not None:
+            if self.trace_pyramid.level_for(end_frame - start_frame) is None:
+                super().__setitem__(key, traces)
+
+
 class EphysGuiView(param.Parameterized):
 
     def __init__(self, analyzer_path, recording_path, **params):
@@ -40,6 +103,23 @@ class EphysGuiView(param.Parameterized):
         self.analyzer_path = analyzer_path
         self.recording_path = recording_path
         self.analyzer = None
+        self.win = None
+        self.status = None
+        self._loading = None
+        self._loading_row = None
+        self._recording_error = None
+        self._doc = None
+        self._load_future = None
+        self._load_generation = 0
+        self._log_handler = SessionLogHandler(log_output=None)
+        # analyzer cache keys pinned by this session, released when superseded or when the session closes
+        self._held_keys = []
+        self._held_lock = threading.Lock()
+        self._destroyed = False
+        track_session("ephys_gui")
+        doc = pn.state.curdoc
+        if doc is not None and doc.session_context is not None:
+            pn.state.on_session_destroyed(self._on_session_destroyed)
 
         # Create initial layout
         self.layout = pn.Column(
@@ -53,7 +133,7 @@ class EphysGuiView(param.Parameterized):
                 pn.widgets.Button(name="Launch!", button_type="primary", height=50, sizing_mode="stretch_width"),
                 sizing_mode="stretch_width",
             ),
-            self._create_main_window(),
+            pn.pane.Markdown("Analyzer not initialized"),
         )
 
         # Store widget references
@@ -68,95 +148,347 @@ class EphysGuiView(param.Parameterized):
 
     def _initialize(self):
         if self.analyzer_input.value != "":
+            # a new request supersedes any load still running for this session
+            self._cancel_load()
+            self._load_generation += 1
+            generation = self._load_generation
+            self._doc = pn.state.curdoc
+
             t_start = time.perf_counter()
             spinner = pn.indicators.LoadingSpinner(value=True, sizing_mode="stretch_width")
-            # Create a TextArea widget to display logs
-            log_output = pn.widgets.TextAreaInput(value="", sizing_mode="stretch_both")
+            self.status = pn.pane.Markdown("Starting...", sizing_mode="stretch_width")
+            # Column the log lines are appended to, scrolled to the end as they come
+            log_output = pn.Column(
+                sizing_mode="stretch_both",
+                scroll=True,
+                auto_scroll_limit=200,
+                styles={"font-family": "monospace", "font-size": "11px", "border": "1px solid #ddd"},
+            )
+            self._log_handler.start(log_output)
+
+            self._loading = pn.Column(spinner, self.status, sizing_mode="stretch_width")
+            self._loading_row = pn.Row(self._loading, log_output)
+            self.layout[1] = self._loading_row
+            self._clear_recording_error()
 
-            original_stdout = sys.stdout
-            sys.stdout = Tee(original_stdout, log_output)  # Redirect stdout
+            with self._log_handler.capture():
+                logger.info(
+                    f"Initializing Ephys GUI for:\nAnalyzer path: {self.analyzer_path}\nRecording path: {self.recording_path}"
+                )
+            analyzer_path, recording_path = self.analyzer_path, self.recording_path
+            _summary_executor.submit(self._load_unit_summary, generation, analyzer_path)
+            self._load_future = load_queue.submit(
+                lambda: self._load_in_background(generation, analyzer_path, recording_path, t_start),
+                needs_memory=analyzer_cache.make_key(analyzer_path, recording_path) not in analyzer_cache,
+                on_position=lambda position: self._report_position(generation, position),
+            )
+
+    def _load_in_background(self, generation, analyzer_path, recording_path, t_start):
+        """Load the analyzer and build the GUI layout off the event loop.
 
-            original_stderr = sys.stderr
-            sys.stderr = Tee(original_stderr, log_output)  # Redirect stderr
+        Runs in ``_load_executor`` once admitted by ``load_queue``. Progress and the final
+        layout swap are scheduled back onto the session's event loop.
+        """
+        GUI_LOADS_IN_FLIGHT.inc()
+        key = None
+        completed = False
+        with self._log_handler.capture():
+            try:
+                self._check_cancelled(generation)
+                self._report_progress(generation, "Loading analyzer...")
+                with timed("gui.get_analyzer"):
+                    analyzer = self._initialize_analyzer(analyzer_path, recording_path)
+                key = (analyzer_path, recording_path)
+                self._hold(key)
+                self._check_cancelled(generation)
 
-            self.layout[1] = pn.Row(spinner, log_output)
+                self._report_progress(generation, "Building GUI layout...")
+                # the recording the window is built with, which may be swapped while it is built
+                recording = analyzer.recording if analyzer.has_temporary_recording() else None
+                with timed("gui.run_mainwindow"), set_curdoc(self._doc):
+                    win = self._create_main_window(analyzer)
+                self._check_cancelled(generation)
+                completed = True
+            except LoadCancelled:
+                logger.info(f"Load of {analyzer_path} cancelled")
+            except Exception as e:
+                logger.exception(f"Error initializing Ephys GUI: {e}")
+                self._run_on_session(generation, self._show_error, e)
+            finally:
+                GUI_LOADS_IN_FLIGHT.dec()
+                # the analyzer of a cancelled or failed load is not shown
+                if key is not None and not completed:
+                    self._unhold(key)
+        if completed:
+            self._run_on_session(generation, self._swap_layout, analyzer, win, key, recording, t_start)
 
-            print(
-                f"Initializing Ephys GUI for:\nAnalyzer path: {self.analyzer_path}\nRecording path: {self.recording_path}"
+    def _load_unit_summary(self, generation, analyzer_path):
+        """Read the unit summary of the analyzer and show it until the GUI is ready."""
+        with self._log_handler.capture():
+            try:
+                with timed("gui.find_unit_summary"):
+                    summary = find_unit_summary(analyzer_path)
+            except Exception as e:
+                logger.warning(f"Could not read unit summary: {e}")
+                return
+            if summary is not None:
+                self._run_on_session(generation, self._show_unit_summary, summary)
+
+    def _show_unit_summary(self, summary):
+        if self.layout[1] is not self._loading_row:
+            # the GUI is already shown
+            return
+        n_units = len(summary)
+        text = f"**{n_units} units**"
+        if "decoder_label" in summary.columns:
+            n_noise = int((summary["decoder_label"] == "noise").sum())
+            text += f", {n_noise} labelled as noise by the decoder and removed in the curation"
+        self._loading.append(pn.pane.Markdown(text))
+        self._loading.append(
+            pn.widgets.Tabulator(
+                summary.round(3),
+                disabled=True,
+                pagination="remote",
+                page_size=UNIT_SUMMARY_PAGE_SIZE,
+                sizing_mode="stretch_width",
             )
+        )
+
+    def _swap_layout(self, analyzer, win, key, recording, t_start):
+        """Install the loaded analyzer and GUI. Runs on the event loop."""
+        self.analyzer = analyzer
+        self.win = win
+        self.layout[1] = self.win.main_layout
+        self._release_held(keep=key)
+        self._watch_recording(recording, self._load_generation)
+        logger.info("Ephys GUI initialized successfully!")
+        t_stop = time.perf_counter()
+        STAGE_SECONDS.observe(t_stop - t_start, stage="gui.initialize")
+        logger.info(f"Initialization time: {t_stop - t_start:.2f} seconds")
+        self._log_handler.stop()
+
+    def _watch_recording(self, recording, generation):
+        """Redraw the trace views once a lazily attached recording is open, or report why it is not."""
+        from aind_ephys_portal.analyzer.lazy_recording import LazyRecording
+
+        if isinstance(recording, LazyRecording):
+            if recording.trace_pyramid is not None:
+                _RawTracesCache.install(self.win.controller, recording.trace_pyramid)
+            self._watch_open(recording, recording.opened, generation)
+
+    def _watch_open(self, recording, opened, generation):
+        opened.add_done_callback(
+            lambda _: self._run_on_session(generation, self._on_recording_opened, recording, opened)
+        )
+
+    def _on_recording_opened(self, recording, opened):
+        if self.win is None:
+            return
+        error = opened.exception()
+        if error is not None:
+            self._show_recording_error(recording, error)
+        else:
+            self._refresh_traces()
+
+    def _show_recording_error(self, recording, error):
+        """Show why the processed recording could not be opened, with a button to try again."""
+        self._clear_recording_error()
+        retry_button = pn.widgets.Button(name="Retry", button_type="warning", height=50)
+        retry_button.on_click(lambda event: self._retry_recording(recording))
+        self._recording_error = pn.Row(
+            pn.pane.Alert(
+                f"The processed recording could not be opened, raw traces are not available: {error}",
+                alert_type="warning",
+                sizing_mode="stretch_width",
+            ),
+            retry_button,
+            sizing_mode="stretch_width",
+        )
+        self.layout.append(self._recording_error)
 
-            self._initialize_analyzer()
-            if self.recording_path != "":
-                self._set_processed_recording()
-            self.win = self._create_main_window()
-            self.layout[1] = self.win
-            print("Ephys GUI initialized successfully!")
-            t_stop = time.perf_counter()
-            print(f"Initialization time: {t_stop - t_start:.2f} seconds")
-            sys.stdout = sys.__stdout__  # Reset stdout
-            sys.stderr = sys.__stderr__  # Reset stderr
-
-    def _initialize_analyzer(self):
-        if not self.analyzer_path.endswith((".zarr", ".zarr/")):
+    def _clear_recording_error(self):
+        if self._recording_error is not None and self._recording_error in self.layout:
+            self.layout.remove(self._recording_error)
+        self._recording_error = None
+
+    def _retry_recording(self, recording):
+        self._clear_recording_error()
+        logger.info("Opening processed recording again")
+        self._watch_open(recording, recording.retry_open(), self._load_generation)
+
+    def _refresh_traces(self):
+        if self.win is None:
+            return
+        # traces requested while the recording was opening were blank, and the controller caches them
+        traces_cache = getattr(self.win.controller, "_traces_cached", None)
+        if traces_cache is not None:
+            traces_cache.clear()
+        for view_name in ("trace", "tracemap"):
+            view = self.win.views.get(view_name)
+            if view is not None and view.is_view_visible():
+                view.refresh()
+
+    def _show_error(self, error):
+        self.layout[1] = pn.pane.Alert(f"Error initializing Ephys GUI: {error}", alert_type="danger")
+        self._log_handler.stop()
+
+    def _report_position(self, generation, position):
+        if position > 0:
+            message = f"Waiting for other analyzers to load: position {position} in line..."
+            self._run_on_session(generation, self._set_status, message)
+
+    def _report_progress(self, generation, message):
+        logger.info(message)
+        self._run_on_session(generation, self._set_status, message)
+
+    def _set_status(self, message):
+        self.status.object = message
+
+    def _run_on_session(self, generation, callback, *args):
+        """Schedule ``callback`` on the session event loop, unless the load was superseded."""
+
+        def run():
+            if generation != self._load_generation:
+                return
+            with set_curdoc(self._doc), self._log_handler.capture():
+                callback(*args)
+
+        if self._doc is None:
+            run()
+        else:
+            self._doc.add_next_tick_callback(run)
+
+    def _check_cancelled(self, generation):
+        if generation != self._load_generation:
+            raise LoadCancelled()
+
+    def _cancel_load(self):
+        """Cancel the pending load for this session, if any.
+
+        A load that is already running cannot be interrupted; it is discarded at its next
+        checkpoint. The analyzer it loads still lands in the shared cache.
+        """
+        if self._load_future is not None and not self._load_future.done():
+            if load_queue.cancel(self._load_future):
+                logger.info("Cancelling previous load")
+        self._load_future = None
+
+    def _hold(self, key):
+        """Record a pin on the shared analyzer cache, released at once if the session is gone."""
+        with self._held_lock:
+            if not self._destroyed:
+                self._held_keys.append(key)
+                return
+        analyzer_cache.release(*key)
+
+    def _unhold(self, key):
+        """Release a pin recorded by ``_hold``, unless the session already released it when it closed."""
+        with self._held_lock:
+            held = key in self._held_keys
+            if held:
+                self._held_keys.remove(key)
+        if held:
+            analyzer_cache.release(*key)
+        load_queue.dispatch()
+
+    def _release_held(self, keep=None):
+        """Release the pins of this session, except one on ``keep``."""
+        with self._held_lock:
+            released, self._held_keys = self._held_keys, []
+            if keep in released:
+                released.remove(keep)
+                self._held_keys.append(keep)
+        for key in released:
+            analyzer_cache.release(*key)
+        if released:
+            load_queue.dispatch()
+
+    def _on_session_destroyed(self, session_context):
+        """Release the analyzer, its recording and the GUI controller of a closed session."""
+        # pending loads and callbacks of this session are discarded
+        self._load_generation += 1
+        self._cancel_load()
+        self._log_handler.stop()
+        with self._held_lock:
+            self._destroyed = True
+        self.analyzer = None
+        self.win = None
+        self.layout.clear()
+        self._release_held()
+        # analyzers and GUI controllers hold reference cycles around large arrays
+        gc.collect()
+        logger.info(f"Session closed, released {self.analyzer_path}")
+
+    def _initialize_analyzer(self, analyzer_path, recording_path):
+        if not analyzer_path.endswith((".zarr", ".zarr/")):
             raise ValueError("Only Zarr files are supported for now.")
-        print(f"Loading analyzer from {self.analyzer_path}...")
-        self.analyzer = si.load(self.analyzer_path, load_extensions=False)
-        print(f"Analyzer loaded: {self.analyzer}")
-
-    def _set_processed_recording(self):
-        print(f"Loading processed recording from {self.recording_path}")
-        analyzer_root = self.analyzer._get_zarr_root(mode="r")
-        recording_root = analyzer_root["recording"]
-        recording_dict = recording_root[0]
-        # Remap path and set relative to to false
-        recording_dict["relative_paths"] = False
-        # update_key(recording_dict, "relative_paths", False)
-        path_list_iter = extractor_dict_iterator(recording_dict)
-        for path_iter in path_list_iter:
-            if "folder_path" in path_iter.name:
-                access_path = path_iter.access_path
-                break
-        set_value_in_extractor_dict(recording_dict, access_path, self.recording_path)
-        recording_processed = si.load(recording_dict)
-        print(f"Processed recording loaded: {recording_processed}")
-        self.analyzer.set_temporary_recording(recording_processed)
+        loaded = []
 
-    def _check_if_s3_folder_exists(self, location):
-        bucket_name = location.split("/")[2]
-        prefix = "/".join(location.split("/")[3:])
+        def loader():
+            loaded.append(True)
+            return self._load_analyzer(analyzer_path, recording_path)
+
+        analyzer = analyzer_cache.get_or_load(analyzer_path, recording_path, loader=loader, pin=True)
+        # cache hits were prefetched by the session that loaded them, unless the portal warm-up
+        # opened them with only some extensions
+        if loaded or analyzer not in _prefetched_analyzers:
+            self._prefetch_extensions(analyzer_path, analyzer, update_summary=bool(loaded))
+        return analyzer
+
+    def _load_analyzer(self, analyzer_path, recording_path):
+        """Load the analyzer and attach the processed recording. Called once per cache key."""
+        return load_analyzer(analyzer_path, recording_path)
+
+    def _prefetch_extensions(self, analyzer_path, analyzer, update_summary=True):
+        """Load the extensions missing from the analyzer and optionally keep its unit summary up to date."""
         try:
-            s3 = boto3.client("s3")
-            response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)
-            return "Contents" in response
+            # extensions are otherwise loaded one by one while the GUI is built
+            with timed("analyzer.prefetch_extensions"):
+                loaded = prefetch_extensions(analyzer)
+            _prefetched_analyzers.add(analyzer)
+            if len(loaded) > 0:
+                total_bytes = sum(stats["bytes"] for stats in loaded.values())
+                logger.info(f"Prefetched {len(loaded)} extensions ({total_bytes / 1024**2:.1f} MB)")
+                # the analyzer grew, other unused analyzers may now be over the cache budget
+                analyzer_cache.evict()
+            if update_summary:
+                with timed("analyzer.update_unit_summary"):
+                    update_cached_unit_summary(analyzer_path, analyzer)
         except Exception as e:
+            logger.warning(f"Could not prefetch extensions: {e}")
+
+    def _check_if_s3_folder_exists(self, location):
+        try:
+            return prefix_exists(*split_s3_url(location))
+        except Exception:
             return False
 
-    def _create_main_window(self):
-        if self.analyzer is not None:
-            # prepare the curation data using decoder labels
-            curation_dict = deepcopy(default_curation_dict)
-            curation_dict["unit_ids"] = self.analyzer.unit_ids
-            if "decoder_label" in self.analyzer.sorting.get_property_keys():
-                decoder_labels = self.analyzer.get_sorting_property("decoder_label")
-                noise_units = self.analyzer.unit_ids[decoder_labels == "noise"]
-                curation_dict["removed_units"] = list(noise_units)
-                for unit_id in noise_units:
-                    curation_dict["manual_labels"].append({"unit_id": unit_id, "quality": ["noise"]})
-
-            win = run_mainwindow(
-                analyzer=self.analyzer,
-                curation=True,
-                skip_extensions=["waveforms"],
-                displayed_unit_properties=displayed_unit_properties,
-                curation_dict=curation_dict,
-                backend="panel",
-                start_app=False,
-                make_servable=False,
-                verbose=True,
-            )
-            return win.main_layout
-        else:
-            return pn.pane.Markdown("Analyzer not initialized")
+    def _create_main_window(self, analyzer):
+        """Build the spikeinterface-gui window of an analyzer."""
+        from spikeinterface_gui import run_mainwindow
+
+        # prepare the curation data using decoder labels
+        # the analyzer is shared across sessions, so curation state must be a private copy
+        curation_dict = deepcopy(default_curation_dict)
+        curation_dict["unit_ids"] = analyzer.unit_ids.copy()
+        if "decoder_label" in analyzer.sorting.get_property_keys():
+            decoder_labels = analyzer.get_sorting_property("decoder_label")
+            noise_units = analyzer.unit_ids[decoder_labels == "noise"]
+            curation_dict["removed_units"] = list(noise_units)
+            for unit_id in noise_units:
+                curation_dict["manual_labels"].append({"unit_id": unit_id, "quality": ["noise"]})
+
+        return run_mainwindow(
+            analyzer=analyzer,
+            curation=True,
+            skip_extensions=["waveforms"],
+            displayed_unit_properties=displayed_unit_properties,
+            curation_dict=curation_dict,
+            backend="panel",
+            start_app=False,
+            make_servable=False,
+            verbose=True,
+        )
 
     def update_values(self, event):
         self.analyzer_path = self.analyzer_input.value
@@ -164,7 +496,7 @@ class EphysGuiView(param.Parameterized):
         self._initialize()
 
     def on_click(self, event):
-        print("Launching SpikeInterface GUI!")
+        logger.info("Launching SpikeInterface GUI!")
         self._initialize()
 
     def panel(self):
@@ -1,17 +1,179 @@
 """Main Panel application for the AIND SIGUI Portal."""
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import param
 import panel as pn
 import pandas as pd
-import boto3
-from botocore import UNSIGNED
-from botocore.config import Config
 
+from aind_ephys_portal.cache.cached import cached
+from aind_ephys_portal.metrics.registry import timed
+from aind_ephys_portal.docdb.database import get_raw_assets_by_names, TIMEOUT_1H, TIMEOUT_10M
+from aind_ephys_portal.panel.utils import format_link, track_session, OUTER_STYLE, EPHYSGUI_LINK_PREFIX
+from aind_ephys_portal.catalog.manifest import StreamManifest, ManifestIndexer
+from aind_ephys_portal.catalog.catalog import get_catalog
+from aind_ephys_portal.s3.client import list_common_prefixes, map_concurrent, prefix_exists, prefixes_exist, split_s3_url
+from aind_ephys_portal.analyzer.trace_pyramid import SIDECAR_SUFFIX as TRACE_PYRAMID_SUFFIX
+from aind_ephys_portal.analyzer.warmup import AnalyzerWarmup
+
+logger = logging.getLogger(__name__)
+
+# Candidate folders of the compressed ephys data in raw assets, in order of preference
+RAW_ECEPHYS_LOCATIONS = ["ecephys/ecephys_compressed", "ecephys_compressed"]
+# Pool running page prefetches off the event loop
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="raw-prefetch")
+
+# Delay between the last keystroke and the search, in milliseconds
+SEARCH_DEBOUNCE_MS = 250
+# Number of search results sent to the browser at a time
+RESULTS_PAGE_SIZE = 20
+
+
+@cached(ttl=TIMEOUT_1H)
+@timed("s3.list_postprocessed_streams")
+def _list_postprocessed_streams(location):
+    """List the postprocessed stream folders of an asset location.
+
+    Only the immediate children of ``<location>/postprocessed/`` are listed, using S3
+    common prefixes, so a single LIST request is needed regardless of how many zarr
+    chunks the streams contain.
+
+    Parameters
+    ----------
+    location : str
+        S3 location of the derived asset (s3://bucket/prefix).
+
+    Returns
+    -------
+    list[str]
+        Names of the postprocessed stream folders.
+    """
+    bucket_name, asset_prefix = split_s3_url(location)
+    prefix = asset_prefix.rstrip("/") + "/postprocessed/"
+
+    logger.info(f"Looking for postprocessed streams in {bucket_name}/{prefix}")
+    stream_names = [
+        common_prefix[len(prefix) :].rstrip("/") for common_prefix in list_common_prefixes(bucket_name, prefix)
+    ]
+    # trace pyramids are stored next to the analyzers
+    return [stream_name for stream_name in stream_names if not stream_name.endswith(TRACE_PYRAMID_SUFFIX)]
+
+
+def _raw_ecephys_candidates(asset_location):
+    """Bucket and candidate prefixes of the compressed ephys folder of a raw asset."""
+    bucket_name, session_name = split_s3_url(asset_location)
+    return bucket_name, [f"{session_name}/{location}/" for location in RAW_ECEPHYS_LOCATIONS]
+
+
+def _first_existing(bucket_name, prefixes, exists):
+    for prefix, prefix_exists in zip(prefixes, exists):
+        if prefix_exists:
+            return f"s3://{bucket_name}/{prefix}".rstrip("/")
+    return None
+
+
+def _try_prefix_exists(location):
+    """``prefix_exists`` of a ``(bucket, prefix)`` location, or None if the request failed."""
+    try:
+        return prefix_exists(*location)
+    except Exception as e:
+        logger.warning(f"Could not check s3://{location[0]}/{location[1]}: {e}")
+        return None
+
+
+# Raw data can be uploaded after the derived asset, so "not found" is only cached briefly
+@cached(ttl=TIMEOUT_1H, negative_ttl=TIMEOUT_10M)
+@timed("s3.get_raw_asset_location")
+def get_raw_asset_location(asset_location):
+    """Find the compressed ephys folder of a raw asset.
+
+    All candidate prefixes are probed concurrently and the first existing one, in order of
+    preference, is returned. Locations are cached for an hour and confirmed absences for ten
+    minutes; failed probes raise and are not cached.
+
+    Parameters
+    ----------
+    asset_location : str
+        S3 location of the raw asset.
+
+    Returns
+    -------
+    str or None
+        S3 location of the ``ecephys_compressed`` folder, or None if not found.
+    """
+    bucket_name, prefixes = _raw_ecephys_candidates(asset_location)
+    exists = prefixes_exist([(bucket_name, prefix) for prefix in prefixes])
+    return _first_existing(bucket_name, prefixes, exists)
+
+
+def resolve_asset_streams(record):
+    """Discover the postprocessed streams and raw recording location of a derived asset.
+
+    The raw asset and its location are read from the caches filled by ``prefetch_raw_asset_locations``
+    when the record was prefetched, and queried for this record alone otherwise.
+
+    Parameters
+    ----------
+    record : dict
+        DocDB record of the derived asset.
+
+    Returns
+    -------
+    tuple[list[str], str or None]
+        Postprocessed stream names and the raw ``ecephys_compressed`` location, if any.
+    """
+    stream_names = _list_postprocessed_streams(record.get("location", ""))
+    name = record.get("name", "")
+    raw_asset = get_raw_assets_by_names([name])[name]
+    if raw_asset is not None:
+        raw_asset_prefix = get_raw_asset_location(raw_asset["location"])
+    else:
+        raw_asset_prefix = None
+    return stream_names, raw_asset_prefix
+
+
+@timed("s3.prefetch_raw_asset_locations")
+def prefetch_raw_asset_locations(records):
+    """Resolve the raw recording locations of many derived assets ahead of a click.
+
+    The raw assets are looked up with a single batched DocDB query, then the candidate
+    folders of all uncached locations are probed in one concurrent batch. Both results
+    are cached for ``resolve_asset_streams``, except for locations whose probes failed.
+    """
+    names = [record["name"] for record in records if not stream_manifest.contains(record["_id"])]
+    if len(names) == 0:
+        return
+    raw_assets = get_raw_assets_by_names(names)
+    locations = sorted({raw_asset["location"] for raw_asset in raw_assets.values() if raw_asset is not None})
+    keys = {location: get_raw_asset_location.key(location) for location in locations}
+    cached_locations = get_raw_asset_location.get_many(keys.values())
+    candidates = {
+        location: _raw_ecephys_candidates(location) for location in locations if keys[location] not in cached_locations
+    }
+    exists = iter(
+        map_concurrent(
+            _try_prefix_exists,
+            [(bucket_name, prefix) for bucket_name, prefixes in candidates.values() for prefix in prefixes],
+        )
+    )
+    for location, (bucket_name, prefixes) in candidates.items():
+        location_exists = [next(exists) for _ in prefixes]
+        if None in location_exists:
+            # left to get_raw_asset_location at click time
+            continue
+        get_raw_asset_location.put(keys[location], _first_existing(bucket_name, prefixes, location_exists))
 
-from aind_ephys_portal.docdb.database import get_raw_asset_by_name, get_all_ecephys_derived
-from aind_ephys_portal.panel.utils import format_link, OUTER_STYLE, EPHYSGUI_LINK_PREFIX
 
-s3_client = boto3.client("s3")
+# Process-wide stream manifest, filled in the background and shared by all sessions
+stream_manifest = StreamManifest()
+manifest_indexer = ManifestIndexer(
+    stream_manifest,
+    get_records=lambda: get_catalog().all_records,
+    resolve=resolve_asset_streams,
+    prefetch=prefetch_raw_asset_locations,
+)
 
 
 class EphysPortal:
@@ -22,16 +184,21 @@ class EphysPortal:
     It allows users to search for assets, view their details, and access the postprocessed streams, and
     renders a link to the Ephys GUI for each stream.
 
-    The search options auto-updates every 30 minutes to sync with new data in the database.
+    The search options are backed by a catalog shared by all sessions, which is refreshed in
+    the background with the records created or modified in the database since the last sync.
     """
 
     def __init__(self):
         """Initialize the SIGUI Portal application."""
         self.search_options = SearchOptions()
+        self._doc = pn.state.curdoc
+        track_session("ephys_portal")
+        # Open the analyzers of the selected asset in the background, ahead of a click
+        self.warmup = AnalyzerWarmup()
         # Get the search input widget
         self.search_bar = pn.widgets.TextInput(
             name="Search",
-            placeholder="Enter search terms...",
+            placeholder="Search names, subject ids, dates, e.g. 713655 2024-05 or subject:713655",
             sizing_mode="stretch_width",
         )
 
@@ -40,8 +207,11 @@ class EphysPortal:
             font-size: 10px;
         }
         """
+        # Remote pagination: only the visible page is sent to the browser, sorting is done server-side
         self.results_panel = pn.widgets.Tabulator(
             pd.DataFrame(columns=["name", "subject_id", "date", "id"]),  # Empty DataFrame initially
+            pagination="remote",
+            page_size=RESULTS_PAGE_SIZE,
             height=400,
             selectable=True,
             disabled=True,
@@ -63,22 +233,44 @@ class EphysPortal:
             styles={"background-color": "#f5f5f5", "padding": "20px", "border-radius": "5px"},
         )
 
-        # Update the results panel when the search input changes
-        self.search_bar.param.watch(self.update_results, "value")
+        # Update the results panel while typing, once the input settles
+        self._search_timeout = None
+        self.search_bar.param.watch(self.on_search_input, "value_input")
 
         # Update the streams panel when a row is selected
         self.results_panel.on_click(self.update_streams)
+        # Resolve raw recordings of the visible page ahead of clicks
+        self.results_panel.param.watch(self.prefetch_page, "page")
 
-        # Start the auto-update process
-        # TODO: debug
-        # self.auto_update_datasets()
+        # Follow background refreshes of the shared catalog
+        self.search_options.catalog.subscribe(self.on_catalog_update)
+        if self._doc is not None and self._doc.session_context is not None:
+            pn.state.on_session_destroyed(self.on_session_destroyed)
+
+        # Index the streams of all assets in the background (no-op if already running)
+        manifest_indexer.start()
 
         # Initialize with current results
         self.update_results(None)
 
+    def on_search_input(self, event):
+        """Debounce search input: only search once no key was pressed for SEARCH_DEBOUNCE_MS."""
+        if self._doc is None:
+            self.update_results(event)
+            return
+        if self._search_timeout is not None:
+            try:
+                self._doc.remove_timeout_callback(self._search_timeout)
+            except ValueError:
+                # already fired
+                pass
+        self._search_timeout = self._doc.add_timeout_callback(
+            partial(self.update_results, event), SEARCH_DEBOUNCE_MS
+        )
+
     def update_results(self, event):
         """Update the results panel with the current search results."""
-        print("Updating search results...")
+        logger.debug("Updating search results...")
         if event is None:
             df = self.search_options.df
         else:
@@ -87,86 +279,116 @@ class EphysPortal:
         self.results_panel.value = df
         # Clear the streams panel when results are updated
         self.streams_panel.value = pd.DataFrame(columns=["Stream name", "Ephys GUI View"])
-
+        self.warmup.cancel()
+        self.prefetch_page()
+
+    def prefetch_page(self, event=None):
+        """Resolve the raw recording locations of the visible results page in the background."""
+        page_size = self.results_panel.page_size or RESULTS_PAGE_SIZE
+        start = (self.results_panel.page - 1) * page_size
+        page_ids = self.results_panel.current_view.index[start : start + page_size]
+        records = [record for record in map(self.search_options.get_record, page_ids) if record is not None]
+        if len(records) > 0:
+            _prefetch_executor.submit(prefetch_raw_asset_locations, records)
+
+    @timed("portal.update_streams")
     def update_streams(self, event):
         """Update the streams panel with the postprocessed streams for the selected entry."""
         if event.row is None:
             return
 
-        # Get the selected row data
-        selected_row = self.results_panel.value.iloc[event.row]
-        selected_name = selected_row["name"]
-
-        # Find the corresponding record in the original data
-        for record in self.search_options.all_records:
-            if record.get("name") == selected_name:
-                asset_name = record.get("name", "")
-                location = record.get("location", "")
-
-                loading_text = f"Loading postprocessed streams..."
-                streams_df = pd.DataFrame({"Stream name": [loading_text], "Ephys GUI View": [""]})
-                self.streams_panel.value = streams_df
-
-                # Get the postprocessed streams for this location
-                stream_names = self.search_options.get_postprocessed_streams(location)
-                print(f"Found {len(stream_names)} postprocessed streams from {location}")
-                analyzer_base_location = record["location"]
-                raw_asset = get_raw_asset_by_name(asset_name)[0]
-                links_url = []
-                for stream_name in stream_names:
-                    raw_stream_name = stream_name[: stream_name.find("_recording")]
-                    raw_asset_prefix = self.get_raw_asset_location(raw_asset["location"])
-                    print(f"Raw asset prefix: {raw_asset_prefix}")
-                    if raw_asset_prefix is None:
-                        recording_path=""
-                    else:
-                        recording_path = f"{raw_asset_prefix}/{raw_stream_name}.zarr"
-                    analyzer_path = f"{analyzer_base_location}/postprocessed/{stream_name}"
-                    print("Raw path:", recording_path)
-                    print("Analyzer path:", analyzer_path)
-                    link_url = EPHYSGUI_LINK_PREFIX.format(analyzer_path, recording_path).replace("#", "%23")
-                    links_url.append(link_url)
-                links = [format_link(link) for link in links_url]
-
-                # Update the streams panel
-                streams_df = pd.DataFrame({"Stream name": stream_names, "Ephys GUI View": links})
-                self.streams_panel.value = streams_df
-                return
-
-        # If no matching record is found, clear the streams panel
-        no_streams_text = f"No postprocessed streams..."
-        streams_df = pd.DataFrame({"Stream name": [no_streams_text], "Ephys GUI View": [""]})
+        # The results are indexed by asset id, which is stable across sorting and paging
+        selected_id = self.results_panel.value.index[event.row]
+
+        # Find the corresponding record in the catalog
+        record = self.search_options.get_record(selected_id)
+        if record is None:
+            # If no matching record is found, clear the streams panel
+            no_streams_text = f"No postprocessed streams..."
+            streams_df = pd.DataFrame({"Stream name": [no_streams_text], "Ephys GUI View": [""]})
+            self.streams_panel.value = streams_df
+            self.warmup.cancel()
+            return
+
+        loading_text = f"Loading postprocessed streams..."
+        streams_df = pd.DataFrame({"Stream name": [loading_text], "Ephys GUI View": [""]})
+        self.streams_panel.value = streams_df
+
+        # Get the postprocessed streams for this location
+        try:
+            stream_names, raw_asset_prefix = self.get_asset_streams(record)
+        except Exception as e:
+            logger.warning(f"Could not list the postprocessed streams of {record.get('name')}: {e}")
+            error_text = f"Error listing postprocessed streams: {e}"
+            self.streams_panel.value = pd.DataFrame({"Stream name": [error_text], "Ephys GUI View": [""]})
+            self.warmup.cancel()
+            return
+        logger.info(f"Found {len(stream_names)} postprocessed streams from {record['location']}")
+        logger.info(f"Raw asset prefix: {raw_asset_prefix}")
+        analyzer_base_location = record["location"]
+        links_url = []
+        warmup_targets = []
+        for stream_name in stream_names:
+            raw_stream_name = stream_name[: stream_name.find("_recording")]
+            if raw_asset_prefix is None:
+                recording_path=""
+            else:
+                recording_path = f"{raw_asset_prefix}/{raw_stream_name}.zarr"
+            analyzer_path = f"{analyzer_base_location}/postprocessed/{stream_name}"
+            logger.debug(f"Raw path: {recording_path}")
+            logger.debug(f"Analyzer path: {analyzer_path}")
+            link_url = EPHYSGUI_LINK_PREFIX.format(analyzer_path, recording_path).replace("#", "%23")
+            links_url.append(link_url)
+            warmup_targets.append((analyzer_path, recording_path))
+        links = [format_link(link) for link in links_url]
+
+        # Update the streams panel
+        streams_df = pd.DataFrame({"Stream name": stream_names, "Ephys GUI View": links})
         self.streams_panel.value = streams_df
+        self.warmup.warm(warmup_targets)
+
+    def on_session_destroyed(self, session_context):
+        """Stop following the catalog and cancel the warm-ups of a closed session."""
+        self.search_options.catalog.unsubscribe(self.on_catalog_update)
+        self.warmup.cancel()
+
+    def on_catalog_update(self):
+        """Refresh the search results of this session when the shared catalog changes."""
+        if self._doc is None:
+            self.refresh_results()
+        else:
+            self._doc.add_next_tick_callback(self.refresh_results)
 
-    # def auto_update_datasets(self):
-    #     # Update the search options
-    #     print(f"Updating datasets. Current number of ecephys processed assets: {len(self.search_options.df)}")
-    #     self.search_options.update_options()
-    #     print(f"Updated datasets. New number of ecephys processed assets: {len(self.search_options.df)}")
+    def refresh_results(self):
+        """Re-apply the current search to the catalog, keeping the streams panel."""
+        self.results_panel.value = self.search_options.df_filtered(self.search_bar.value_input)
+        self.prefetch_page()
 
-    #     # Schedule next run in 1 hour (3600 seconds)
-    #     threading.Timer(3600, self.auto_update_datasets).start()
+    def get_asset_streams(self, record):
+        """Get the postprocessed stream names and raw asset location of a derived asset.
+
+        The stream manifest is used when the asset was already indexed; otherwise the streams
+        are discovered live and added to the manifest. If the raw recording cannot be resolved,
+        the streams are shown without it and the manifest is left untouched, so it is retried.
+        Errors listing the streams themselves are raised.
+        """
+        entry = stream_manifest.get(record.get("_id", ""))
+        if entry is not None:
+            return entry["stream_names"], entry["raw_asset_location"]
+        logger.info(f"Asset {record.get('name')} not in stream manifest, discovering streams")
+        try:
+            stream_names, raw_asset_prefix = resolve_asset_streams(record)
+        except Exception as e:
+            logger.warning(f"Could not resolve the raw recording of {record.get('name')}: {e}")
+            return _list_postprocessed_streams(record.get("location", "")), None
+        if record.get("_id"):
+            stream_manifest.put(
+                record["_id"], record.get("name", ""), record.get("location", ""), stream_names, raw_asset_prefix
+            )
+        return stream_names, raw_asset_prefix
 
     def get_raw_asset_location(self, asset_location):
-        asset_without_s3 = asset_location[asset_location.find("s3://") + 5:]
-        asset_split = asset_without_s3.split("/")
-        bucket_name = asset_split[0]
-        session_name = "/".join(asset_split[1:])
-        possible_locations = ["ecephys/ecephys_compressed", "ecephys_compressed"]
-        raw_asset_location = None
-        for location in possible_locations:
-            prefix = f"{session_name}/{location}/"
-            try:
-                response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)
-            except Exception as e:
-                print(f"Error listing objects with unsigned client from {bucket_name}/{prefix}: {e}")
-                continue
-            if "Contents" in response:
-                raw_asset_location = f"s3://{bucket_name}/{prefix}"
-                break
-        if raw_asset_location is not None and raw_asset_location.endswith("/"):
-            raw_asset_location = raw_asset_location[:-1]
-        return raw_asset_location
+        return get_raw_asset_location(asset_location)
 
     def panel(self):
         """Build a Panel object representing the Ephys Portal."""
@@ -191,77 +413,58 @@ class EphysPortal:
 
 
 class SearchOptions(param.Parameterized):
-    """Search options for the Ephys Portal."""
+    """Search options for the Ephys Portal.
+
+    The options are a view on the process-wide catalog, which is shared by all sessions.
+    """
 
     def __init__(self):
         """Initialize a search options object."""
         super().__init__()
 
-        self.update_options()
+        self.catalog = get_catalog()
 
-        # Sort by date if available
-        if not self.df.empty and "date" in self.df.columns:
-            self.df = self.df.sort_values(by="date", ascending=False)
+    @property
+    def df(self):
+        """DataFrame with one row per ecephys derived asset, sorted by date."""
+        return self.catalog.df
 
-    def update_options(self):
-        # Get initial data
-        data = []
-        try:
-            # Get initial data from database
-            self.all_records = get_all_ecephys_derived()
-            print(f"Loaded {len(self.all_records)} records.")
-            # Process records into a list of dictionaries
-            for record in self.all_records:
-                r = {
-                    "name": record.get("name", ""),
-                    "date": record.get("created", ""),
-                    "id": record.get("_id", ""),
-                    "location": record.get("location", ""),
-                }
-                subject = record.get("subject", {})
-                if subject:
-                    r["subject_id"] = subject.get("subject_id", "")
-                else:
-                    r["subject_id"] = record.get("subject_id", "")
-                data.append(r)
-        except Exception as e:
-            print(f"Error loading initial data: {e}.")
+    @property
+    def all_records(self):
+        """DocDB records of all ecephys derived assets."""
+        return self.catalog.all_records
 
-        # Create DataFrame
-        self.df = pd.DataFrame(data, columns=["name", "subject_id", "date", "id"])
+    def get_record(self, asset_id):
+        """Get the record of an asset by id, or None if it is not in the catalog."""
+        return self.catalog.get_record(asset_id)
+
+    def get_record_by_name(self, name):
+        """Get the record of an asset by name, or None if it is not in the catalog."""
+        return self.catalog.get_record_by_name(name)
+
+    def update_options(self):
+        """Merge new and modified records from the database into the catalog."""
+        self.catalog.refresh()
 
     def get_postprocessed_streams(self, location):
         """Get the postprocessed folders for a given location."""
-        # Get the bucket name and prefix
-        bucket_name = location.split("/")[2]
-        prefix = "/".join(location.split("/")[3:])
-
-        paginator = s3_client.get_paginator("list_objects_v2")
-        pages = paginator.paginate(Prefix=prefix, Bucket=bucket_name)
-        posptrocessed_streams = []
-        print(f"Looking for postprocessed streams in {bucket_name}/{prefix}")
-        for page in pages:
-            for item in page.get("Contents", []):
-                key = item["Key"]
-                if "postprocessed" in key and "postprocessed-sorting" not in key:
-                    stream_name = key[key.find("postprocessed") :].split("/")[1]
-                    if stream_name not in posptrocessed_streams:
-                        posptrocessed_streams.append(stream_name)
-        return posptrocessed_streams
+        return _list_postprocessed_streams(location)
 
+    @timed("portal.search")
     def df_filtered(self, text_filter=None):
-        """Filter the options dataframe."""
+        """Filter the options dataframe.
+
+        The filter is a search query over name, subject id, date and id, e.g.
+        ``713655 2024-05`` or ``subject:713655``.
+        """
         if text_filter is None or text_filter == "":
             return self.df
-        print(f"Filtering records for: {text_filter}")
+        logger.info(f"Filtering records for: {text_filter}")
 
         # Search for records matching the text filter
         try:
-            # Make sure we're returning a DataFrame, not a Series
-            mask = self.df["name"].str.contains(text_filter, case=False)
-            df_filtered = self.df[mask]
-            return df_filtered
+            return self.catalog.search(text_filter)
         except Exception as e:
-            print(f"Error searching records: {e}")
+            logger.warning(f"Error searching records: {e}")
             # Return a sample search result to show the interface works
             return pd.DataFrame(columns=self.df.columns)
@@ -1,5 +1,12 @@
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 import panel as pn
-import io
+
+from aind_ephys_portal.metrics.registry import registry
 
 EPHYSGUI_LINK_PREFIX = "/ephys_gui_app?analyzer_path={}&recording_path={}"
 
@@ -55,15 +62,143 @@ def format_css_background():
     pn.config.raw_css.append(BACKGROUND_CSS)  # type: ignore
 
 
-class Tee(io.StringIO):
-    def __init__(self, original_stdout, log_output):
-        super().__init__()
-        self.original_stdout = original_stdout
+ACTIVE_SESSIONS = registry.gauge("aind_ephys_portal_active_sessions", "Number of open sessions", ["app"])
+
+
+def track_session(app: str):
+    """Count the current server session in ACTIVE_SESSIONS until it is destroyed.
+
+    Parameters
+    ----------
+    app : str
+        Name of the application, used as label.
+    """
+    doc = pn.state.curdoc
+    if doc is None or doc.session_context is None:
+        return
+    ACTIVE_SESSIONS.inc(app=app)
+    pn.state.on_session_destroyed(lambda session_context: ACTIVE_SESSIONS.dec(app=app))
+
+
+# The log handler of the session on whose behalf the current code runs
+_current_session_log = ContextVar("current_session_log", default=None)
+
+
+# Loggers whose records are shown in the session log panels
+SESSION_LOGGERS = ["aind_ephys_portal", "spikeinterface", "spikeinterface_gui"]
+
+
+class SessionLogHandler(logging.Handler):
+    """Stream the log records of the package and of the GUI libraries to a per-session log panel.
+
+    Lines are kept in a bounded ring buffer and the new ones are appended to the panel by a
+    periodic callback, so the browser receives at most one update per ``period`` milliseconds,
+    holding only the lines logged since the previous one. Without a periodic callback, updates
+    are scheduled on the session's event loop, never made from the logging thread. Only records
+    emitted inside ``capture()`` by this session are accepted; the process-wide standard
+    streams are left alone, so text printed rather than logged is not shown.
+
+    Parameters
+    ----------
+    log_output : pn.Column
+        Layout the log lines are appended to.
+    max_lines : int, optional
+        Size of the ring buffer and number of lines shown, by default 1000
+    period : int, optional
+        Minimum interval between panel updates in milliseconds, by default 250
+    """
+
+    def __init__(self, log_output, max_lines: int = 1000, period: int = 250):
+        super().__init__(level=logging.INFO)
         self.log_output = log_output
+        self.period = period
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self.setFormatter(logging.Formatter("%(message)s"))
+        self.addFilter(lambda record: _current_session_log.get() is self)
+        self._pending = []
+        # number of lines of each block appended to log_output
+        self._shown = deque()
+        self._buffer_lock = threading.Lock()
+        self._callback = None
+        self._doc = None
+        self._push_scheduled = False
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._add_lines(message.split("\n"))
+
+    def _add_lines(self, lines):
+        if len(lines) == 0:
+            return
+        with self._buffer_lock:
+            self.lines.extend(lines)
+            self._pending.extend(lines)
+            del self._pending[: -self.max_lines]
+            if self._callback is not None or self._push_scheduled:
+                return
+            self._push_scheduled = self._doc is not None
+        if self._doc is None:
+            # outside of a server session there is no event loop to update the panel on
+            self.push()
+        else:
+            self._doc.add_next_tick_callback(self._scheduled_push)
+
+    def _scheduled_push(self):
+        with self._buffer_lock:
+            self._push_scheduled = False
+        self.push()
+
+    def push(self):
+        """Append the lines logged since the last push to the panel. Runs on the event loop."""
+        with self._buffer_lock:
+            if len(self._pending) == 0 or self.log_output is None:
+                return
+            lines, self._pending = self._pending, []
+        self.log_output.append(pn.pane.Str("\n".join(lines), margin=(0, 5)))
+        self._shown.append(len(lines))
+        # drop the oldest blocks beyond max_lines
+        n_shown = sum(self._shown)
+        n_dropped = 0
+        while len(self._shown) > 1 and n_shown - self._shown[0] >= self.max_lines:
+            n_shown -= self._shown.popleft()
+            n_dropped += 1
+        if n_dropped > 0:
+            self.log_output.objects = self.log_output.objects[n_dropped:]
+
+    @contextmanager
+    def capture(self):
+        """Route log records emitted in this context (thread or task) to this handler."""
+        token = _current_session_log.set(self)
+        try:
+            yield self
+        finally:
+            _current_session_log.reset(token)
 
-    def write(self, message):
-        self.original_stdout.write(message)  # Print to console
-        self.log_output.value += message  # Append to log output
+    def start(self, log_output=None):
+        """Attach to the SESSION_LOGGERS and start pushing updates to the panel. Runs on the event loop."""
+        if log_output is not None:
+            self.log_output = log_output
+        doc = pn.state.curdoc
+        with self._buffer_lock:
+            self.lines.clear()
+            self._pending = []
+            self._shown.clear()
+            self._doc = doc if doc is not None and doc.session_context is not None else None
+        for name in SESSION_LOGGERS:
+            logging.getLogger(name).addHandler(self)
+        if self._callback is None and self._doc is not None:
+            self._callback = pn.state.add_periodic_callback(self.push, period=self.period)
 
-    def flush(self):
-        self.original_stdout.flush()
+    def stop(self):
+        """Flush pending lines and detach from the SESSION_LOGGERS. Runs on the event loop."""
+        self.push()
+        for name in SESSION_LOGGERS:
+            logging.getLogger(name).removeHandler(self)
+        if self._callback is not None:
+            self._callback.stop()
+            self._callback = None
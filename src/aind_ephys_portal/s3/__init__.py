@@ -0,0 +1 @@
+"""Shared S3 access for the AIND SIGUI Portal."""
@@ -0,0 +1,151 @@
+"""Process-wide S3 client and concurrent listing helpers.
+
+All S3 metadata requests of the portal and the GUI (LIST, existence checks, small sidecar
+objects) go through the client returned by ``get_s3_client``. It is created once, on first use, with a connection pool
+sized for the bulk helpers, adaptive retries and explicit timeouts. boto3 clients are
+thread-safe, so the same client is used from every session and worker thread.
+
+Bulk helpers (``prefixes_exist``, ``list_common_prefixes_many``) run their requests
+concurrently on a bounded thread pool. Zarr data itself is read through s3fs, see
+``aind_ephys_portal.analyzer.chunk_cache``.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
+
+from aind_ephys_portal.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Client configuration
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 64))
+S3_MAX_ATTEMPTS = int(os.environ.get("S3_MAX_ATTEMPTS", 5))
+S3_CONNECT_TIMEOUT = float(os.environ.get("S3_CONNECT_TIMEOUT", 5))
+S3_READ_TIMEOUT = float(os.environ.get("S3_READ_TIMEOUT", 30))
+# Number of requests run concurrently by the bulk helpers
+S3_CONCURRENCY = int(os.environ.get("S3_CONCURRENCY", 32))
+
+S3_REQUESTS = registry.counter("aind_ephys_portal_s3_requests_total", "S3 requests by operation", ["operation"])
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_pool_thread = threading.local()
+
+
+def get_s3_client():
+    """Return the process-wide S3 client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+                from botocore.config import Config
+
+                config = Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "adaptive"},
+                    connect_timeout=S3_CONNECT_TIMEOUT,
+                    read_timeout=S3_READ_TIMEOUT,
+                    tcp_keepalive=True,
+                )
+                _client = boto3.session.Session().client("s3", config=config)
+    return _client
+
+
+def split_s3_url(url: str) -> Tuple[str, str]:
+    """Split ``s3://bucket/prefix`` into ``(bucket, prefix)``."""
+    path = url[url.find("s3://") + 5 :] if "s3://" in url else url
+    bucket, _, prefix = path.partition("/")
+    return bucket, prefix
+
+
+def prefix_exists(bucket: str, prefix: str) -> bool:
+    """Whether at least one object exists under a prefix.
+
+    Errors are raised rather than reported as False, so a failed request is never mistaken
+    (and cached) as an absent prefix.
+    """
+    S3_REQUESTS.inc(operation="list_objects_v2")
+    response = get_s3_client().list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1)
+    return "Contents" in response
+
+
+def get_object(bucket: str, key: str) -> Optional[bytes]:
+    """Read a small object. Returns None if it does not exist; other errors are logged and reported as None."""
+    S3_REQUESTS.inc(operation="get_object")
+    client = get_s3_client()
+    try:
+        return client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except client.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        logger.warning(f"Error reading {bucket}/{key}: {e}")
+        return None
+
+
+def put_object(bucket: str, key: str, body: bytes):
+    """Write a small object."""
+    S3_REQUESTS.inc(operation="put_object")
+    get_s3_client().put_object(Bucket=bucket, Key=key, Body=body)
+
+
+def list_common_prefixes(bucket: str, prefix: str, delimiter: str = "/") -> List[str]:
+    """List the immediate "sub-folders" of a prefix.
+
+    Only common prefixes are returned, so the number of requests does not depend on the number
+    of objects below them.
+
+    Returns
+    -------
+    list[str]
+        Full prefixes of the sub-folders, ending with ``delimiter``.
+    """
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    common_prefixes = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter=delimiter):
+        S3_REQUESTS.inc(operation="list_objects_v2")
+        common_prefixes.extend(common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", []))
+    return common_prefixes
+
+
+def _mark_pool_thread():
+    _pool_thread.active = True
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=S3_CONCURRENCY, thread_name_prefix="s3", initializer=_mark_pool_thread
+            )
+    return _executor
+
+
+def map_concurrent(func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+    """Apply ``func`` to all items on the shared S3 pool, keeping the order of the items.
+
+    Calls made from a thread of the pool run inline, so nested bulk calls cannot deadlock it.
+    """
+    items = list(items)
+    if len(items) <= 1 or getattr(_pool_thread, "active", False):
+        return [func(item) for item in items]
+    return list(_get_executor().map(func, items))
+
+
+def prefixes_exist(locations: Iterable[Tuple[str, str]]) -> List[bool]:
+    """Check many ``(bucket, prefix)`` locations concurrently. See ``prefix_exists``."""
+    return map_concurrent(lambda location: prefix_exists(*location), locations)
+
+
+def list_common_prefixes_many(locations: Iterable[Tuple[str, str]]) -> List[List[str]]:
+    """List the sub-folders of many ``(bucket, prefix)`` locations concurrently. See ``list_common_prefixes``."""
+    return map_concurrent(lambda location: list_common_prefixes(*location), locations)
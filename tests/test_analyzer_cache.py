@@ -0,0 +1,106 @@
+"""LRU eviction, pins and single-flight loads of the analyzer cache."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aind_ephys_portal.analyzer.cache import AnalyzerCache
+
+
+class FakeAnalyzer:
+    def __init__(self, nbytes=0):
+        self.nbytes = nbytes
+
+
+def make_cache(**kwargs):
+    return AnalyzerCache(sizeof=lambda analyzer: analyzer.nbytes, **kwargs)
+
+
+def load(cache, path, nbytes=0, pin=False):
+    return cache.get_or_load(path, "", loader=lambda: FakeAnalyzer(nbytes), pin=pin)
+
+
+def test_hits_return_the_cached_analyzer():
+    cache = make_cache(max_bytes=100, max_entries=4)
+    analyzer = load(cache, "s3://bucket/a.zarr/")
+    assert load(cache, "s3://bucket/a.zarr") is analyzer
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = make_cache(max_bytes=100, max_entries=2)
+    load(cache, "a")
+    load(cache, "b")
+    load(cache, "a")
+    load(cache, "c")
+    assert cache.make_key("a") in cache
+    assert cache.make_key("b") not in cache
+    assert len(cache) == 2
+
+
+def test_memory_budget():
+    cache = make_cache(max_bytes=100, max_entries=10)
+    load(cache, "a", nbytes=60)
+    load(cache, "b", nbytes=60)
+    assert cache.make_key("a") not in cache
+    # the newest entry is kept even if it alone exceeds the budget
+    load(cache, "c", nbytes=200)
+    assert len(cache) == 1 and cache.make_key("c") in cache
+
+
+def test_pinned_entries_are_kept_until_released():
+    cache = make_cache(max_bytes=100, max_entries=1)
+    load(cache, "a", pin=True)
+    load(cache, "a", pin=True)
+    load(cache, "b")
+    assert cache.make_key("a") in cache and cache.pinned == 1
+    cache.release("a")
+    load(cache, "c")
+    assert cache.make_key("a") in cache
+    cache.release("a")
+    assert cache.make_key("a") not in cache
+    assert cache.pinned == 0
+
+
+def test_evict_accounts_for_grown_analyzers():
+    cache = make_cache(max_bytes=100, max_entries=10)
+    a = load(cache, "a", nbytes=10)
+    load(cache, "b", nbytes=10, pin=True)
+    a.nbytes = 200
+    cache.evict()
+    assert cache.make_key("a") not in cache
+    assert cache.make_key("b") in cache
+
+
+def test_concurrent_loads_are_coalesced():
+    cache = make_cache(max_bytes=100, max_entries=4)
+    started = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(None)
+        started.set()
+        time.sleep(0.1)
+        return FakeAnalyzer()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(cache.get_or_load, "a", "", loader)
+        started.wait()
+        others = [executor.submit(cache.get_or_load, "a", "", loader) for _ in range(3)]
+        results = [first.result()] + [future.result() for future in others]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_failed_loads_are_not_cached():
+    cache = make_cache(max_bytes=100, max_entries=4)
+
+    def fail():
+        raise OSError("unreachable")
+
+    with pytest.raises(OSError):
+        cache.get_or_load("a", "", fail)
+    assert cache.in_flight == 0
+    assert isinstance(load(cache, "a"), FakeAnalyzer)
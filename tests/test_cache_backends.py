@@ -0,0 +1,106 @@
+"""Expiration, pruning and leases of the cache backends, and errors of ``cached`` functions."""
+
+import pytest
+
+from aind_ephys_portal.cache import backends
+from aind_ephys_portal.cache.backends import MemoryBackend, SQLiteBackend
+from aind_ephys_portal.cache.cached import CachedFunction
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backends, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=10)
+    return SQLiteBackend(str(tmp_path / "cache.sqlite"), max_entries=10)
+
+
+def test_get_set_delete(backend):
+    assert backend.get("a") == (False, None)
+    backend.set("a", None)
+    backend.set("b", {"x": [1, 2]})
+    assert backend.get("a") == (True, None)
+    assert backend.get_many(["a", "b", "c"]) == {"a": None, "b": {"x": [1, 2]}}
+    backend.delete("a")
+    assert backend.get("a") == (False, None)
+
+
+def test_entries_expire(backend, clock):
+    backend.set("short", 1, ttl=10)
+    backend.set("forever", 2)
+    clock.now += 5
+    assert backend.get("short") == (True, 1)
+    clock.now += 10
+    assert backend.get("short") == (False, None)
+    assert backend.get_many(["short", "forever"]) == {"forever": 2}
+
+
+def test_clear_prefix(backend):
+    backend.set("f:1", 1)
+    backend.set("g:1", 2)
+    backend.clear("f:")
+    assert backend.get_many(["f:1", "g:1"]) == {"g:1": 2}
+
+
+def test_oldest_entries_are_pruned(backend, clock):
+    backend.set("expired", 0, ttl=1)
+    clock.now += 2
+    for i in range(30):
+        backend.set(f"k{i}", i)
+    keys = ["expired"] + [f"k{i}" for i in range(30)]
+    assert backend.get_many(keys) == {f"k{i}": i for i in range(20, 30)}
+
+
+def test_rewritten_entries_are_kept(backend):
+    for i in range(10):
+        backend.set(f"k{i}", i)
+    backend.set("k0", "new")
+    for i in range(10, 19):
+        backend.set(f"k{i}", i)
+    assert backend.get("k0") == (True, "new")
+    assert backend.get("k1") == (False, None)
+
+
+def test_sqlite_leases(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite"))
+    other = SQLiteBackend(str(tmp_path / "cache.sqlite"))
+    assert backend.acquire("k", timeout=10)
+    assert not other.acquire("k", timeout=10)
+    backend.release("k")
+    assert other.acquire("k", timeout=10)
+    # a lease whose holder died expires
+    clock.now += 11
+    assert backend.acquire("k", timeout=10)
+
+
+def test_sqlite_entries_are_shared(tmp_path):
+    SQLiteBackend(str(tmp_path / "cache.sqlite")).set("k", [1, 2])
+    assert SQLiteBackend(str(tmp_path / "cache.sqlite")).get("k") == (True, [1, 2])
+
+
+def test_cached_function_does_not_cache_errors():
+    calls = []
+
+    def fail():
+        calls.append(None)
+        raise OSError("unreachable")
+
+    cached_fail = CachedFunction(fail, name="test.fail", backend=MemoryBackend())
+    for _ in range(2):
+        with pytest.raises(OSError):
+            cached_fail()
+    assert len(calls) == 2
@@ -0,0 +1,39 @@
+"""Negative caching of ``cached`` functions."""
+
+import pytest
+
+from aind_ephys_portal.cache import backends
+from aind_ephys_portal.cache.backends import MemoryBackend
+from aind_ephys_portal.cache.cached import CachedFunction
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backends, "time", clock)
+    return clock
+
+
+def test_cached_function_negative_ttl(clock):
+    calls = []
+
+    def find(name):
+        calls.append(name)
+        return None if name == "missing" else name.upper()
+
+    cached_find = CachedFunction(find, ttl=100, negative_ttl=10, name="test.find", backend=MemoryBackend())
+    assert cached_find("found") == "FOUND"
+    assert cached_find("missing") is None
+    clock.now += 20
+    assert cached_find("found") == "FOUND"
+    assert cached_find("missing") is None
+    assert calls == ["found", "missing", "missing"]
+    assert cached_find.stats.hits == 1
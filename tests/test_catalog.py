@@ -0,0 +1,151 @@
+"""Loading, incremental merges and reconciliation of the catalog."""
+
+import random
+
+import numpy as np
+
+from aind_ephys_portal.cache.backends import MemoryBackend
+from aind_ephys_portal.cache.cached import CachedFunction
+from aind_ephys_portal.catalog.catalog import Catalog
+from aind_ephys_portal.docdb.database import CATALOG_FIELDS
+
+
+def record(i, created, last_modified="2025-01-01T00:00:00Z", name=None):
+    return {
+        "_id": f"id-{i}",
+        "name": name or f"ecephys_{600000 + i}_sorted",
+        "created": created,
+        "last_modified": last_modified,
+        "location": f"s3://bucket/asset-{i}",
+        "subject_id": str(600000 + i),
+    }
+
+
+def columns(records):
+    return {field: np.array([r.get(field, "") for r in records], dtype=object) for field in CATALOG_FIELDS}
+
+
+class FakeDatabase:
+    def __init__(self, records):
+        self.records = {r["_id"]: r for r in records}
+
+    def fetch_all(self):
+        return columns(self.records.values())
+
+    def fetch_modified_since(self, last_modified):
+        return columns([r for r in self.records.values() if r["last_modified"] > last_modified])
+
+    def fetch_ids(self):
+        return list(self.records)
+
+
+def make_catalog(database, reconcile_interval=3600):
+    catalog = Catalog(
+        fetch_all=database.fetch_all,
+        fetch_modified_since=database.fetch_modified_since,
+        fetch_ids=database.fetch_ids,
+        reconcile_interval=reconcile_interval,
+    )
+    catalog.load()
+    return catalog
+
+
+def expected_ids(database):
+    # newest first, records without date last
+    return [r["_id"] for r in sorted(database.records.values(), key=lambda r: r["created"] or "", reverse=True)]
+
+
+def test_load_sorts_newest_first():
+    database = FakeDatabase(
+        [record(0, "2024-01-01"), record(1, "2024-03-01"), record(2, None), record(3, "2024-02-01")]
+    )
+    catalog = make_catalog(database)
+    assert list(catalog.df.index) == ["id-1", "id-3", "id-0", "id-2"]
+    assert catalog.get_record_by_name("ecephys_600003_sorted")["_id"] == "id-3"
+    assert catalog.last_modified == "2025-01-01T00:00:00Z"
+
+
+def test_refresh_merges_new_and_modified_records():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    catalog = make_catalog(database)
+    database.records["id-5"] = record(5, "2024-01-12", last_modified="2025-02-01T00:00:00Z")
+    database.records["id-0"] = record(0, "2024-01-30", last_modified="2025-02-01T00:00:00Z", name="renamed")
+    assert catalog.refresh() == 2
+    assert list(catalog.df.index) == expected_ids(database)
+    assert catalog.get_record_by_name("renamed")["created"] == "2024-01-30"
+    assert catalog.get_record_by_name("ecephys_600000_sorted") is None
+    assert list(catalog.search("renamed").index) == ["id-0"]
+    assert catalog.last_modified == "2025-02-01T00:00:00Z"
+
+
+def test_random_merges_keep_the_table_sorted():
+    rng = random.Random(0)
+    database = FakeDatabase([record(i, f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}") for i in range(200)])
+    catalog = make_catalog(database)
+    for step in range(10):
+        last_modified = f"2025-03-{step + 1:02d}T00:00:00Z"
+        for i in rng.sample(range(300), 20):
+            database.records[f"id-{i}"] = record(i, f"2024-{rng.randint(1, 12):02d}-01", last_modified=last_modified)
+        catalog.refresh()
+        dates = [date or "" for date in catalog.table["date"]]
+        assert dates == sorted(dates, reverse=True)
+        assert sorted(catalog.df.index) == sorted(database.records)
+        assert len(catalog.search_index) == len(database.records)
+
+
+def test_reconcile_removes_deleted_records():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    catalog = make_catalog(database, reconcile_interval=0)
+    del database.records["id-2"]
+    catalog.refresh()
+    assert "id-2" not in catalog.df.index
+    assert catalog.get_record_by_name("ecephys_600002_sorted") is None
+    assert catalog.search("600002").empty
+
+
+def test_reconcile_ignores_empty_id_lists():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    catalog = make_catalog(database)
+    database.records.clear()
+    assert catalog.reconcile() == 0
+    assert len(catalog.df) == 5
+
+
+def test_search_falls_back_to_name_substrings():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    catalog = make_catalog(database)
+    assert list(catalog.search("0003_SORTED").index) == ["id-3"]
+    assert list(catalog.search("ecephys_600003").index) == ["id-3"]
+    # field-prefixed queries only use the index
+    assert catalog.search("subject:0003").empty
+
+
+def test_reload_does_not_use_the_cached_records():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    fetch_all = CachedFunction(database.fetch_all, ttl=3600, name="test.fetch_all", backend=MemoryBackend())
+    catalog = Catalog(
+        fetch_all=fetch_all, fetch_modified_since=database.fetch_modified_since, fetch_ids=database.fetch_ids
+    )
+    catalog.load()
+    del database.records["id-2"]
+    catalog.load()
+    assert "id-2" not in catalog.df.index
+
+
+def test_subscribers_are_notified_after_the_lock_is_released():
+    database = FakeDatabase([record(i, f"2024-01-{10 + i}") for i in range(5)])
+    catalog = make_catalog(database, reconcile_interval=0)
+    held = []
+
+    def on_update():
+        held.append(catalog._lock._is_owned())
+
+    catalog.subscribe(on_update)
+    database.records["id-5"] = record(5, "2024-01-20", last_modified="2025-02-01T00:00:00Z")
+    del database.records["id-0"]
+    catalog.refresh()
+    catalog.load()
+    assert held == [False, False, False]
+    catalog.unsubscribe(on_update)
+    catalog.load()
+    assert len(held) == 3
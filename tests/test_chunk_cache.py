@@ -0,0 +1,73 @@
+"""On-disk chunk cache of S3 zarr reads."""
+
+import asyncio
+import os
+
+import pytest
+from s3fs import S3FileSystem
+
+from aind_ephys_portal.analyzer.chunk_cache import CachedS3FileSystem, DiskChunkCache, override_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskChunkCache(str(tmp_path / "chunks"), max_bytes=900, evict_to=0.5)
+
+
+def test_get_and_put(cache):
+    assert cache.get("bucket/a") is None
+    cache.put("bucket/a", b"abc")
+    assert cache.contains("bucket/a")
+    assert cache.get("bucket/a") == b"abc"
+    assert cache.stats() == {"hits": 1, "misses": 1, "bytes_hit": 3, "bytes_missed": 3}
+    cache.clear()
+    assert not cache.contains("bucket/a")
+
+
+def test_eviction_keeps_the_most_recently_used_entries(cache):
+    for i in range(4):
+        cache.put(f"bucket/{i}", bytes(200))
+        os.utime(cache._path(f"bucket/{i}"), (i, i))
+    # reading an entry makes it the most recent
+    cache.get("bucket/0")
+    cache.put("bucket/4", bytes(200))
+    cache.evict()
+    assert [cache.contains(f"bucket/{i}") for i in range(5)] == [True, False, False, False, True]
+
+
+@pytest.fixture
+def fs(monkeypatch, cache):
+    reads = []
+
+    async def cat_file(self, path, version_id=None, start=None, end=None, **kwargs):
+        reads.append(path)
+        return f"s3:{path}".encode()[start:end]
+
+    monkeypatch.setattr(S3FileSystem, "_cat_file", cat_file)
+    monkeypatch.setattr(CachedS3FileSystem, "chunk_cache", cache)
+    fs = CachedS3FileSystem(anon=True, asynchronous=True, skip_instance_cache=True)
+    fs.reads = reads
+    return fs
+
+
+def cat(fs, path, **kwargs):
+    return asyncio.run(fs._cat_file(path, **kwargs))
+
+
+def test_chunks_are_read_from_s3_once(fs, cache):
+    assert cat(fs, "s3://bucket/stream.zarr/0.0") == b"s3:s3://bucket/stream.zarr/0.0"
+    assert cat(fs, "s3://bucket/stream.zarr/0.0") == b"s3:s3://bucket/stream.zarr/0.0"
+    assert fs.reads == ["s3://bucket/stream.zarr/0.0"]
+    # ranged reads are not cached
+    assert cat(fs, "s3://bucket/stream.zarr/0.1", start=0, end=2) == b"s3"
+    assert not cache.contains("bucket/stream.zarr/0.1")
+
+
+def test_metadata_is_only_served_from_overrides(fs, cache):
+    cat(fs, "s3://bucket/stream.zarr/.zattrs")
+    cat(fs, "s3://bucket/stream.zarr/.zattrs")
+    assert len(fs.reads) == 2
+    assert not cache.contains("bucket/stream.zarr/.zattrs")
+    cache.put(override_key("bucket/stream.zarr/.zmetadata"), b"{}")
+    assert cat(fs, "s3://bucket/stream.zarr/.zmetadata") == b"{}"
+    assert len(fs.reads) == 2
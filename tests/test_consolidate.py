@@ -0,0 +1,72 @@
+"""Consolidated metadata of analyzer zarr stores."""
+
+import json
+
+import fsspec
+import pytest
+import zarr
+
+from aind_ephys_portal.analyzer.chunk_cache import DiskChunkCache, override_key
+from aind_ephys_portal.analyzer.consolidate import (
+    build_consolidated_metadata,
+    consolidate_analyzer,
+    has_consolidated_metadata,
+)
+
+
+@pytest.fixture
+def analyzer_path(tmp_path):
+    path = tmp_path / "stream.zarr"
+    root = zarr.open_group(str(path), mode="w")
+    root.attrs["spikeinterface_info"] = {"object": "SortingAnalyzer"}
+    extensions = root.create_group("extensions")
+    extensions.create_group("templates").create_dataset("average", shape=(4, 10, 2), dtype="float32")
+    return str(path)
+
+
+def test_metadata_matches_zarr(analyzer_path):
+    store = zarr.DirectoryStore(analyzer_path)
+    zarr.consolidate_metadata(store)
+    consolidated = json.loads(build_consolidated_metadata(fsspec.get_mapper(analyzer_path)))
+    assert consolidated == json.loads(store[".zmetadata"])
+    assert set(consolidated["metadata"]) == {
+        ".zattrs",
+        ".zgroup",
+        "extensions/.zgroup",
+        "extensions/templates/.zgroup",
+        "extensions/templates/average/.zarray",
+    }
+
+
+def test_consolidate_in_place(analyzer_path):
+    assert not has_consolidated_metadata(analyzer_path)
+    assert consolidate_analyzer(analyzer_path, dry_run=True) == "outdated"
+    assert not has_consolidated_metadata(analyzer_path)
+    assert consolidate_analyzer(analyzer_path) == "written"
+    assert has_consolidated_metadata(analyzer_path)
+    assert consolidate_analyzer(analyzer_path) == "up-to-date"
+    # metadata written after the consolidation makes it stale
+    zarr.open_group(analyzer_path)["extensions"].create_group("noise_levels")
+    assert consolidate_analyzer(analyzer_path) == "written"
+    assert "noise_levels" in zarr.open_consolidated(analyzer_path)["extensions"]
+
+
+def test_consolidate_into_the_chunk_cache(analyzer_path, tmp_path):
+    cache = DiskChunkCache(str(tmp_path / "chunks"))
+    assert consolidate_analyzer(analyzer_path, chunk_cache=cache) == "cached"
+    assert not has_consolidated_metadata(analyzer_path)
+    assert consolidate_analyzer(analyzer_path, chunk_cache=cache) == "up-to-date"
+
+
+def test_cached_metadata_of_s3_analyzers_needs_no_request(tmp_path, monkeypatch):
+    from aind_ephys_portal.analyzer import consolidate
+
+    def prefix_exists(bucket, prefix):
+        raise ConnectionError("unreachable")
+
+    monkeypatch.setattr(consolidate, "prefix_exists", prefix_exists)
+    cache = DiskChunkCache(str(tmp_path / "chunks"))
+    cache.put(override_key("bucket/asset/postprocessed/stream.zarr/.zmetadata"), b"{}")
+    assert has_consolidated_metadata("s3://bucket/asset/postprocessed/stream.zarr/", chunk_cache=cache)
+    with pytest.raises(ConnectionError):
+        has_consolidated_metadata("s3://bucket/asset/postprocessed/other.zarr", chunk_cache=cache)
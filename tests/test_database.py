@@ -0,0 +1,167 @@
+"""DocDB queries of the portal, against an in-memory client."""
+
+import re
+
+import pytest
+
+from aind_ephys_portal.cache import backends
+from aind_ephys_portal.cache.backends import MemoryBackend
+from aind_ephys_portal.docdb import database
+from aind_ephys_portal.docdb.database import get_raw_assets_by_names, iter_projected_pages, normalize_timestamp
+
+
+def field_value(record, field):
+    for part in field.split("."):
+        if not isinstance(record, dict) or part not in record:
+            return None
+        record = record[part]
+    return record
+
+
+def matches(record, filter_query):
+    for field, condition in filter_query.items():
+        if field == "$or":
+            if not any(matches(record, query) for query in condition):
+                return False
+            continue
+        value = field_value(record, field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$gt" and (value is None or value <= operand):
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$regex" and (value is None or re.search(operand, value) is None):
+                return False
+    return True
+
+
+def project(record, projection):
+    return {field: record[field] for field, keep in projection.items() if keep and field in record}
+
+
+class FakeClient:
+    """Evaluates the subset of DocDB queries used by the portal and records the requests."""
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.requests = []
+
+    def aggregate_docdb_records(self, pipeline):
+        self.requests.append(pipeline)
+        records = self.records
+        for stage in pipeline:
+            if "$match" in stage:
+                records = [r for r in records if matches(r, stage["$match"])]
+            elif "$sort" in stage:
+                records = sorted(records, key=lambda r: r["_id"])
+            elif "$limit" in stage:
+                records = records[: stage["$limit"]]
+            elif "$project" in stage:
+                records = [project(r, stage["$project"]) for r in records]
+        return records
+
+    def retrieve_docdb_records(self, filter_query, projection=None, limit=0):
+        self.requests.append(filter_query)
+        records = [r for r in self.records if matches(r, filter_query)]
+        if projection is not None:
+            records = [project(r, projection) for r in records]
+        return records[:limit] if limit else records
+
+
+def derived(i):
+    return {
+        "_id": f"id-{i:03d}",
+        "name": f"ecephys_{600000 + i}_sorted",
+        "location": f"s3://bucket/asset-{i}",
+        "data_description": {"data_level": "derived"},
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient([derived(i) for i in range(25)])
+    monkeypatch.setattr(database, "_client", client)
+    return client
+
+
+def test_pages_are_delimited_by_the_last_id(client):
+    query = {"data_description.data_level": "derived"}
+    pages = list(iter_projected_pages(query, {"name": 1}, page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [r["_id"] for page in pages for r in page] == [f"id-{i:03d}" for i in range(25)]
+    assert set(pages[0][0]) == {"_id", "name"}
+    assert client.requests[1][0]["$match"]["_id"] == {"$gt": "id-009"}
+    assert all("$skip" not in stage for request in client.requests for stage in request)
+
+
+def test_records_deleted_during_the_iteration_do_not_shift_pages(client):
+    pages = iter_projected_pages({}, {"name": 1}, page_size=10)
+    first = next(pages)
+    del client.records[:5]
+    assert [r["_id"] for r in first + [r for page in pages for r in page]] == [f"id-{i:03d}" for i in range(25)]
+
+
+def test_a_full_last_page_costs_one_empty_request(client):
+    assert [len(page) for page in iter_projected_pages({}, {"name": 1}, page_size=5)] == [5] * 5
+    assert len(client.requests) == 6
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2025-01-01T12:00:00",
+        "2025-01-01T12:00:00Z",
+        "2025-01-01 12:00:00.123456",
+        "2025-01-01T12:00:00+00:00",
+        "2025-01-01T14:00:00.5+02:00",
+        "2025-01-01T07:30:00-0430",
+    ],
+)
+def test_normalize_timestamp(value):
+    assert normalize_timestamp(value) == "2025-01-01T12:00:00"
+
+
+def test_normalize_timestamp_keeps_unknown_formats():
+    assert normalize_timestamp("yesterday") == "yesterday"
+    assert normalize_timestamp("2024-12-31T23:30:00-01:00") == "2025-01-01T00:30:00"
+
+
+def raw(name):
+    return {
+        "_id": f"raw-{name}",
+        "name": name,
+        "location": f"s3://raw/{name}",
+        "data_description": {"data_level": "raw"},
+    }
+
+
+def test_raw_assets_are_matched_exactly_then_by_prefix(monkeypatch):
+    monkeypatch.setattr(backends, "_backend", MemoryBackend())
+    client = FakeClient(
+        [
+            raw("ecephys_600001_2024-01-01_10-00-00"),
+            raw("ecephys_600002_2024-01-01_10-00-00_reupload"),
+            # an exact match wins over an earlier prefix match
+            raw("ecephys_600003_2024-01-01_10-00-00_old"),
+            raw("ecephys_600003_2024-01-01_10-00-00"),
+        ]
+    )
+    monkeypatch.setattr(database, "_client", client)
+    names = [f"ecephys_60000{i}_2024-01-01_10-00-00_sorted_2024-02-01_10-00-00" for i in range(1, 5)]
+    raw_assets = get_raw_assets_by_names(names + ["ecephys_600001_2024-01-01_10-00-00"])
+    assert {name: record and record["name"] for name, record in raw_assets.items()} == {
+        names[0]: "ecephys_600001_2024-01-01_10-00-00",
+        names[1]: "ecephys_600002_2024-01-01_10-00-00_reupload",
+        names[2]: "ecephys_600003_2024-01-01_10-00-00",
+        names[3]: None,
+        "ecephys_600001_2024-01-01_10-00-00": "ecephys_600001_2024-01-01_10-00-00",
+    }
+    assert set(raw_assets[names[0]]) == {"_id", "name", "location"}
+    # one exact query for the batch, one prefix query for the names without exact match
+    assert len(client.requests) == 2
+    get_raw_assets_by_names(names)
+    assert len(client.requests) == 2
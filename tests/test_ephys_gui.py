@@ -0,0 +1,93 @@
+"""Pins of the shared analyzer cache held by GUI sessions."""
+
+from unittest import mock
+
+import pandas as pd
+import panel as pn
+import pytest
+
+from aind_ephys_portal.analyzer.cache import AnalyzerCache
+from aind_ephys_portal.panel import ephys_gui
+from aind_ephys_portal.panel.ephys_gui import EphysGuiView
+
+ANALYZER_PATH = "s3://bucket/asset/postprocessed/stream.zarr"
+
+
+class FakeAnalyzer:
+    def has_temporary_recording(self):
+        return False
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = AnalyzerCache(max_bytes=100, max_entries=4, sizeof=lambda analyzer: 0)
+    monkeypatch.setattr(ephys_gui, "analyzer_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = mock.Mock()
+    monkeypatch.setattr(ephys_gui, "load_queue", queue)
+    return queue
+
+
+def make_view(create_main_window):
+    view = EphysGuiView(ANALYZER_PATH, "")
+    view._load_analyzer = lambda analyzer_path, recording_path: FakeAnalyzer()
+    view._prefetch_extensions = lambda *args, **kwargs: None
+    view._create_main_window = create_main_window
+    view._load_unit_summary = lambda generation, analyzer_path: None
+    return view
+
+
+def load(view, queue):
+    """Start a load and run it as the load queue would."""
+    view._initialize()
+    run = queue.submit.call_args[0][0]
+    run()
+
+
+def test_session_destroyed_during_load_releases_the_pin_once(cache, queue):
+    view = make_view(lambda analyzer: view._on_session_destroyed(None))
+    load(view, queue)
+    assert cache.pinned == 0
+    assert view._held_keys == []
+    queue.dispatch.assert_called()
+
+
+def test_failed_load_releases_the_pin(cache, queue):
+    def fail(analyzer):
+        raise RuntimeError("layout failed")
+
+    view = make_view(fail)
+    load(view, queue)
+    assert cache.pinned == 0
+    assert view._held_keys == []
+    queue.dispatch.assert_called()
+
+
+def test_shown_analyzer_stays_pinned_until_the_session_closes(cache, queue):
+    view = make_view(lambda analyzer: mock.Mock(main_layout=pn.pane.Markdown("GUI")))
+    view._watch_recording = lambda recording, generation: None
+    load(view, queue)
+    assert cache.pinned == 1
+    view._on_session_destroyed(None)
+    assert cache.pinned == 0
+
+
+def test_unit_summary_is_paged_remotely_until_the_gui_is_shown(cache, queue):
+    view = make_view(lambda analyzer: None)
+    view._initialize()
+    summary = pd.DataFrame(
+        {"decoder_label": ["noise"] * 50 + ["sua"] * 50}, index=pd.Index(range(100), name="unit_id")
+    )
+    view._show_unit_summary(summary)
+    text, table = view._loading.objects[-2:]
+    assert text.object.startswith("**100 units**, 50 labelled as noise")
+    assert table.pagination == "remote"
+    assert table.page_size == ephys_gui.UNIT_SUMMARY_PAGE_SIZE
+    view.layout[1] = pn.pane.Markdown("GUI")
+    n_objects = len(view._loading.objects)
+    view._show_unit_summary(summary)
+    assert len(view._loading.objects) == n_objects
@@ -0,0 +1,114 @@
+"""Stream listing, raw recording prefetch and catalog updates of the search portal."""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from aind_ephys_portal.cache import backends
+from aind_ephys_portal.cache.backends import MemoryBackend
+from aind_ephys_portal.catalog.catalog import Catalog
+from aind_ephys_portal.catalog.manifest import StreamManifest
+from aind_ephys_portal.docdb.database import CATALOG_FIELDS
+from aind_ephys_portal.panel import ephys_portal
+from aind_ephys_portal.panel.ephys_portal import EphysPortal, get_raw_asset_location, prefetch_raw_asset_locations
+
+RECORD = {
+    "_id": "id-0",
+    "name": "ecephys_600000_2024-01-01_10-00-00_sorted_2024-01-02_10-00-00",
+    "created": "2024-01-02T10:00:00",
+    "last_modified": "2025-01-01T00:00:00Z",
+    "location": "s3://bucket/asset-0",
+    "subject_id": "600000",
+}
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = Catalog(
+        fetch_all=lambda: {field: [RECORD[field]] for field in CATALOG_FIELDS},
+        fetch_modified_since=lambda last_modified: {},
+        fetch_ids=lambda: [RECORD["_id"]],
+    )
+    catalog.load()
+    monkeypatch.setattr(ephys_portal, "get_catalog", lambda: catalog)
+    return catalog
+
+
+@pytest.fixture
+def manifest(monkeypatch, tmp_path):
+    manifest = StreamManifest(str(tmp_path / "manifest.sqlite"))
+    monkeypatch.setattr(ephys_portal, "stream_manifest", manifest)
+    return manifest
+
+
+@pytest.fixture
+def portal(monkeypatch, manifest, catalog):
+    monkeypatch.setattr(ephys_portal, "manifest_indexer", mock.Mock())
+    monkeypatch.setattr(ephys_portal, "_prefetch_executor", mock.Mock())
+    return EphysPortal()
+
+
+def click(portal, row=0):
+    portal.update_streams(SimpleNamespace(row=row))
+    return list(portal.streams_panel.value["Stream name"])
+
+
+def test_streams_are_listed_without_raw_recording_when_it_cannot_be_resolved(monkeypatch, portal):
+    def resolve(record):
+        raise OSError("DocDB unreachable")
+
+    monkeypatch.setattr(ephys_portal, "resolve_asset_streams", resolve)
+    monkeypatch.setattr(ephys_portal, "_list_postprocessed_streams", lambda location: ["stream_recording1"])
+    assert click(portal) == ["stream_recording1"]
+    # retried on the next click
+    assert not ephys_portal.stream_manifest.contains(RECORD["_id"])
+
+
+def test_stream_listing_errors_are_shown(monkeypatch, portal):
+    def fail(*args):
+        raise OSError("S3 unreachable")
+
+    monkeypatch.setattr(ephys_portal, "resolve_asset_streams", fail)
+    monkeypatch.setattr(ephys_portal, "_list_postprocessed_streams", fail)
+    assert click(portal) == ["Error listing postprocessed streams: S3 unreachable"]
+
+
+def test_closed_sessions_stop_following_the_catalog(monkeypatch, catalog, portal):
+    refreshed = []
+    monkeypatch.setattr(portal, "refresh_results", lambda: refreshed.append(True))
+    catalog.load()
+    assert refreshed == [True]
+    portal.on_session_destroyed(None)
+    catalog.load()
+    assert refreshed == [True]
+
+
+def test_prefetch_caches_raw_locations_except_failed_probes(monkeypatch, manifest):
+    monkeypatch.setattr(backends, "_backend", MemoryBackend())
+    raw_assets = {"one_sorted": {"location": "s3://raw/one"}, "two_sorted": {"location": "s3://raw/two"}}
+    monkeypatch.setattr(ephys_portal, "get_raw_assets_by_names", lambda names: {n: raw_assets.get(n) for n in names})
+    probed = []
+
+    def exists(bucket, prefix):
+        probed.append(prefix)
+        if prefix.startswith("two/"):
+            raise OSError("S3 unreachable")
+        return prefix == "one/ecephys_compressed/"
+
+    monkeypatch.setattr(ephys_portal, "prefix_exists", exists)
+    records = [{"_id": "id-1", "name": "one_sorted"}, {"_id": "id-2", "name": "two_sorted"}]
+    manifest.put("id-3", "three_sorted", "s3://bucket/three", [], "s3://raw/three/ecephys_compressed")
+    prefetch_raw_asset_locations(records + [{"_id": "id-3", "name": "three_sorted"}])
+    assert sorted(probed) == [
+        "one/ecephys/ecephys_compressed/",
+        "one/ecephys_compressed/",
+        "two/ecephys/ecephys_compressed/",
+        "two/ecephys_compressed/",
+    ]
+    cached = get_raw_asset_location.get_many([get_raw_asset_location.key(f"s3://raw/{n}") for n in ["one", "two"]])
+    assert list(cached.values()) == ["s3://raw/one/ecephys_compressed"]
+    # cached locations are not probed again
+    probed.clear()
+    prefetch_raw_asset_locations(records)
+    assert sorted(probed) == ["two/ecephys/ecephys_compressed/", "two/ecephys_compressed/"]
@@ -0,0 +1,23 @@
+"""The search portal must stay light to import: heavy dependencies are loaded where they are used."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Modules the search portal must not load at import time
+PORTAL_FORBIDDEN_MODULES = ["spikeinterface", "spikeinterface_gui", "boto3", "botocore", "aind_data_access_api", "s3fs"]
+
+
+def _loaded_modules(module: str) -> set:
+    """Modules loaded by importing ``module`` in a fresh interpreter."""
+    code = f"import json, sys\nimport {module}\nprint(json.dumps(sorted(sys.modules)))\n"
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return set(json.loads(output.strip().splitlines()[-1]))
+
+
+@pytest.mark.parametrize("module", ["aind_ephys_portal.panel.ephys_portal", "aind_ephys_portal.docdb.database"])
+def test_import_is_light(module):
+    loaded = [name for name in PORTAL_FORBIDDEN_MODULES if name in _loaded_modules(module)]
+    assert loaded == [], f"Importing {module} loads {loaded}; import them lazily where they are used"
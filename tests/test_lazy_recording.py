@@ -0,0 +1,97 @@
+"""Processed recordings opened in the background on first use."""
+
+import threading
+
+import numpy as np
+import pytest
+import spikeinterface as si
+
+from aind_ephys_portal.analyzer.lazy_recording import UNSCALED_TRACES_KWARGS, LazyRecording
+
+
+@pytest.fixture(scope="module")
+def recording():
+    return si.generate_recording(num_channels=4, durations=[1.0], sampling_frequency=1000.0, seed=0)
+
+
+class FakeLoad:
+    """Replaces ``si.load``: blocks until released, then returns the recording or raises."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.error = None
+        self.released = threading.Event()
+        self.calls = 0
+
+    def __call__(self, recording_dict):
+        self.calls += 1
+        self.released.wait(10)
+        if self.error is not None:
+            raise self.error
+        return self.recording
+
+
+@pytest.fixture
+def load(monkeypatch, recording):
+    load = FakeLoad(recording)
+    monkeypatch.setattr(si, "load", load)
+    return load
+
+
+def make_lazy(recording, trace_pyramid=None):
+    rec_attributes = {
+        "sampling_frequency": recording.sampling_frequency,
+        "channel_ids": recording.channel_ids,
+        "dtype": recording.get_dtype(),
+        "num_samples": [recording.get_num_samples(0)],
+        "is_filtered": True,
+        "properties": {"gain_to_uV": recording.get_channel_gains()},
+    }
+    return LazyRecording({}, rec_attributes, trace_pyramid=trace_pyramid)
+
+
+def test_blank_traces_until_the_recording_is_open(recording, load):
+    lazy = make_lazy(recording)
+    assert lazy.get_num_samples(0) == recording.get_num_samples(0)
+    traces = lazy.get_traces(start_frame=10, end_frame=110, channel_ids=lazy.channel_ids[1:3])
+    assert traces.shape == (100, 2)
+    assert not traces.any()
+    load.released.set()
+    lazy.opened.result(10)
+    np.testing.assert_array_equal(
+        lazy.get_traces(start_frame=10, end_frame=110, channel_ids=lazy.channel_ids[1:3]),
+        recording.get_traces(start_frame=10, end_frame=110, channel_ids=recording.channel_ids[1:3]),
+    )
+    assert load.calls == 1
+
+
+def test_open_errors_are_raised_until_a_retry_succeeds(recording, load):
+    load.error = OSError("recording unreachable")
+    load.released.set()
+    lazy = make_lazy(recording)
+    lazy.open_async().exception(10)
+    with pytest.raises(OSError):
+        lazy.get_traces(start_frame=0, end_frame=100)
+    # failed attempts are not restarted by reads
+    assert load.calls == 1
+    load.error = None
+    lazy.retry_open().result(10)
+    assert lazy.get_traces(start_frame=0, end_frame=100).shape == (100, 4)
+    assert load.calls == 2
+
+
+def test_wide_windows_are_served_by_the_trace_pyramid(recording, load):
+    class FakePyramid:
+        def level_for(self, num_frames):
+            return 8 if num_frames >= 800 else None
+
+        def get_traces(self, segment_index, start_frame, end_frame, factor, channel_indices):
+            return np.ones((end_frame - start_frame, 4), dtype=recording.get_dtype())
+
+    lazy = make_lazy(recording, trace_pyramid=FakePyramid())
+    assert lazy.get_traces(start_frame=0, end_frame=1000, **UNSCALED_TRACES_KWARGS).all()
+    assert load.calls == 0
+    load.released.set()
+    lazy.get_traces(start_frame=0, end_frame=100)
+    lazy.opened.result(10)
+    assert load.calls == 1
@@ -0,0 +1,82 @@
+"""Admission of analyzer loads by concurrency and memory."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aind_ephys_portal.analyzer.load_queue import LoadQueue
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def blocked():
+    """A load running until its event is set."""
+    release = threading.Event()
+    return release, lambda: release.wait(5)
+
+
+def test_concurrency_and_fifo_positions(executor):
+    queue = LoadQueue(executor, max_concurrent=1)
+    release, func = blocked()
+    running = queue.submit(func)
+    positions = []
+    waiting = queue.submit(lambda: "done", on_position=positions.append)
+    assert (queue.running, queue.waiting) == (1, 1)
+    release.set()
+    assert waiting.result(5) == "done"
+    assert positions == [1, 0]
+    assert running.result(5)
+
+
+def test_loads_over_memory_budget_wait(executor):
+    memory = {"in_use": 200}
+    queue = LoadQueue(executor, max_concurrent=2, max_bytes=100, memory_in_use=lambda: memory["in_use"])
+    held = queue.submit(lambda: "loaded")
+    resident = queue.submit(lambda: "resident", needs_memory=False)
+    assert resident.result(5) == "resident"
+    assert queue.waiting == 1 and not held.done()
+    memory["in_use"] = 50
+    queue.dispatch()
+    assert held.result(5) == "loaded"
+
+
+def test_memory_is_reclaimed_before_holding_back(executor):
+    memory = {"in_use": 200}
+    reclaimed = []
+
+    def reclaim():
+        reclaimed.append(None)
+        memory["in_use"] = 50
+
+    queue = LoadQueue(
+        executor, max_concurrent=1, max_bytes=100, memory_in_use=lambda: memory["in_use"], reclaim=reclaim
+    )
+    assert queue.submit(lambda: "loaded").result(5) == "loaded"
+    assert len(reclaimed) == 1
+
+
+def test_cancel_waiting_load(executor):
+    queue = LoadQueue(executor, max_concurrent=1)
+    release, func = blocked()
+    queue.submit(func)
+    waiting = queue.submit(lambda: "never")
+    assert queue.cancel(waiting)
+    assert waiting.cancelled() and queue.waiting == 0
+    release.set()
+
+
+def test_errors_free_the_slot(executor):
+    queue = LoadQueue(executor, max_concurrent=1)
+
+    def fail():
+        raise OSError("unreachable")
+
+    failed = queue.submit(fail)
+    assert isinstance(failed.exception(5), OSError)
+    assert queue.submit(lambda: "next").result(5) == "next"
@@ -0,0 +1,102 @@
+"""Expiry of stream manifest entries and background indexing passes."""
+
+import pytest
+
+from aind_ephys_portal.catalog import manifest as manifest_module
+from aind_ephys_portal.catalog.manifest import ManifestIndexer, StreamManifest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(manifest_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def manifest(tmp_path, clock):
+    return StreamManifest(str(tmp_path / "manifest.sqlite"), negative_ttl=60)
+
+
+def record(i):
+    return {"_id": f"id-{i}", "name": f"ecephys_{i}_sorted", "location": f"s3://bucket/asset-{i}"}
+
+
+def test_entries_without_raw_recording_expire(manifest, clock):
+    manifest.put("found", "found", "s3://bucket/found", ["stream"], "s3://bucket/raw/ecephys_compressed")
+    manifest.put("missing", "missing", "s3://bucket/missing", ["stream"], None)
+    assert manifest.get("missing") == {
+        "name": "missing",
+        "location": "s3://bucket/missing",
+        "stream_names": ["stream"],
+        "raw_asset_location": None,
+    }
+    assert manifest.indexed_ids() == {"found", "missing"}
+    clock.now += 61
+    assert manifest.get("missing") is None
+    assert not manifest.contains("missing")
+    assert manifest.contains("found")
+    assert manifest.indexed_ids() == {"found"}
+    assert len(manifest) == 2
+
+
+def test_run_once_indexes_new_and_expired_records(manifest, clock):
+    resolved = []
+
+    def resolve(r):
+        resolved.append(r["_id"])
+        if r["_id"] == "id-2":
+            raise OSError("unreachable")
+        return ["stream"], None if r["_id"] == "id-1" else "s3://bucket/raw/ecephys_compressed"
+
+    records = [record(i) for i in range(3)]
+    indexer = ManifestIndexer(manifest, get_records=lambda: records, resolve=resolve, max_workers=2)
+    assert indexer.run_once() == 2
+    assert sorted(resolved) == ["id-0", "id-1", "id-2"]
+    # errors are not stored, so they are retried; fresh entries are not
+    resolved.clear()
+    assert indexer.run_once() == 0
+    assert resolved == ["id-2"]
+    resolved.clear()
+    clock.now += 61
+    indexer.run_once()
+    assert sorted(resolved) == ["id-1", "id-2"]
+
+
+def test_stop_cancels_pending_records(manifest):
+    resolved = []
+
+    def resolve(r):
+        resolved.append(r["_id"])
+        indexer.stop()
+        return ["stream"], "s3://bucket/raw/ecephys_compressed"
+
+    records = [record(i) for i in range(20)]
+    indexer = ManifestIndexer(manifest, get_records=lambda: records, resolve=resolve, max_workers=1)
+    indexer.run_once()
+    assert len(resolved) < len(records)
+
+
+def test_records_are_prefetched_in_batches(manifest):
+    batches = []
+
+    def prefetch(batch):
+        batches.append([r["_id"] for r in batch])
+        if len(batches) == 2:
+            raise OSError("DocDB unreachable")
+
+    records = [record(i) for i in range(5)]
+    indexer = ManifestIndexer(
+        manifest, get_records=lambda: records, resolve=lambda r: (["stream"], None), prefetch=prefetch, batch_size=2
+    )
+    # records are resolved one by one when their prefetch fails
+    assert indexer.run_once() == 5
+    assert batches == [["id-0", "id-1"], ["id-2", "id-3"], ["id-4"]]
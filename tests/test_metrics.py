@@ -0,0 +1,109 @@
+"""Metrics registry and the ``/metrics`` route."""
+
+import asyncio
+
+import pytest
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from aind_ephys_portal.metrics import registry as registry_module
+from aind_ephys_portal.metrics.registry import MetricsRegistry, timed
+
+
+def test_counters_and_gauges():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["operation"])
+    requests.inc(operation="list")
+    requests.inc(2, operation="list")
+    requests.set_total(5, operation='get "object"')
+    sessions = registry.gauge("sessions", "Open sessions")
+    sessions.inc()
+    sessions.inc()
+    sessions.dec()
+    assert registry.counter("requests_total", "Requests", ["operation"]) is requests
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{operation="list"} 3.0',
+        'requests_total{operation="get \\"object\\""} 5.0',
+        "# HELP sessions Open sessions",
+        "# TYPE sessions gauge",
+        "sessions 1.0",
+    ]
+
+
+def test_metric_types_and_labels_are_checked():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["operation"])
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests")
+    with pytest.raises(ValueError):
+        counter.inc(bucket="data")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("load_seconds", "Loads", ["stage"], buckets=[0.1, 1])
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value, stage="open")
+    assert registry.render().splitlines()[2:] == [
+        'load_seconds_bucket{stage="open",le="0.1"} 1.0',
+        'load_seconds_bucket{stage="open",le="1.0"} 3.0',
+        'load_seconds_bucket{stage="open",le="+Inf"} 4.0',
+        'load_seconds_sum{stage="open"} 6.05',
+        'load_seconds_count{stage="open"} 4.0',
+    ]
+
+
+def test_collectors_run_at_scrape_time_and_their_errors_are_ignored():
+    registry = MetricsRegistry()
+    sessions = registry.gauge("sessions", "Open sessions")
+    open_sessions = [1, 2]
+
+    def fail():
+        raise RuntimeError("collector failed")
+
+    registry.add_collector(fail)
+    registry.add_collector(lambda: sessions.set(len(open_sessions)))
+    assert "sessions 2.0" in registry.render()
+    open_sessions.append(3)
+    assert "sessions 3.0" in registry.render()
+
+
+def test_timed_counts_errors(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(registry_module, "STAGE_SECONDS", registry.histogram("stage_seconds", "Stages", ["stage"]))
+    monkeypatch.setattr(registry_module, "STAGE_ERRORS", registry.counter("stage_errors_total", "Errors", ["stage"]))
+
+    @timed("test.stage")
+    def stage(fail):
+        if fail:
+            raise RuntimeError("stage failed")
+
+    stage(False)
+    with pytest.raises(RuntimeError):
+        stage(True)
+    rendered = registry.render()
+    assert 'stage_seconds_count{stage="test.stage"} 2.0' in rendered
+    assert 'stage_errors_total{stage="test.stage"} 1.0' in rendered
+
+
+def test_metrics_route():
+    from aind_ephys_portal.metrics.server import ROUTES
+
+    async def fetch():
+        sock, port = bind_unused_port()
+        server = HTTPServer(tornado.web.Application(ROUTES))
+        server.add_sockets([sock])
+        try:
+            return await AsyncHTTPClient().fetch(f"http://127.0.0.1:{port}/metrics")
+        finally:
+            server.stop()
+
+    response = asyncio.run(fetch())
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.body.decode()
+    assert "# TYPE aind_ephys_portal_stage_seconds histogram" in body
+    assert "\naind_ephys_portal_analyzer_cache_entries " in body
@@ -0,0 +1,74 @@
+"""Concurrent loading of analyzer extensions."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from aind_ephys_portal.analyzer.prefetch import load_extension, prefetch_extensions
+
+
+class FakeAnalyzer:
+    format = "zarr"
+
+    def __init__(self, saved, failing=(), incomplete=()):
+        self.saved = list(saved)
+        self.failing = set(failing)
+        self.incomplete = set(incomplete)
+        self.extensions = {}
+        self.loads = []
+        self._lock = threading.Lock()
+
+    def get_saved_extension_names(self):
+        return self.saved
+
+    def load_extension(self, extension_name):
+        with self._lock:
+            self.loads.append(extension_name)
+        time.sleep(0.01)
+        if extension_name in self.failing:
+            raise OSError(f"{extension_name} unreachable")
+        if extension_name in self.incomplete:
+            return None
+        extension = SimpleNamespace(data={"values": np.zeros(100, dtype="uint8")})
+        self.extensions[extension_name] = extension
+        return extension
+
+
+def test_only_saved_and_unloaded_extensions_are_prefetched():
+    analyzer = FakeAnalyzer(["templates", "noise_levels", "correlograms", "spike_amplitudes", "waveforms"])
+    analyzer.extensions["noise_levels"] = SimpleNamespace(data={})
+    loaded = prefetch_extensions(
+        analyzer, ["templates", "noise_levels", "correlograms", "spike_amplitudes", "unit_locations"]
+    )
+    assert sorted(loaded) == ["correlograms", "spike_amplitudes", "templates"]
+    assert loaded["templates"]["bytes"] == 100
+    assert sorted(analyzer.loads) == ["correlograms", "spike_amplitudes", "templates"]
+
+
+def test_errors_and_incomplete_extensions_are_skipped():
+    analyzer = FakeAnalyzer(
+        ["templates", "correlograms", "spike_amplitudes"], failing=["correlograms"], incomplete=["spike_amplitudes"]
+    )
+    assert list(prefetch_extensions(analyzer, ["templates", "correlograms", "spike_amplitudes"])) == ["templates"]
+    assert sorted(analyzer.extensions) == ["templates"]
+
+
+def test_in_memory_analyzers_are_not_prefetched():
+    analyzer = FakeAnalyzer(["templates"])
+    analyzer.format = "memory"
+    assert prefetch_extensions(analyzer, ["templates"]) == {}
+    assert analyzer.loads == []
+
+
+def test_an_extension_is_loaded_by_one_thread_at_a_time():
+    analyzer = FakeAnalyzer(["templates"])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load_extension(analyzer, "templates"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert analyzer.loads == ["templates"]
+    assert sum(result is not None for result in results) == 1
@@ -0,0 +1,109 @@
+"""Requests of the shared S3 client and its concurrent helpers."""
+
+import threading
+
+import pytest
+
+from aind_ephys_portal.s3 import client as s3_client
+from aind_ephys_portal.s3.client import (
+    get_object,
+    list_common_prefixes,
+    map_concurrent,
+    prefix_exists,
+    prefixes_exist,
+    split_s3_url,
+)
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakePaginator:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, Bucket, Prefix, Delimiter):
+        return iter(self.pages)
+
+
+class FakeS3Client:
+    exceptions = type("Exceptions", (), {"NoSuchKey": NoSuchKey})
+
+    def __init__(self, keys, pages=()):
+        self.keys = keys
+        self.pages = list(pages)
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys):
+        if Bucket == "unreachable":
+            raise ConnectionError("unreachable")
+        matching = [{"Key": key} for key in self.keys if key.startswith(Prefix)][:MaxKeys]
+        return {"Contents": matching} if matching else {}
+
+    def get_object(self, Bucket, Key):
+        if Bucket == "unreachable":
+            raise ConnectionError("unreachable")
+        if Key not in self.keys:
+            raise NoSuchKey(Key)
+        return {"Body": FakeBody(self.keys[Key])}
+
+    def get_paginator(self, operation):
+        return FakePaginator(self.pages)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeS3Client({"asset/ecephys_compressed/.zgroup": b"{}"})
+    monkeypatch.setattr(s3_client, "_client", client)
+    return client
+
+
+def test_split_s3_url():
+    assert split_s3_url("s3://bucket/asset/postprocessed") == ("bucket", "asset/postprocessed")
+    assert split_s3_url("bucket") == ("bucket", "")
+
+
+def test_prefix_exists_raises_errors(fake_client):
+    assert prefix_exists("bucket", "asset/ecephys_compressed/")
+    assert not prefix_exists("bucket", "asset/ecephys/ecephys_compressed/")
+    with pytest.raises(ConnectionError):
+        prefix_exists("unreachable", "asset/")
+    assert prefixes_exist([("bucket", "asset/"), ("bucket", "other/")]) == [True, False]
+
+
+def test_get_object(fake_client):
+    assert get_object("bucket", "asset/ecephys_compressed/.zgroup") == b"{}"
+    assert get_object("bucket", "missing") is None
+    assert get_object("unreachable", "asset/ecephys_compressed/.zgroup") is None
+
+
+def test_list_common_prefixes_reads_all_pages(monkeypatch):
+    pages = [
+        {"CommonPrefixes": [{"Prefix": "asset/postprocessed/a.zarr/"}]},
+        {"CommonPrefixes": [{"Prefix": "asset/postprocessed/b.zarr/"}]},
+        {},
+    ]
+    monkeypatch.setattr(s3_client, "_client", FakeS3Client({}, pages))
+    assert list_common_prefixes("bucket", "asset/postprocessed/") == [
+        "asset/postprocessed/a.zarr/",
+        "asset/postprocessed/b.zarr/",
+    ]
+
+
+def test_map_concurrent_keeps_the_order_and_runs_nested_calls_inline():
+    threads = set()
+
+    def nested(i):
+        threads.add(threading.current_thread().name)
+        return map_concurrent(lambda j: i * 10 + j, range(3))
+
+    assert map_concurrent(nested, range(4)) == [[i * 10 + j for j in range(3)] for i in range(4)]
+    assert all(name.startswith("s3") for name in threads)
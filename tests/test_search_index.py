@@ -0,0 +1,58 @@
+"""Queries of the catalog search index."""
+
+from aind_ephys_portal.catalog.search_index import SearchIndex, tokenize
+
+
+def document(doc_id, subject_id, acquired, sorted_on):
+    name = f"ecephys_{subject_id}_{acquired}_10-00-00_sorted_{sorted_on}"
+    return {"id": doc_id, "name": name, "subject_id": subject_id, "date": f"{sorted_on}T08:00:00"}
+
+
+DOCUMENTS = [
+    document("1", "713655", "2024-05-01", "2024-05-02"),
+    document("2", "713655", "2024-06-01", "2024-06-02"),
+    document("3", "700111", "2024-06-03", "2024-06-04"),
+]
+
+
+def make_index():
+    index = SearchIndex()
+    index.update(DOCUMENTS)
+    return index
+
+
+def test_tokenize():
+    assert tokenize("name", "Ecephys_713655_2024-05-01") == ["ecephys", "713655", "2024-05-01"]
+    assert tokenize("date", "2024-05-02T08:00:00") == ["2024-05-02"]
+    assert tokenize("subject_id", None) == []
+
+
+def test_empty_query_matches_everything():
+    assert make_index().search("  ") is None
+
+
+def test_token_prefixes_and_conjunction():
+    index = make_index()
+    assert index.search("7136") == {"1", "2"}
+    assert index.search("ECEPHYS 2024-06") == {"2", "3"}
+    assert index.search("713655 2024-06") == {"2"}
+    assert index.search("713655 nothing") == set()
+
+
+def test_field_prefixes():
+    index = make_index()
+    assert index.search("subject:700") == {"3"}
+    assert index.search("date:2024-06-02") == {"2"}
+    assert index.search("id:1") == {"1"}
+    # unknown prefixes are searched as is
+    assert index.search("probe:a") == set()
+
+
+def test_update_and_remove():
+    index = make_index()
+    index.update([dict(DOCUMENTS[0], subject_id="699999")])
+    assert index.search("subject:713655") == {"2"}
+    assert index.search("subject:699999") == {"1"}
+    index.remove("2")
+    assert index.search("713655") == {"1"}
+    assert len(index) == 2
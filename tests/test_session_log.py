@@ -0,0 +1,89 @@
+"""Per-session log streaming of the GUI."""
+
+import logging
+import sys
+import threading
+
+import panel as pn
+
+from aind_ephys_portal.panel.utils import SessionLogHandler
+
+logger = logging.getLogger("aind_ephys_portal.tests")
+
+
+class FakeDoc:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_next_tick_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def run_callbacks(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def shown_lines(log_output):
+    return [line for pane in log_output.objects for line in pane.object.split("\n")]
+
+
+def test_only_records_of_the_session_are_shown():
+    handler, other = SessionLogHandler(pn.Column()), SessionLogHandler(pn.Column())
+    handler.start()
+    other.start()
+    try:
+        logger.info("outside")
+        with handler.capture():
+            logger.info("first\nsecond")
+        with other.capture():
+            logger.info("other session")
+    finally:
+        handler.stop()
+        other.stop()
+    assert shown_lines(handler.log_output) == ["first", "second"]
+    assert shown_lines(other.log_output) == ["other session"]
+
+
+def test_standard_streams_are_left_alone():
+    stdout, stderr = sys.stdout, sys.stderr
+    handler = SessionLogHandler(pn.Column())
+    handler.start()
+    handler.stop()
+    assert (sys.stdout, sys.stderr) == (stdout, stderr)
+
+
+def test_updates_from_threads_are_scheduled_on_the_event_loop():
+    handler = SessionLogHandler(pn.Column())
+    handler.start()
+    doc = handler._doc = FakeDoc()
+
+    def work():
+        with handler.capture():
+            for i in range(3):
+                logger.info(f"line {i}")
+
+    try:
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        # nothing is sent from the logging thread, and one update is scheduled for all lines
+        assert handler.log_output.objects == []
+        assert len(doc.callbacks) == 1
+        doc.run_callbacks()
+        assert shown_lines(handler.log_output) == ["line 0", "line 1", "line 2"]
+    finally:
+        handler.stop()
+
+
+def test_oldest_lines_are_dropped():
+    handler = SessionLogHandler(pn.Column(), max_lines=4)
+    handler.start()
+    try:
+        with handler.capture():
+            for i in range(10):
+                logger.info(f"line {i}")
+    finally:
+        handler.stop()
+    assert shown_lines(handler.log_output) == [f"line {i}" for i in range(6, 10)]
+    assert list(handler.lines) == [f"line {i}" for i in range(6, 10)]
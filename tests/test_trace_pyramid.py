@@ -0,0 +1,77 @@
+"""Building, level selection and reading of trace pyramids."""
+
+import numpy as np
+import pytest
+
+from aind_ephys_portal.analyzer.lazy_recording import UNSCALED_TRACES_KWARGS
+from aind_ephys_portal.analyzer.trace_pyramid import TracePyramid, build_trace_pyramid
+
+
+@pytest.fixture(scope="module")
+def recording():
+    import spikeinterface as si
+
+    return si.generate_recording(num_channels=4, durations=[2.0], sampling_frequency=10000.0, seed=0)
+
+
+@pytest.fixture(scope="module")
+def pyramid(recording, tmp_path_factory):
+    path = tmp_path_factory.mktemp("pyramid") / "stream_trace_pyramid.zarr"
+    build_trace_pyramid(recording, str(path), factors=[8, 64], n_jobs=2)
+    return TracePyramid.open(str(path), min_bins=100)
+
+
+def test_attributes(recording, pyramid):
+    assert pyramid.factors == [8, 64]
+    assert pyramid.num_samples == [recording.get_num_samples(0)]
+    assert pyramid.num_channels == 4
+    assert pyramid.dtype == recording.get_dtype()
+
+
+def test_level_for_picks_the_coarsest_adequate_level(pyramid):
+    assert pyramid.level_for(100 * 64) == 64
+    assert pyramid.level_for(100 * 64 - 1) == 8
+    assert pyramid.level_for(100 * 8) == 8
+    assert pyramid.level_for(100 * 8 - 1) is None
+
+
+def test_levels_hold_the_min_and_max_of_the_raw_samples(recording, pyramid):
+    traces = recording.get_traces(segment_index=0, **UNSCALED_TRACES_KWARGS)
+    for factor in pyramid.factors:
+        level = pyramid.root[f"segment_0/{factor}"]
+        num_bins = -(-len(traces) // factor)
+        padded = np.full((num_bins * factor, traces.shape[1]), np.nan)
+        padded[: len(traces)] = traces
+        bins = padded.reshape(num_bins, factor, -1)
+        np.testing.assert_allclose(level["min"][:], np.nanmin(bins, axis=1))
+        np.testing.assert_allclose(level["max"][:], np.nanmax(bins, axis=1))
+
+
+def test_get_traces_keeps_the_window_layout(pyramid):
+    traces = pyramid.get_traces(segment_index=0, start_frame=100, end_frame=1100, factor=64, channel_indices=[1, 3])
+    assert traces.shape == (1000, 2)
+    level = pyramid.root["segment_0/64"]
+    assert traces.min() >= level["min"][:, [1, 3]].min()
+    assert traces.max() <= level["max"][:, [1, 3]].max()
+
+
+def test_lookups_are_cached_but_not_errors(monkeypatch, tmp_path):
+    from aind_ephys_portal.analyzer import trace_pyramid
+
+    checked = []
+
+    def exists(path):
+        checked.append(path)
+        if "unreachable" in path:
+            raise OSError("unreachable")
+        return False
+
+    monkeypatch.setattr(trace_pyramid, "_exists", exists)
+    missing = str(tmp_path / "missing.zarr")
+    assert trace_pyramid.find_trace_pyramid(missing, "", {}) is None
+    assert trace_pyramid.find_trace_pyramid(missing, "", {}) is None
+    assert len(checked) == 1
+    unreachable = str(tmp_path / "unreachable.zarr")
+    trace_pyramid.find_trace_pyramid(unreachable, "", {})
+    trace_pyramid.find_trace_pyramid(unreachable, "", {})
+    assert len(checked) == 3
@@ -0,0 +1,95 @@
+"""Unit summaries shown while the GUI loads."""
+
+import pandas as pd
+import pytest
+
+from aind_ephys_portal.analyzer import unit_summary
+from aind_ephys_portal.analyzer.unit_summary import (
+    build_unit_summary,
+    cache_path,
+    find_unit_summary,
+    read_unit_summary,
+    sidecar_path,
+    update_cached_unit_summary,
+    write_unit_summary,
+)
+
+ANALYZER_PATH = "s3://bucket/asset/postprocessed/experiment1_imec0.zarr"
+
+
+def make_summary(unit_ids=("a", "b", "c")):
+    return pd.DataFrame(
+        {"decoder_label": ["sua", "noise", "mua"][: len(unit_ids)], "firing_rate": [1.5, 0.2, 12.0][: len(unit_ids)]},
+        index=pd.Index(list(unit_ids), name="unit_id"),
+    )
+
+
+@pytest.fixture
+def summary_dir(monkeypatch, tmp_path):
+    directory = str(tmp_path / "unit_summaries")
+    monkeypatch.setattr(unit_summary, "UNIT_SUMMARY_DIR", directory)
+    return directory
+
+
+def test_paths():
+    assert sidecar_path(ANALYZER_PATH + "/") == "s3://bucket/asset/postprocessed/experiment1_imec0_unit_summary.json"
+    assert cache_path(ANALYZER_PATH, "/cache") == cache_path(ANALYZER_PATH + "/", "/cache")
+    assert cache_path(ANALYZER_PATH, "/cache") != cache_path(ANALYZER_PATH.replace("imec0", "imec1"), "/cache")
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "summary.json")
+    write_unit_summary(make_summary(), path, source=ANALYZER_PATH)
+    pd.testing.assert_frame_equal(read_unit_summary(path), make_summary())
+
+
+def test_missing_unreadable_and_unsupported_summaries_are_ignored(tmp_path):
+    assert read_unit_summary(str(tmp_path / "missing.json")) is None
+    path = tmp_path / "summary.json"
+    path.write_text("{not json")
+    assert read_unit_summary(str(path)) is None
+    path.write_text('{"format_version": 999, "table": {}}')
+    assert read_unit_summary(str(path)) is None
+
+
+def test_local_cache_is_read_before_the_sidecar(summary_dir, tmp_path):
+    analyzer_path = str(tmp_path / "experiment1_imec0.zarr")
+    assert find_unit_summary(analyzer_path) is None
+    write_unit_summary(make_summary(["sidecar"]), sidecar_path(analyzer_path))
+    assert list(find_unit_summary(analyzer_path).index) == ["sidecar"]
+    write_unit_summary(make_summary(["cached"]), cache_path(analyzer_path))
+    assert list(find_unit_summary(analyzer_path).index) == ["cached"]
+
+
+def test_cached_summary_is_only_rewritten_when_the_units_changed(monkeypatch, summary_dir):
+    built = []
+
+    def build(analyzer):
+        built.append(analyzer)
+        return make_summary(analyzer.unit_ids)
+
+    monkeypatch.setattr(unit_summary, "build_unit_summary", build)
+
+    class FakeAnalyzer:
+        unit_ids = ["a", "b"]
+
+    analyzer = FakeAnalyzer()
+    update_cached_unit_summary(ANALYZER_PATH, analyzer)
+    update_cached_unit_summary(ANALYZER_PATH, analyzer)
+    assert len(built) == 1
+    analyzer.unit_ids = ["a", "b", "c"]
+    update_cached_unit_summary(ANALYZER_PATH, analyzer)
+    assert list(find_unit_summary(ANALYZER_PATH).index) == ["a", "b", "c"]
+
+
+def test_build_unit_summary():
+    import spikeinterface as si
+
+    recording, sorting = si.generate_ground_truth_recording(durations=[5.0], num_units=4, seed=0)
+    analyzer = si.create_sorting_analyzer(sorting, recording, sparse=False)
+    analyzer.compute(["random_spikes", "templates", "noise_levels", "unit_locations"])
+    summary = build_unit_summary(analyzer)
+    assert list(summary.index) == list(analyzer.unit_ids)
+    assert summary.index.name == "unit_id"
+    assert set(summary.columns) <= set(unit_summary.DISPLAYED_UNIT_PROPERTIES)
+    assert "y" in summary.columns
@@ -0,0 +1,99 @@
+"""Speculative warm-up of the analyzers listed by the portal."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from aind_ephys_portal.analyzer import loader, unit_summary, warmup
+from aind_ephys_portal.analyzer.cache import AnalyzerCache
+from aind_ephys_portal.analyzer.warmup import AnalyzerWarmup
+
+ANALYZER_PATH = "s3://bucket/asset/postprocessed/stream.zarr"
+
+
+class FakeAnalyzer:
+    def __init__(self, saved, on_load=None):
+        self.saved = saved
+        self.extensions = {}
+        self.on_load = on_load
+
+    def get_saved_extension_names(self):
+        return self.saved
+
+    def load_extension(self, extension_name):
+        self.extensions[extension_name] = SimpleNamespace(data={})
+        if self.on_load is not None:
+            self.on_load(extension_name)
+        return self.extensions[extension_name]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = AnalyzerCache(max_bytes=100, max_entries=2, sizeof=lambda analyzer: 0)
+    monkeypatch.setattr(warmup, "analyzer_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = SimpleNamespace(waiting=0)
+    monkeypatch.setattr(warmup, "load_queue", queue)
+    return queue
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    analyzer = FakeAnalyzer(["templates", "noise_levels", "waveforms"])
+    monkeypatch.setattr(loader, "load_analyzer", lambda analyzer_path, recording_path: analyzer)
+    monkeypatch.setattr(unit_summary, "update_cached_unit_summary", lambda analyzer_path, analyzer: None)
+    return analyzer
+
+
+def run(analyzer_warmup, analyzer_path=ANALYZER_PATH):
+    return analyzer_warmup._run(analyzer_warmup._generation, analyzer_path, "")
+
+
+def test_saved_extensions_of_the_list_are_loaded(cache, queue, analyzer):
+    analyzer_warmup = AnalyzerWarmup(max_streams=2, extension_names=["templates", "noise_levels", "correlograms"])
+    assert run(analyzer_warmup) == "done"
+    assert sorted(analyzer.extensions) == ["noise_levels", "templates"]
+    assert cache.make_key(ANALYZER_PATH, "") in cache
+    assert cache.pinned == 0
+
+
+def test_warmups_give_way_to_gui_loads_and_analyzers_in_use(cache, queue, analyzer):
+    analyzer_warmup = AnalyzerWarmup(max_streams=2, extension_names=["templates"])
+    assert run(analyzer_warmup, "s3://bucket/asset/postprocessed/stream.json") == "skipped"
+    queue.waiting = 1
+    assert run(analyzer_warmup) == "skipped"
+    queue.waiting = 0
+    for i in range(2):
+        cache.get_or_load(f"s3://bucket/other-{i}.zarr", "", loader=lambda: FakeAnalyzer([]))
+    assert run(analyzer_warmup) == "skipped"
+    assert len(cache) == 2 and analyzer.extensions == {}
+
+
+def test_a_new_selection_cancels_the_warmup_at_its_next_extension(cache, queue, analyzer):
+    analyzer_warmup = AnalyzerWarmup(max_streams=2, extension_names=["templates", "noise_levels"])
+    analyzer.on_load = lambda extension_name: analyzer_warmup.cancel()
+    assert run(analyzer_warmup) == "cancelled"
+    assert list(analyzer.extensions) == ["templates"]
+
+
+def test_warm_submits_at_most_max_streams(monkeypatch):
+    submitted = []
+
+    class FakeExecutor:
+        def submit(self, func, generation, analyzer_path, recording_path):
+            submitted.append(analyzer_path)
+            return SimpleNamespace(cancel=lambda: True)
+
+    monkeypatch.setattr(warmup, "_get_executor", lambda: FakeExecutor())
+    targets = [(f"s3://bucket/asset/postprocessed/stream{i}.zarr", "") for i in range(5)]
+    AnalyzerWarmup(max_streams=0).warm(targets)
+    assert submitted == []
+    analyzer_warmup = AnalyzerWarmup(max_streams=2)
+    analyzer_warmup.warm(targets)
+    assert submitted == [targets[0][0], targets[1][0]]
+    analyzer_warmup.cancel()
+    assert analyzer_warmup._futures == []